@@ -1 +1 @@
-from .minimax import generate_move
+from .minimax import generate_move, warmup
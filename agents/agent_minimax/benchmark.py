@@ -0,0 +1,113 @@
+"""
+Compares the number of nodes and the time the search modes of the minimax
+agent need for a fixed set of positions at a fixed depth, all with the
+original heuristic heuristic (LAST_MOVE_HEURISTIC in the compiled search),
+so that the scores of all modes are comparable:
+
+    minimax    max_player_move/min_player_move without transposition table,
+               move ordering and threat pruning, the original search
+    alphabeta  negamax_search, negamax with transposition table and move
+               ordering
+    pvs        negamax_search, principal variation search
+    mtdf       negamax_search, MTD(f)
+
+Run it with
+
+    python -m agents.agent_minimax.benchmark [depth]
+"""
+import sys
+import time
+import numpy as np
+from typing import Sequence, Dict
+from agents.common import moves_to_boards, PLAYER1, PLAYER2
+from agents.agent_minimax.minimax import MinimaxState, max_player_move, \
+    negamax_search, heuristic, LAST_MOVE_HEURISTIC, SEARCH_MODES, warmup
+from agents.agent_minimax.move_ordering import MoveOrdering
+
+# positions as move sequences (columns counted from 1), none of them is over
+POSITIONS = ('6475543555122', '4137637272112', '7521676752', '627131713434',
+             '526235', '72544', '66333', '441374361224', '72223336',
+             '6415257', '63543421', '17111')
+
+
+def benchmark(depth: int = 7,
+              positions: Sequence[str] = POSITIONS) -> Dict[str, dict]:
+    """
+    Searches every position with every mode and returns per mode the sum of
+    the nodes and of the times and the scores.
+
+    Parameters
+    ----------
+    depth: int
+        search depth
+    positions: Sequence[str]
+        positions as move sequences
+
+    Returns
+    -------
+    dict
+        mode -> {'nodes': int, 'time': float, 'scores': list}
+    """
+    boards = moves_to_boards(positions)
+    players = [PLAYER1 if len(moves) % 2 == 0 else PLAYER2
+               for moves in positions]
+    results = {}
+    for mode in ('minimax',) + SEARCH_MODES:
+        nodes = 0
+        seconds = 0.
+        scores = []
+        for board, player in zip(boards, players):
+            if mode == 'minimax':
+                state = MinimaxState(
+                    2, MoveOrdering(hash_move=False, center=False,
+                                    killers=False, history=False),
+                    use_table=False, use_pruning=False)
+                state.prepare(board, player, 4, heuristic)
+                t0 = time.perf_counter()
+                score, _ = max_player_move(
+                    board.copy(), player, depth, -99999, 99999,
+                    heuristic_function=heuristic, state=state)
+            else:
+                state = MinimaxState()
+                t0 = time.perf_counter()
+                score, _, _ = negamax_search(
+                    board, player, state, max_depth=depth, mode=mode,
+                    heuristic_code=LAST_MOVE_HEURISTIC)
+            seconds += time.perf_counter() - t0
+            nodes += state.nodes
+            scores.append(score)
+        results[mode] = {'nodes': nodes, 'time': seconds, 'scores': scores}
+    return results
+
+
+def outcome(scores: Sequence[int]) -> np.ndarray:
+    """
+    Maps the scores of wins and losses (10000 times the remaining depth,
+    which differs between a search of fixed depth and iterative deepening
+    that stops at the first win found) to +-10000.
+    """
+    scores = np.asarray(scores)
+    return np.where(np.abs(scores) >= 10000, np.sign(scores) * 10000,
+                    scores)
+
+
+def main(depth: int = 7):
+    """
+    Prints the results of benchmark as table, after compiling the kernels.
+    """
+    warmup()
+    results = benchmark(depth)
+    reference = outcome(results['minimax']['scores'])
+    nodes = results['minimax']['nodes']
+    print(f'{len(POSITIONS)} positions, depth {depth}')
+    print(f'{"mode":<10}{"nodes":>12}{"time [s]":>10}{"nodes/s":>12}'
+          f'{"nodes %":>9}  same scores')
+    for mode, result in results.items():
+        print(f'{mode:<10}{result["nodes"]:>12}{result["time"]:>10.3f}'
+              f'{result["nodes"] / max(result["time"], 1e-9):>12.0f}'
+              f'{100 * result["nodes"] / nodes:>9.1f}  '
+              f'{np.array_equal(outcome(result["scores"]), reference)}')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,115 @@
+"""
+Reader of the opening book of the agents (built by agents.opening_book):
+the file is memory-mapped and a position is looked up by binary search of
+its canonical key (see agents.common.canonical_hash), so that the agents
+answer the first moves of a game instantly. Unlike agents.opening_book
+this module does not import the search, which imports it.
+
+The file holds 64 bit words: the header (BOOK_MAGIC, rows, columns, k),
+the sorted keys and the entries packed like the entries of the
+transposition table (see agents.agent_minimax.transposition_table).
+"""
+import os
+import numpy as np
+from typing import Optional, Tuple, Dict
+from agents.common import BoardPiece, PLAYER1, PLAYER2, NO_PLAYER, \
+    CONNECT_N, canonical_hash, OPENING_BOOK
+from agents.agent_minimax.transposition_table import unpack_entry
+
+BOOK_MAGIC = np.uint64(int.from_bytes(b'C4BOOK01', 'little'))
+HEADER_SIZE = 4
+
+# books loaded per path
+_books: Dict[str, 'OpeningBook'] = {}
+
+
+class OpeningBook:
+
+    def __init__(self, path: str):
+        """
+        Opening book stored in the file at path, which is memory-mapped (not
+        read), see build_book.
+
+        Parameters
+        ----------
+        path: str
+            path of the book file
+        """
+
+        words = np.memmap(path, dtype=np.uint64, mode='r')
+        if words.shape[0] < HEADER_SIZE or words[0] != BOOK_MAGIC:
+            raise ValueError(f'{path} is not an opening book')
+        self.rows, self.columns, self.k = map(int, words[1:HEADER_SIZE])
+        size = (words.shape[0] - HEADER_SIZE) // 2
+        self.keys = words[HEADER_SIZE:HEADER_SIZE + size]
+        self.data = words[HEADER_SIZE + size:HEADER_SIZE + 2 * size]
+
+    def __len__(self) -> int:
+        return self.keys.shape[0]
+
+    def lookup(self,
+               board: np.ndarray,
+               player: BoardPiece,
+               k: int = CONNECT_N) -> Optional[Tuple[int, int, int]]:
+        """
+        Looks up the position of player to move (PLAYER1 moves first) on
+        board.
+
+        Parameters
+        ----------
+        board: np.ndarray
+            current game board
+        player: BoardPiece
+            player to move
+        k: int
+            number of pieces in a row needed to win
+
+        Returns
+        -------
+        Optional[Tuple[int, int, int]]
+            best column, score (of player) and search depth of the position,
+            None if it is not in the book
+        """
+
+        if board.shape != (self.rows, self.columns) or k != self.k \
+                or len(self) == 0:
+            return None
+        ply = int(np.count_nonzero(board != NO_PLAYER))
+        if player != (PLAYER1 if ply % 2 == 0 else PLAYER2):
+            return None
+        key, mirrored = canonical_hash(board)
+        index = int(np.searchsorted(self.keys, key))
+        if index == len(self) or self.keys[index] != key:
+            return None
+        score, depth, _, column = unpack_entry(self.data[index])
+        if mirrored:
+            column = self.columns - 1 - column
+        return int(column), int(score), int(depth)
+
+
+def load_book(path: str = OPENING_BOOK) -> Optional[OpeningBook]:
+    """
+    Returns the book at path, which is mapped on the first call and kept
+    for the following ones, None if there is no such file.
+    """
+    book = _books.get(path)
+    if book is None and os.path.exists(path):
+        book = _books[path] = OpeningBook(path)
+    return book
+
+
+def book_move(board: np.ndarray,
+              player: BoardPiece,
+              k: int = CONNECT_N,
+              path: Optional[str] = OPENING_BOOK) -> Optional[int]:
+    """
+    Returns the column the book at path plays for player on board, None if
+    the position is not in the book, path is None or there is no book.
+    """
+    if path is None:
+        return None
+    book = load_book(path)
+    if book is None:
+        return None
+    entry = book.lookup(board, player, k)
+    return None if entry is None else entry[0]
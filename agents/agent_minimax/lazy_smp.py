@@ -0,0 +1,161 @@
+"""
+Lazy SMP search of the minimax agent. The workers of the process pool of
+agents.agent_minimax.parallel all run the same iterative deepening search
+(negamax_search) of the position, each with its own perturbation of the
+move order (MoveOrdering with seed). They share one lock-free
+transposition table in shared memory (SharedTranspositionTable), so that
+every worker profits from the results of the others and the workers,
+searching the moves in different orders, spread over the tree. The result
+of the worker that completed the deepest search is played.
+"""
+import time
+import numpy as np
+from typing import Optional, Tuple, Dict
+from agents.common import BoardPiece, CONNECT_N
+from agents.agent_minimax.minimax import MinimaxState, negamax_search, \
+    WINDOWS_HEURISTIC, PVS, SEARCH_MODES
+from agents.agent_minimax.move_ordering import MoveOrdering
+from agents.agent_minimax.transposition_table import \
+    SharedTranspositionTable, PROBES, HITS
+from agents.agent_minimax.parallel import get_pool
+
+# states of a worker process per (name of the shared table, seed) and the
+# attached tables per name, tables of the last MAX_TABLES states searched
+# with (e.g. of both players) are kept
+_worker_states: Dict[Tuple[str, Optional[int]], MinimaxState] = {}
+_worker_tables: Dict[str, SharedTranspositionTable] = {}
+MAX_TABLES = 2
+
+
+def smp_worker(board: np.ndarray,
+               player: BoardPiece,
+               tt_name: str,
+               tt_size: int,
+               seed: Optional[int],
+               deadline: Optional[float],
+               node_limit: Optional[int],
+               max_depth: Optional[int],
+               k: int,
+               heuristic_code: int,
+               mode: str) -> dict:
+    """
+    Task of a worker: searches the position with negamax_search, using the
+    shared transposition table tt_name and the move order perturbed by
+    seed (None for the unperturbed order).
+
+    Returns
+    -------
+    dict
+        seed, score, column and depth of the search, nodes, seconds,
+        nodes_per_second and the probes and hits of the table
+    """
+    table = _worker_tables.get(tt_name)
+    if table is None:
+        if len(_worker_tables) >= MAX_TABLES:
+            # detach the table used least recently
+            name = next(iter(_worker_tables))
+            for key in [key for key in _worker_states if key[0] == name]:
+                del _worker_states[key]
+            _worker_tables.pop(name).close()
+        table = SharedTranspositionTable(tt_size, tt_name)
+    else:
+        del _worker_tables[tt_name]
+    _worker_tables[tt_name] = table
+    state = _worker_states.get((tt_name, seed))
+    if state is None:
+        state = _worker_states[(tt_name, seed)] = MinimaxState(
+            ordering=MoveOrdering(*board.shape, seed=seed), tt=table)
+    table.stats.fill(0)
+
+    timeout = None if deadline is None else max(deadline - time.time(), 0)
+    start = time.perf_counter()
+    score, column, depth = negamax_search(board, player, state, timeout,
+                                          node_limit, max_depth, k,
+                                          heuristic_code, mode)
+    seconds = time.perf_counter() - start
+    return {'seed': seed, 'score': score, 'column': column, 'depth': depth,
+            'nodes': state.nodes, 'seconds': seconds,
+            'nodes_per_second': state.nodes / max(seconds, 1e-9),
+            'probes': int(table.stats[PROBES]),
+            'hits': int(table.stats[HITS])}
+
+
+def lazy_smp_search(board: np.ndarray,
+                    player: BoardPiece,
+                    state: MinimaxState,
+                    timeout: Optional[float] = None,
+                    node_limit: Optional[int] = None,
+                    max_depth: Optional[int] = None,
+                    k: int = CONNECT_N,
+                    heuristic_code: int = WINDOWS_HEURISTIC,
+                    mode: str = PVS,
+                    workers: int = 7) -> Tuple[int, int, int]:
+    """
+    Lazy SMP: searches the board in all workers with shared transposition
+    table and returns the result of the deepest completed search (of the
+    first worker among equally deep ones, the one with unperturbed order).
+    The table of state is replaced by a SharedTranspositionTable of the same
+    size on the first call and kept for the following moves.
+    Per worker statistics (see smp_worker) are stored in
+    state.worker_statistics, the statistics of state.tt are the sums over
+    the workers, such that state.tt.hit_rate is the hit rate of the shared
+    table.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        current game board, not changed
+    player: BoardPiece
+        player for whom a move is searched
+    state: MinimaxState
+        state holding the shared table, nodes (sum over the workers) and
+        depth are set by the search
+    timeout: float
+        time limit in seconds, None for no limit
+    node_limit: int
+        maximal number of nodes searched by every worker, None for no limit
+    max_depth: int
+        maximal search depth, None for no limit
+    k: int
+        number of pieces in a row needed to win
+    heuristic_code: int
+        heuristic at the leaves, see negamax
+    mode: str
+        'alphabeta', 'pvs' or 'mtdf'
+    workers: int
+        number of worker processes
+
+    Returns
+    -------
+    score: int
+        score of the deepest completed search
+    column: int
+        best column of the deepest completed search
+    depth: int
+        depth of the deepest completed search
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f'unknown search mode {mode}, '
+                         f'expected one of {SEARCH_MODES}')
+    deadline = None if timeout is None else time.time() + timeout
+    if not isinstance(state.tt, SharedTranspositionTable):
+        state.tt = SharedTranspositionTable(len(state.tt))
+    # the owner clears the shared table if the configuration changed
+    state.prepare(board, player, k, heuristic_code, 'negamax')
+
+    pool, _ = get_pool(workers)
+    futures = [pool.submit(smp_worker, board, player, state.tt.name,
+                           len(state.tt), seed if seed > 0 else None,
+                           deadline, node_limit, max_depth, k,
+                           heuristic_code, mode)
+               for seed in range(workers)]
+    results = [future.result() for future in futures]
+
+    best = max(results, key=lambda result: result['depth'])
+    state.worker_statistics = results
+    state.tt.stats.fill(0)
+    state.tt.stats[PROBES] = sum(result['probes'] for result in results)
+    state.tt.stats[HITS] = sum(result['hits'] for result in results)
+    state.nodes = sum(result['nodes'] for result in results)
+    state.depth = best['depth']
+    return best['score'], best['column'], best['depth']
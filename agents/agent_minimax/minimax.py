@@ -1,21 +1,213 @@
+import time
 import numpy as np
+from numba import njit
 from agents.common import BoardPiece, SavedState, PlayerAction, \
-    apply_player_action, connected_four, NO_PLAYER, PLAYER1, PLAYER2, \
-    connected_n, change_player
-from typing import Tuple, Optional
+    connected_four, connected_four_cell, connected_k_cell, connected_n, \
+    change_player, \
+    column_heights, make_move, unmake_move, CONNECT_N, line_table, \
+    last_row, connected_lines, count_lines, window_counts, PLAYER1, PLAYER2, \
+    NO_PLAYER, \
+    initialize_game_state, zobrist_hash, zobrist_update, ZOBRIST_KEYS, \
+    ZOBRIST_TO_MOVE, OPENING_BOOK, window_state, window_update, window_delta, \
+    warmup as common_warmup
+from agents.agent_minimax.transposition_table import TranspositionTable, \
+    EXACT, LOWER, UPPER, CUTOFFS
+from agents.agent_minimax.move_ordering import MoveOrdering, \
+    NODES as ORDER_NODES, CUTOFFS as ORDER_CUTOFFS, FIRST_MOVE_CUTOFFS
+from agents.agent_minimax.transposition_table import tt_probe, tt_store
+from agents.agent_minimax.solver import EndgameSolver, fits_solver, \
+    warmup as solver_warmup
+from agents.agent_minimax.book import book_move
+from typing import Tuple, Optional, Callable
 
 MaxMin = np.int8
 MAX = MaxMin(1)
 MIN = MaxMin(-1)
 
+# defines type of the function (Heuristic) used to score the leaves
+Heuristic = Callable[
+    [np.ndarray, BoardPiece, MaxMin, PlayerAction, int],  # Arguments
+    int  # Score
+]
+
+# default time limit of a move in seconds
+TIMEOUT = 1.0
+# positions with fewer empty cells are solved exactly by generate_move
+SOLVE_BELOW = 22
+# whether warmup ran in this process
+_warmed_up = False
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when the time or node limit of the move is
+    reached.
+    """
+
+
+class MinimaxState(SavedState):
+
+    def __init__(self, tt_size: int = 2**20,
+                 ordering: Optional[MoveOrdering] = None,
+                 use_table: bool = True,
+                 tt: Optional[TranspositionTable] = None,
+                 use_pruning: bool = True):
+        """
+        State of the minimax agent kept between its moves: the transposition
+        table, the move ordering and the Zobrist key and ply of the board
+        searched, which are updated in place while moves are made and taken
+        back.
+
+        Parameters
+        ----------
+        tt_size: int
+            number of slots of the transposition table
+        ordering: MoveOrdering
+            move ordering of the search, a MoveOrdering with all heuristics
+            for the shape of the board if not given
+        use_table: bool
+            whether the search probes and updates the transposition table
+        tt: TranspositionTable
+            transposition table to use instead of a new one of tt_size
+            slots, e.g. a SharedTranspositionTable
+        use_pruning: bool
+            whether max_player_move and min_player_move prune moves by the
+            threats of the opponent (see pruned_moves), the compiled search
+            always does
+        """
+
+        self.tt = TranspositionTable(tt_size) if tt is None else tt
+        self.use_table = use_table
+        self.use_pruning = use_pruning
+        self.ordering = ordering
+        self.key = np.uint64(0)
+        self.ply = 0
+        # player, k and heuristic the stored scores belong to
+        self.config = None
+        # nodes searched for the current move and its limits
+        self.nodes = 0
+        self.node_limit = None
+        self.deadline = None
+        # depth of the last completed search
+        self.depth = 0
+        # statistics of the worker processes of the last parallel search
+        self.worker_statistics = []
+        # endgame solver, created on the first position solved and kept with
+        # its results for the rest of the game
+        self.solver: Optional[EndgameSolver] = None
+
+    def count_node(self):
+        """
+        Counts a searched node, raises SearchTimeout if the node limit is
+        exceeded or the deadline (in time.perf_counter seconds) has passed.
+        The clock is read every 1024 nodes.
+        """
+
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SearchTimeout
+        if self.deadline is not None and self.nodes & 1023 == 0 \
+                and time.perf_counter() > self.deadline:
+            raise SearchTimeout
+
+    def prepare(self, board: np.ndarray, player: BoardPiece, k: int,
+                heuristic_function: Optional[Heuristic],
+                engine: str = 'minimax'):
+        """
+        Sets the key to the one of board and the ply to 0, and clears table
+        and move ordering if the scores stored belong to another board
+        shape, k, heuristic or search engine ('minimax' for max_player_move,
+        which stores scores of the maximizing player, 'negamax' for negamax,
+        which stores scores of the player to move), or for 'minimax' to
+        another player.
+        """
+
+        # negamax scores are those of the player to move
+        config = (None if engine == 'negamax' else player, board.shape, k,
+                  heuristic_function, engine)
+        if config != self.config:
+            self.tt.clear()
+            if self.ordering is None or self.config is not None \
+                    and self.config[1] != board.shape:
+                self.ordering = MoveOrdering(*board.shape)
+            else:
+                self.ordering.clear()
+            self.config = config
+        self.key = np.uint64(zobrist_hash(board))
+        self.ply = 0
+
+    def move_made(self, player: BoardPiece, row: int, column: int):
+        """
+        Updates key and ply after player played in row and column. The key
+        is updated like zobrist_update, inline as the search calls this for
+        every move.
+        """
+        self.key ^= ZOBRIST_KEYS[player, row, column]
+        self.ply += 1
+
+    def move_unmade(self, player: BoardPiece, row: int, column: int):
+        """
+        Updates key and ply after the move of player in row and column was
+        taken back.
+        """
+        self.key ^= ZOBRIST_KEYS[player, row, column]
+        self.ply -= 1
+
+
+def minimax_state(saved_state: Optional[SavedState],
+                  player: BoardPiece) -> MinimaxState:
+    """
+    Returns the MinimaxState in saved_state, which is either the state itself
+    or a dict of the states of both players, or a new one.
+    """
+    if isinstance(saved_state, dict):
+        saved_state = saved_state.get(player)
+    if isinstance(saved_state, MinimaxState):
+        return saved_state
+    return MinimaxState()
+
+
+@njit(cache=True)
+def tt_score(score: int, stored_depth: int, depth: int) -> int:
+    """
+    Converts a score stored with stored_depth to the given depth. Wins are
+    scored 10000 * depth at the node they happen, a win found with a
+    deeper search is that many plies less valuable at depth (at least
+    10000).
+    """
+    if abs(score) < 10000:
+        return score
+    plies = abs(score) // 10000 - (stored_depth - depth)
+    return int(np.sign(score)) * 10000 * max(plies, 1)
+
 
 def generate_move(board: np.ndarray,
                   player: BoardPiece,
-                  saved_state: Optional[SavedState])\
+                  saved_state: Optional[SavedState],
+                  k: int = CONNECT_N,
+                  heuristic_function: Optional[Heuristic] = None,
+                  timeout: Optional[float] = TIMEOUT,
+                  node_limit: Optional[int] = None,
+                  depth: Optional[int] = None,
+                  mode: str = 'pvs',
+                  workers: int = 1,
+                  parallel: str = 'root',
+                  book: Optional[str] = OPENING_BOOK,
+                  solve_below: int = SOLVE_BELOW)\
                     -> Tuple[PlayerAction, Optional[SavedState]]:
     """
-    Generates move for player by calling the recursive
-    function max_player_move with depth 7, alpha=-99999 and beta=99999
+    Generates move for player by iterative deepening within the time limit
+    timeout, which starts after the kernels are compiled or loaded (see
+    warmup) in the first call of a process. The search runs in the
+    compiled kernel negamax (see negamax_search) for the heuristics
+    heuristic and heuristic_windows and in max_player_move (see
+    iterative_deepening) for any other heuristic function. With more than
+    one worker, the compiled search runs in parallel (see parallel, the
+    root splitting search does not use node_limit). The search plays its
+    moves on a copy of the board.
+    Positions in the opening book are answered without search, positions
+    with fewer than solve_below empty cells are solved exactly by the
+    EndgameSolver of the state (see agents.agent_minimax.solver).
 
     Parameters
     ----------
@@ -24,25 +216,236 @@ def generate_move(board: np.ndarray,
     player
         player for whom a move is generated
     saved_state
-        not used
+        MinimaxState of the player (or dict of the states of both players),
+        a new one is created if not given
+    k
+        number of pieces in a row needed to win
+    heuristic_function
+        function scoring the leaves, heuristic_windows by default (the
+        compiled search keeps its window counts up to date). Earlier
+        versions scored with heuristic by default, pass it to play like
+        them, the two choose different moves in many positions
+    timeout
+        time limit of the move in seconds, None for no limit
+    node_limit
+        maximal number of nodes searched, None for no limit
+    depth
+        maximal search depth, None to search until a limit is reached
+    mode
+        search mode of the compiled search: 'alphabeta', 'pvs' (principal
+        variation search) or 'mtdf' (MTD(f)), see negamax_search
+    workers
+        number of processes searching in parallel, 1 to search in this
+        process
+    parallel
+        parallel search with more than one worker: 'root' to split the moves
+        at the root (see agents.agent_minimax.parallel) or 'lazy_smp' for
+        workers searching the whole tree with a shared transposition table
+        (see agents.agent_minimax.lazy_smp)
+    book
+        path of the opening book (see agents.opening_book), None to always
+        search
+    solve_below
+        number of empty cells below which the position is solved instead of
+        searched, 0 to never solve
     Returns
     -------
     PlayerAction
         column to be played
     saved_state
-        not used
+        MinimaxState with the transposition table of the search
+    """
+
+    state = minimax_state(saved_state, player)
+    column = book_move(board, player, k, book)
+    if column is not None:
+        return PlayerAction(column), state
+    # the kernels are compiled (or loaded from the cache) before, not within
+    # the time limit of the first move
+    if not _warmed_up:
+        warmup()
+    if np.count_nonzero(board == NO_PLAYER) < solve_below \
+            and fits_solver(*board.shape):
+        if state.solver is None:
+            state.solver = EndgameSolver()
+        _, column, _ = state.solver.solve(board, player, k)
+        state.nodes = state.solver.nodes
+        return PlayerAction(column), state
+
+    heuristic_code = COMPILED_HEURISTICS.get(heuristic_function, -1)
+    if heuristic_code < 0:
+        score, column, _ = iterative_deepening(board, player, state,
+                                               timeout, node_limit, depth, k,
+                                               heuristic_function)
+    elif workers > 1 and parallel == 'lazy_smp':
+        from agents.agent_minimax.lazy_smp import lazy_smp_search
+        score, column, _ = lazy_smp_search(board, player, state, timeout,
+                                           node_limit, depth, k,
+                                           heuristic_code, mode, workers)
+    elif workers > 1:
+        from agents.agent_minimax.parallel import parallel_search
+        score, column, _ = parallel_search(board, player, state, timeout,
+                                           depth, k, heuristic_code, mode,
+                                           workers)
+    else:
+        score, column, _ = negamax_search(board, player, state, timeout,
+                                          node_limit, depth, k,
+                                          heuristic_code, mode)
+    return PlayerAction(column), state
+
+
+def iterative_deepening(board: np.ndarray,
+                        player: BoardPiece,
+                        state: MinimaxState,
+                        timeout: Optional[float] = None,
+                        node_limit: Optional[int] = None,
+                        max_depth: Optional[int] = None,
+                        k: int = CONNECT_N,
+                        heuristic_function: Optional[Heuristic] = None) \
+        -> Tuple[int, int, int]:
+    """
+    Searches the board with max_player_move at depth 1, 2, 3, ... until the
+    time limit or the node limit is reached, the depth reaches max_depth
+    or the number of empty cells, or a win or loss is found. The best move
+    of an iteration is stored in the transposition table of state and is
+    searched first by the next one. The search of depth 1 is always
+    completed, the one interrupted by a limit is discarded.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        current game board, not changed
+    player: BoardPiece
+        player for whom a move is searched
+    state: MinimaxState
+        state with the transposition table, nodes, node_limit, deadline
+        and depth are set by the search
+    timeout: float
+        time limit in seconds, None for no limit
+    node_limit: int
+        maximal number of nodes searched, None for no limit
+    max_depth: int
+        maximal search depth, None for no limit
+    k: int
+        number of pieces in a row needed to win
+    heuristic_function: Heuristic
+        function scoring the leaves, heuristic if not given
+
+    Returns
+    -------
+    score: int
+        score of the deepest completed search
+    column: int
+        best column of the deepest completed search
+    depth: int
+        depth of the deepest completed search
+    """
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    empty_cells = max(int(np.count_nonzero(board == NO_PLAYER)), 1)
+    if max_depth is None or max_depth > empty_cells:
+        max_depth = empty_cells
+
+    state.nodes = 0
+    state.depth = 0
+    state.prepare(board, player, k, heuristic_function)
+    state.ordering.new_move()
+    score, column = -99999, -1
+    try:
+        for depth in range(1, max_depth + 1):
+            state.prepare(board, player, k, heuristic_function)
+            score, column = max_player_move(
+                board.copy(), player, depth, -99999, 99999, k=k,
+                heuristic_function=heuristic_function, state=state)
+            state.depth = depth
+            if abs(score) >= 10000:
+                break
+            # a move is known, from here on the limits apply
+            state.deadline = deadline
+            state.node_limit = node_limit
+    except SearchTimeout:
+        # keep the result of the last completed iteration
+        pass
+    finally:
+        state.deadline = None
+        state.node_limit = None
+
+    return score, column, state.depth
+
+
+def pruned_moves(board: np.ndarray,
+                 heights: np.ndarray,
+                 player: BoardPiece,
+                 k: int = CONNECT_N) -> Tuple[int, int]:
+    """
+    Forward pruning by the threats of the opponent of player, the empty
+    cells where a piece of the opponent would connect k. A threat in the
+    next free cell of a column has to be blocked, so that it is the only
+    move searched, and two of them cannot be blocked at once. Otherwise the
+    moves right below a threat are not searched, as the opponent wins by
+    playing on top of them. The pruned moves lose with the next move of the
+    opponent, so the score of the search does not change.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        current game board, player has no immediate win
+    heights: np.ndarray
+        column heights of the board
+    player: BoardPiece
+        player to move
+    k: int
+        number of pieces in a row needed to win
+
+    Returns
+    -------
+    skip: int
+        bit mask of the columns not to be searched
+    lost: int
+        column to play if every move loses (all are skipped), else -1
     """
+    max_row, max_column = board.shape
+    opponent = change_player(player)
+    legal = forced = below = 0
+    n_forced = 0
+    for column in range(max_column):
+        row = heights[column]
+        if row >= max_row:
+            continue
+        legal |= 1 << column
+        for threat_row in range(row, min(row + 2, max_row)):
+            board[threat_row, column] = opponent
+            threat = connected_k_cell(board, opponent, threat_row, column, k)
+            board[threat_row, column] = NO_PLAYER
+            if threat:
+                if threat_row == row:
+                    forced |= 1 << column
+                    n_forced += 1
+                else:
+                    below |= 1 << column
+                break
 
-    depth = 7
-    score, column = max_player_move(board, player, depth, -99999, 99999)
-    return PlayerAction(column), saved_state
+    if n_forced == 1:
+        skip = legal & ~forced
+    elif n_forced > 1:
+        skip = legal
+    else:
+        skip = below
+    if legal == 0 or skip != legal:
+        return skip, -1
+    lost = forced if forced else legal
+    return skip, (lost & -lost).bit_length() - 1
 
 
 def max_player_move(board: np.ndarray,
                     max_player: BoardPiece,
                     depth: int,
                     alpha: int,
-                    beta: int) -> Tuple[int, int]:
+                    beta: int,
+                    heights: Optional[np.ndarray] = None,
+                    k: int = CONNECT_N,
+                    heuristic_function: Optional[Heuristic] = None,
+                    state: Optional[MinimaxState] = None) \
+        -> Tuple[int, int]:
     """
     Finds the best move for the maximizing player: the column to
     be played in order to reach a maximal score. If depth equals zero,
@@ -52,11 +455,21 @@ def max_player_move(board: np.ndarray,
     with depth-1.
     If a win happens the score 10000 * depth is returned, such that early wins
     are more favorable.
+    Moves are pruned by the threats of the opponent (see pruned_moves),
+    unless the given state turns the pruning off.
+    Moves are made and taken back in place (make_move, unmake_move), the
+    board is unchanged when the function returns.
+    If a state is given, the node is counted (MinimaxState.count_node, which
+    raises SearchTimeout at the limits of the move) and the transposition
+    table is probed before the moves are searched: a stored score that is
+    exact or outside of (alpha, beta) is returned, otherwise the moves are
+    searched in the order of state.ordering (see MoveOrdering). The result
+    is stored afterwards.
 
     Parameters
     ----------
     board: np.ndarray
-        current game board (copy)
+        current game board
     max_player: BoardPiece
         current player (player one or two)
     depth: int
@@ -65,6 +478,15 @@ def max_player_move(board: np.ndarray,
         current minimal score for maximizing player
     beta: int
         current maximal score for minimizing player
+    heights: np.ndarray
+        column heights of the board, computed if not given
+    k: int
+        number of pieces in a row needed to win
+    heuristic_function: Heuristic
+        function scoring the leaves, heuristic if not given
+    state: MinimaxState
+        transposition table and key of board, the table is not used if not
+        given
 
     Returns
     -------
@@ -73,52 +495,113 @@ def max_player_move(board: np.ndarray,
     player_action: int
         column to be played - PlayerAction(column) that yields maximal score
     """
+    if heights is None:
+        heights = column_heights(board)
     max_row, max_column = board.shape
     max_score = -99999
     player_action = -1
-    possible_action = np.argwhere(board[max_row-1, :] == NO_PLAYER).flatten()
-    try:
-        player_action = np.random.choice(possible_action)
-    except ValueError:
-        max_score = -10000
+
+    if state is not None:
+        state.count_node()
 
     # termination condition recursion: evaluate heuristic of board
     if depth == 0:
-        return evaluate_max(board, max_player, alpha, beta)
+        return evaluate_max(board, max_player, alpha, beta, heights, k,
+                            heuristic_function)
 
     # check for immediate wins to speed up
     for column in range(max_column):
-        if board[max_row-1, column] == NO_PLAYER:
-            board_new = apply_player_action(board, PlayerAction(column),
-                                            max_player, copy=True)
-            if connected_four(board_new, max_player, PlayerAction(column)):
+        if heights[column] < max_row:
+            row = make_move(board, heights, column, max_player)
+            is_win = connected_k_cell(board, max_player, row, column, k)
+            unmake_move(board, heights, column)
+            if is_win:
                 return 10000 * depth, PlayerAction(column)
 
-    # loop over columns and apply player action if column not full
-    for column in range(max_column):
-        if board[max_row-1, column] == NO_PLAYER:
-            board_new = apply_player_action(board, PlayerAction(column),
-                                            max_player, copy=True)
+    # look up the position in the transposition table
+    alpha_original = alpha
+    tt_move = -1
+    if state is not None and state.use_table:
+        key = state.key ^ ZOBRIST_TO_MOVE[max_player]
+        found, score, tt_depth, flag, tt_move = state.tt.probe(key)
+        if found and tt_depth >= depth:
+            score = tt_score(score, tt_depth, depth)
+            if flag == EXACT or (flag == LOWER and score >= beta) \
+                    or (flag == UPPER and score <= alpha):
+                state.tt.stats[CUTOFFS] += 1
+                return score, PlayerAction(tt_move)
 
-            # call min_player_move to get score of column
-            min_player = change_player(max_player)
-            score, _ = min_player_move(board_new, min_player, depth-1,
-                                       alpha, beta)
+    # threats of the opponent: forced moves and moves that lose at once
+    skip = 0
+    if state is None or state.use_pruning:
+        skip, lost = pruned_moves(board, heights, max_player, k)
+        if lost >= 0:
+            return -10000 * max(depth - 1, 1), PlayerAction(lost)
 
-            # update max_score and player_action
-            if score > max_score:
-                max_score = score
-                player_action = column
-                if max_score > alpha:
-                    alpha = max_score
-                if alpha >= beta:
-                    break
+    # loop over columns (ordered if state is given) and apply player action
+    # if column not full
+    min_player = change_player(max_player)
+    if state is None:
+        columns = [column for column in range(max_column)
+                   if heights[column] < max_row]
+    else:
+        columns = state.ordering.order(heights, max_row, max_player,
+                                       state.ply, tt_move)
+    columns = [column for column in columns if not skip >> column & 1]
+    n_moves = 0
+    cutoff = False
+    for column in columns:
+        row = make_move(board, heights, column, max_player)
+        if state is not None:
+            state.move_made(max_player, row, column)
+
+        # call min_player_move to get score of column
+        score, _ = min_player_move(board, min_player, depth-1,
+                                   alpha, beta, heights, k,
+                                   heuristic_function, state)
+        unmake_move(board, heights, column)
+        if state is not None:
+            state.move_unmade(max_player, row, column)
+        n_moves += 1
+
+        # update max_score and player_action
+        if score > max_score:
+            max_score = score
+            player_action = column
+            if max_score > alpha:
+                alpha = max_score
+            if alpha >= beta:
+                cutoff = True
+                if state is not None:
+                    state.ordering.cutoff(max_player, row, column, state.ply,
+                                          depth)
+                break
+    if state is not None:
+        state.ordering.searched(n_moves, cutoff)
+
+    # no valid action left
+    if player_action == -1:
+        max_score = -10000
+
+    if state is not None and state.use_table:
+        if max_score <= alpha_original:
+            flag = UPPER
+        elif max_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        state.tt.store(key, max_score, depth, flag, player_action)
 
     return max_score, PlayerAction(player_action)
 
 
 def min_player_move(board: np.ndarray, min_player: BoardPiece, depth: int,
-                    alpha: int, beta: int) -> Tuple[int, int]:
+                    alpha: int, beta: int,
+                    heights: Optional[np.ndarray] = None,
+                    k: int = CONNECT_N,
+                    heuristic_function: Optional[Heuristic] = None,
+                    state: Optional[MinimaxState] = None) \
+        -> Tuple[int, int]:
     """
     Finds the best move for the minimizing player: the column to
     be played in order to reach a minimal score. If depth equals zero,
@@ -128,11 +611,21 @@ def min_player_move(board: np.ndarray, min_player: BoardPiece, depth: int,
     with depth-1.
     If a win happens the score -10000 * depth is returned, such that early
     wins are more favorable.
+    Moves are pruned by the threats of the opponent (see pruned_moves),
+    unless the given state turns the pruning off.
+    Moves are made and taken back in place (make_move, unmake_move), the
+    board is unchanged when the function returns.
+    If a state is given, the node is counted (MinimaxState.count_node, which
+    raises SearchTimeout at the limits of the move) and the transposition
+    table is probed before the moves are searched: a stored score that is
+    exact or outside of (alpha, beta) is returned, otherwise the moves are
+    searched in the order of state.ordering (see MoveOrdering). The result
+    is stored afterwards.
 
     Parameters
     ----------
     board: np.ndarray
-        current game board (copy)
+        current game board
     min_player: BoardPiece
         current player (player one or two)
     depth: int
@@ -141,6 +634,15 @@ def min_player_move(board: np.ndarray, min_player: BoardPiece, depth: int,
         current minimal score for maximizing player
     beta: int
         current maximal score for minimizing player
+    heights: np.ndarray
+        column heights of the board, computed if not given
+    k: int
+        number of pieces in a row needed to win
+    heuristic_function: Heuristic
+        function scoring the leaves, heuristic if not given
+    state: MinimaxState
+        transposition table and key of board, the table is not used if not
+        given
 
     Returns
     -------
@@ -149,56 +651,111 @@ def min_player_move(board: np.ndarray, min_player: BoardPiece, depth: int,
     player_action: int
         column to be played - PlayerAction(column) that yields maximal score
     """
-
+    if heights is None:
+        heights = column_heights(board)
     max_row, max_column = board.shape
     min_score = 99999
     player_action = -1
-    possible_action = np.argwhere(board[max_row-1, :] == NO_PLAYER).flatten()
-    try:
-        player_action = np.random.choice(possible_action)
-    except ValueError:
-        min_score = 10000
+
+    if state is not None:
+        state.count_node()
 
     # termination condition recursion: evaluate heuristic of board
     if depth == 0:
-        return evaluate_min(board, min_player, alpha, beta)
+        return evaluate_min(board, min_player, alpha, beta, heights, k,
+                            heuristic_function)
 
     # check for immediate wins - for speed up
     for column in range(max_column):
-        if board[max_row-1, column] == NO_PLAYER:
-            board_new = apply_player_action(board, PlayerAction(column),
-                                            min_player, copy=True)
-            if connected_four(board_new, min_player, PlayerAction(column)):
+        if heights[column] < max_row:
+            row = make_move(board, heights, column, min_player)
+            is_win = connected_k_cell(board, min_player, row, column, k)
+            unmake_move(board, heights, column)
+            if is_win:
                 return -10000 * depth, PlayerAction(column)
 
-    # loop over columns and apply player action if column not full
-    for column in range(max_column):
-        if board[max_row-1, column] == NO_PLAYER:
-            board_new = apply_player_action(board, PlayerAction(column),
-                                            min_player, copy=True)
+    # look up the position in the transposition table
+    beta_original = beta
+    tt_move = -1
+    if state is not None and state.use_table:
+        key = state.key ^ ZOBRIST_TO_MOVE[min_player]
+        found, score, tt_depth, flag, tt_move = state.tt.probe(key)
+        if found and tt_depth >= depth:
+            score = tt_score(score, tt_depth, depth)
+            if flag == EXACT or (flag == LOWER and score >= beta) \
+                    or (flag == UPPER and score <= alpha):
+                state.tt.stats[CUTOFFS] += 1
+                return score, PlayerAction(tt_move)
 
-            # call max_player_move to get score of column
-            max_player = change_player(min_player)
-            score, _ = max_player_move(board_new, max_player, depth-1,
-                                       alpha, beta)
+    # threats of the opponent: forced moves and moves that lose at once
+    skip = 0
+    if state is None or state.use_pruning:
+        skip, lost = pruned_moves(board, heights, min_player, k)
+        if lost >= 0:
+            return 10000 * max(depth - 1, 1), PlayerAction(lost)
 
-            # update max_score and player_action
-            if score < min_score:
-                min_score = score
-                player_action = column
-                if min_score < beta:
-                    beta = min_score
-                if beta <= alpha:
-                    break
+    # loop over columns (ordered if state is given) and apply player action
+    # if column not full
+    max_player = change_player(min_player)
+    if state is None:
+        columns = [column for column in range(max_column)
+                   if heights[column] < max_row]
+    else:
+        columns = state.ordering.order(heights, max_row, min_player,
+                                       state.ply, tt_move)
+    columns = [column for column in columns if not skip >> column & 1]
+    n_moves = 0
+    cutoff = False
+    for column in columns:
+        row = make_move(board, heights, column, min_player)
+        if state is not None:
+            state.move_made(min_player, row, column)
 
-    return min_score, PlayerAction(player_action)
+        # call max_player_move to get score of column
+        score, _ = max_player_move(board, max_player, depth-1,
+                                   alpha, beta, heights, k,
+                                   heuristic_function, state)
+        unmake_move(board, heights, column)
+        if state is not None:
+            state.move_unmade(min_player, row, column)
+        n_moves += 1
 
+        # update max_score and player_action
+        if score < min_score:
+            min_score = score
+            player_action = column
+            if min_score < beta:
+                beta = min_score
+            if beta <= alpha:
+                cutoff = True
+                if state is not None:
+                    state.ordering.cutoff(min_player, row, column, state.ply,
+                                          depth)
+                break
+    if state is not None:
+        state.ordering.searched(n_moves, cutoff)
+
+    # no valid action left
+    if player_action == -1:
+        min_score = 10000
+
+    if state is not None and state.use_table:
+        if min_score >= beta_original:
+            flag = LOWER
+        elif min_score <= alpha:
+            flag = UPPER
+        else:
+            flag = EXACT
+        state.tt.store(key, min_score, depth, flag, player_action)
+
+    return min_score, PlayerAction(player_action)
 
 
 def heuristic(board: np.ndarray,
               player: BoardPiece,
               max_min: MaxMin,
-              last_action) -> int:
+              last_action,
+              k: int = CONNECT_N) -> int:
     """
     Evaluates the board for the given player in respect to the
     last column played (last_action). The achieved score for the player by
@@ -207,6 +764,9 @@ def heuristic(board: np.ndarray,
     and or two connected board pieces and if so how many. The score is then
     calculated as follows:
     (number_connected_3 * 100 + number_connected_2 * 10) * max_min
+    For k other than four, the lines through the last piece with k-1 and
+    k-2 pieces of the player (and no opponent piece) are counted instead,
+    using the line table of the board.
 
     Parameters
     ----------
@@ -220,12 +780,25 @@ def heuristic(board: np.ndarray,
         or maximizing player (max_min = 1)
     last_action: PlayerAction
         last column played by player
+    k: int
+        number of pieces in a row needed to win
 
     Returns
     -------
     int score
     """
 
+    if k != CONNECT_N:
+        lines, cell_lines = line_table(board.shape[0], board.shape[1], k)
+        row = last_row(board, last_action)
+        if connected_lines(board, player, row, last_action, lines, cell_lines):
+            return (10000-1) * max_min
+        number_connected_3 = count_lines(board, player, row, last_action,
+                                         k-1, lines, cell_lines)
+        number_connected_2 = count_lines(board, player, row, last_action,
+                                         k-2, lines, cell_lines)
+        return (number_connected_3 * 100 + number_connected_2 * 10) * max_min
+
     if connected_four(board, player, last_action):
         return (10000-1) * max_min
 
@@ -235,10 +808,84 @@ def heuristic(board: np.ndarray,
     return (number_connected_3 * 100 + number_connected_2 * 10) * max_min
 
 
+def heuristic_windows(board: np.ndarray,
+                      player: BoardPiece,
+                      max_min: MaxMin,
+                      last_action: PlayerAction = None,
+                      k: int = CONNECT_N) -> int:
+    """
+    Evaluates the whole board for the given player by counting all windows
+    of k cells at once (window_counts), instead of only the lines through
+    the last action like heuristic does. This also counts threats that the
+    last move did not touch, and the threats of the opponent, which are
+    subtracted. If the player has won, 9999 * max_min is returned.
+    Otherwise the score is
+    (number_3 * 100 + number_2 * 10
+     - number_3_opponent * 100 - number_2_opponent * 10) * max_min
+    where number_3 is the number of windows with k-1 pieces of the player
+    and one empty cell and number_2 those with k-2 pieces of the player.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        current game board
+    player: BoardPiece
+        current player (player one or two)
+        in respect to which the board should be evaluated
+    max_min: MaxMin
+        whether player is the minimizing (max_min = -1)
+        or maximizing player (max_min = 1)
+    last_action: PlayerAction
+        not used, for compatibility with heuristic
+    k: int
+        number of pieces in a row needed to win
+
+    Returns
+    -------
+    int score
+    """
+
+    lines, _ = line_table(board.shape[0], board.shape[1], k)
+    return score_windows(board, player, lines) * max_min
+
+
+@njit(cache=True)
+def score_windows(board: np.ndarray,
+                  player: BoardPiece,
+                  lines: np.ndarray) -> int:
+    """
+    Kernel of heuristic_windows, returns the score for max_min = 1.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        current game board
+    player: BoardPiece
+        player in respect to which the board should be evaluated
+    lines: np.ndarray
+        windows of the board, see line_table
+
+    Returns
+    -------
+    int score
+    """
+    counts = window_counts(board, lines)
+    k = lines.shape[1]
+    if counts[player, k] > 0:
+        return 10000-1
+    opponent = PLAYER1 if player == PLAYER2 else PLAYER2
+    return (counts[player, k-1] - counts[opponent, k-1]) * 100 \
+        + (counts[player, k-2] - counts[opponent, k-2]) * 10
+
+
 def evaluate_max(board: np.ndarray,
                  max_player: BoardPiece,
                  alpha: int,
-                 beta: int) -> Tuple[int, int]:
+                 beta: int,
+                 heights: Optional[np.ndarray] = None,
+                 k: int = CONNECT_N,
+                 heuristic_function: Optional[Heuristic] = None) \
+        -> Tuple[int, int]:
     """
     Loops over all columns and calculates the score that would be achieved
     by the maximizing player when playing this column by calling the
@@ -248,13 +895,19 @@ def evaluate_max(board: np.ndarray,
     Parameters
     ----------
     board: np.ndarray
-        current game board (copy)
+        current game board
     max_player: BoardPiece
         current player (player one or two)
     alpha: int
         current minimal score for maximizing player
     beta: int
         current maximal score for minimizing player
+    heights: np.ndarray
+        column heights of the board, computed if not given
+    k: int
+        number of pieces in a row needed to win
+    heuristic_function: Heuristic
+        function scoring the leaves, heuristic if not given
 
     Returns
     -------
@@ -263,25 +916,26 @@ def evaluate_max(board: np.ndarray,
     player_action: int
         column to be played - PlayerAction(column) that yields maximal score
     """
+    if heights is None:
+        heights = column_heights(board)
+    if heuristic_function is None:
+        heuristic_function = heuristic
     max_row, max_column = board.shape
     max_score = -99999
     max_action = -1
-    possible_action = np.argwhere(board[max_row-1, :] == NO_PLAYER).flatten()
-    try:
-        max_action = np.random.choice(possible_action)
-    except ValueError:
-        max_score = -10000
 
     for column in range(max_column):
-        if board[max_row-1, column] == NO_PLAYER:
+        if heights[column] < max_row:
             # player action
-            board_new = apply_player_action(board, PlayerAction(column),
-                                            max_player, True)
+            row = make_move(board, heights, column, max_player)
             # check for win
-            if connected_four(board_new, max_player, PlayerAction(column)):
+            if connected_k_cell(board, max_player, row, column, k):
+                unmake_move(board, heights, column)
                 return 10000, PlayerAction(column)
             # evaluate score
-            score = heuristic(board_new, max_player, MAX, PlayerAction(column))
+            score = heuristic_function(board, max_player, MAX,
+                                       PlayerAction(column), k)
+            unmake_move(board, heights, column)
 
             if score > max_score:
                 max_score = score
@@ -291,13 +945,21 @@ def evaluate_max(board: np.ndarray,
                 if alpha >= beta:
                     break
 
+    # no valid action left
+    if max_action == -1:
+        max_score = -10000
+
     return max_score, PlayerAction(max_action)
 
 
 def evaluate_min(board: np.ndarray,
                  min_player: BoardPiece,
                  alpha: int,
-                 beta: int) -> Tuple[int, int]:
+                 beta: int,
+                 heights: Optional[np.ndarray] = None,
+                 k: int = CONNECT_N,
+                 heuristic_function: Optional[Heuristic] = None) \
+        -> Tuple[int, int]:
     """
     Loops over all columns and calculates the score that would be achieved
     by the minimizing player when playing this column by calling the
@@ -307,13 +969,19 @@ def evaluate_min(board: np.ndarray,
     Parameters
     ----------
     board: np.ndarray
-        current game board (copy)
+        current game board
     min_player: BoardPiece
         current player (player one or two)
     alpha: int
         current minimal score for maximizing player
     beta: int
         current maximal score for minimizing player
+    heights: np.ndarray
+        column heights of the board, computed if not given
+    k: int
+        number of pieces in a row needed to win
+    heuristic_function: Heuristic
+        function scoring the leaves, heuristic if not given
 
     Returns
     -------
@@ -322,25 +990,24 @@ def evaluate_min(board: np.ndarray,
     player_action: int
         column to be played - PlayerAction(column) that yields minimal score
     """
-
+    if heights is None:
+        heights = column_heights(board)
+    if heuristic_function is None:
+        heuristic_function = heuristic
     max_row, max_column = board.shape
     min_score = 99999
     min_action = -1
-    possible_action = np.argwhere(board[max_row-1, :] == NO_PLAYER).flatten()
-    try:
-        min_action = np.random.choice(possible_action)
-    except ValueError:
-        min_score = 10000
 
     for column in range(max_column):
-        if board[max_row-1, column] == NO_PLAYER:
-
-            board_new = apply_player_action(board, PlayerAction(column),
-                                            min_player, True)
-            if connected_four(board_new, min_player, PlayerAction(column)):
+        if heights[column] < max_row:
+            row = make_move(board, heights, column, min_player)
+            if connected_k_cell(board, min_player, row, column, k):
+                unmake_move(board, heights, column)
                 return -10000, PlayerAction(column)
 
-            score = heuristic(board_new, min_player, MIN, PlayerAction(column))
+            score = heuristic_function(board, min_player, MIN,
+                                       PlayerAction(column), k)
+            unmake_move(board, heights, column)
 
             if score < min_score:
                 min_score = score
@@ -349,4 +1016,761 @@ def evaluate_min(board: np.ndarray,
                     beta = min_score
                 if beta <= alpha:
                     break
+
+    # no valid action left
+    if min_action == -1:
+        min_score = 10000
+
     return min_score, PlayerAction(min_action)
+
+
+# Compiled negamax search
+# -----------------------
+# negamax is max_player_move and min_player_move (with evaluate_max and
+# evaluate_min at depth 0) in one numba kernel. Scores are those of the
+# player to move, the score of the maximizing player is the one of the
+# root. The kernel uses the arrays of the transposition table and of the
+# move ordering of a MinimaxState directly. The heuristic at the leaves is
+# selected by a code, as the kernel cannot call Python functions.
+
+LAST_MOVE_HEURISTIC = 0  # heuristic
+WINDOWS_HEURISTIC = 1  # heuristic_windows
+COMPILED_HEURISTICS = {None: WINDOWS_HEURISTIC,
+                       heuristic: LAST_MOVE_HEURISTIC,
+                       heuristic_windows: WINDOWS_HEURISTIC}
+
+# indices of the counters of negamax
+SEARCH_NODES = 0
+SEARCH_ABORTED = 1
+
+# search modes of negamax_search
+ALPHA_BETA = 'alphabeta'
+PVS = 'pvs'
+MTDF = 'mtdf'
+SEARCH_MODES = (ALPHA_BETA, PVS, MTDF)
+
+
+@njit(cache=True)
+def connected_cell(board: np.ndarray,
+                   player: BoardPiece,
+                   row: int,
+                   column: int,
+                   k: int,
+                   lines: np.ndarray,
+                   cell_lines: np.ndarray) -> bool:
+    """
+    Compiled connected_k_cell, the line table of the board is passed.
+    """
+    if k == CONNECT_N:
+        return connected_four_cell(board, player, row, column)
+    return connected_lines(board, player, row, column, lines, cell_lines)
+
+
+@njit(cache=True)
+def leaf_score(board: np.ndarray,
+               player: BoardPiece,
+               row: int,
+               column: int,
+               k: int,
+               lines: np.ndarray,
+               cell_lines: np.ndarray,
+               heuristic_code: int,
+               window_score: np.ndarray) -> int:
+    """
+    Compiled heuristic (heuristic_code LAST_MOVE_HEURISTIC) and
+    heuristic_windows (WINDOWS_HEURISTIC) for max_min = 1, after player
+    played in row and column without winning. The window score is read
+    from the window counts kept up to date by play and take_back.
+    """
+    if heuristic_code == WINDOWS_HEURISTIC:
+        return window_score[0] if player == PLAYER1 else -window_score[0]
+    if k == CONNECT_N:
+        return connected_n(board, player, column, 3) * 100 \
+            + connected_n(board, player, column, 2) * 10
+    return count_lines(board, player, row, column, k-1, lines,
+                       cell_lines) * 100 \
+        + count_lines(board, player, row, column, k-2, lines,
+                      cell_lines) * 10
+
+
+@njit(cache=True)
+def play(board: np.ndarray,
+         heights: np.ndarray,
+         column: int,
+         player: BoardPiece,
+         k: int,
+         cell_lines: np.ndarray,
+         windows: np.ndarray,
+         window_score: np.ndarray,
+         track: bool) -> int:
+    """
+    Drops a piece of player into column and returns its row. With track,
+    the window counts (see agents.common.window_state) are updated.
+    """
+    row = make_move(board, heights, column, player)
+    if track:
+        window_update(windows, window_score, cell_lines,
+                      row * board.shape[1] + column, player, 1, k)
+    return row
+
+
+@njit(cache=True)
+def is_win(board: np.ndarray,
+           player: BoardPiece,
+           row: int,
+           column: int,
+           k: int,
+           lines: np.ndarray,
+           cell_lines: np.ndarray,
+           window_score: np.ndarray,
+           track: bool) -> bool:
+    """
+    Returns whether the piece of player played by play wins, read from the
+    window counts with track.
+    """
+    if track:
+        return window_score[player] > 0
+    return connected_cell(board, player, row, column, k, lines, cell_lines)
+
+
+@njit(cache=True)
+def take_back(board: np.ndarray,
+              heights: np.ndarray,
+              row: int,
+              column: int,
+              player: BoardPiece,
+              k: int,
+              cell_lines: np.ndarray,
+              windows: np.ndarray,
+              window_score: np.ndarray,
+              track: bool):
+    """
+    Removes the piece of player played by play.
+    """
+    if track:
+        window_update(windows, window_score, cell_lines,
+                      row * board.shape[1] + column, player, -1, k)
+    unmake_move(board, heights, column)
+
+
+@njit(cache=True)
+def threat_cell(board: np.ndarray,
+                player: BoardPiece,
+                row: int,
+                column: int,
+                k: int,
+                lines: np.ndarray,
+                cell_lines: np.ndarray,
+                windows: np.ndarray,
+                track: bool) -> bool:
+    """
+    Returns whether a piece of player in the empty cell in row and column
+    would connect k, read from the window counts with track: a window
+    through the cell holds k - 1 pieces of player and none of the opponent.
+    """
+    if track:
+        opponent = PLAYER1 if player == PLAYER2 else PLAYER2
+        cell = row * board.shape[1] + column
+        for j in range(cell_lines.shape[1]):
+            line = cell_lines[cell, j]
+            if line < 0:
+                break
+            if windows[line, player] == k - 1 and windows[line, opponent] == 0:
+                return True
+        return False
+    board[row, column] = player
+    threat = connected_cell(board, player, row, column, k, lines, cell_lines)
+    board[row, column] = NO_PLAYER
+    return threat
+
+
+@njit(cache=True)
+def pruned_columns(board: np.ndarray,
+                   heights: np.ndarray,
+                   player: BoardPiece,
+                   k: int,
+                   lines: np.ndarray,
+                   cell_lines: np.ndarray,
+                   windows: np.ndarray,
+                   track: bool) -> Tuple[int, int]:
+    """
+    Compiled pruned_moves, returns the bit mask of the columns not to be
+    searched and the column to play if every move loses, else -1.
+    """
+    max_row, max_column = board.shape
+    opponent = PLAYER1 if player == PLAYER2 else PLAYER2
+    legal = 0
+    forced = 0
+    below = 0
+    n_forced = 0
+    for column in range(max_column):
+        row = heights[column]
+        if row >= max_row:
+            continue
+        legal |= 1 << column
+        if threat_cell(board, opponent, row, column, k, lines, cell_lines,
+                       windows, track):
+            forced |= 1 << column
+            n_forced += 1
+        elif row + 1 < max_row and threat_cell(board, opponent, row + 1,
+                                               column, k, lines, cell_lines,
+                                               windows, track):
+            below |= 1 << column
+
+    if n_forced == 1:
+        skip = legal & ~forced
+    elif n_forced > 1:
+        skip = legal
+    else:
+        skip = below
+    if legal == 0 or skip != legal:
+        return skip, -1
+    lost = forced if forced else legal
+    for column in range(max_column):
+        if lost >> column & 1:
+            return skip, column
+    return skip, -1
+
+
+# not cached: numba cannot load a self-recursive kernel from its on-disk
+# cache (the process crashes or reports an unresolved symbol), its code is
+# cached with its caller negamax_root instead
+@njit
+def negamax(board: np.ndarray,
+            heights: np.ndarray,
+            player: BoardPiece,
+            depth: int,
+            alpha: int,
+            beta: int,
+            ply: int,
+            key: np.uint64,
+            k: int,
+            lines: np.ndarray,
+            cell_lines: np.ndarray,
+            heuristic_code: int,
+            tt_keys: np.ndarray,
+            tt_data: np.ndarray,
+            tt_stats: np.ndarray,
+            static_order: np.ndarray,
+            killers: np.ndarray,
+            history: np.ndarray,
+            order_stats: np.ndarray,
+            hash_move: bool,
+            use_killers: bool,
+            use_history: bool,
+            use_table: bool,
+            pvs: bool,
+            moves: np.ndarray,
+            counters: np.ndarray,
+            node_limit: int,
+            windows: np.ndarray,
+            window_score: np.ndarray) -> Tuple[int, int]:
+    """
+    Alpha-beta search of the best move for player, with the scores of
+    max_player_move from the view of the player to move: a win is scored
+    10000 * depth, a position without valid action -10000 and at depth 0
+    the best move is scored by the heuristic (10000 for a win). Moves are
+    made and taken back in place. Moves are pruned by the threats of the
+    opponent like in max_player_move (see pruned_moves).
+    The transposition table is probed and updated like in max_player_move
+    (if use_table), the moves are ordered like MoveOrdering.order, with the
+    arrays of MoveOrdering passed.
+    With pvs (principal variation search), the moves after the first are
+    searched with the null window (alpha, alpha + 1) only, to prove that
+    they are not better than the first, and searched again with the full
+    window if they are.
+    If node_limit is positive and more nodes are counted, the search is
+    aborted: counters[SEARCH_ABORTED] is set and the result is invalid.
+    For WINDOWS_HEURISTIC the pieces in every window are updated with every
+    move made and taken back, so that wins and the leaf scores are read
+    from the window counts instead of being computed from the board. The
+    moves at the leaves are not made, their wins and scores are read from
+    the windows through their cells (see agents.common.window_delta).
+
+    Parameters
+    ----------
+    board: np.ndarray
+        current game board
+    heights: np.ndarray
+        column heights of the board
+    player: BoardPiece
+        player to move
+    depth: int
+        tree depth
+    alpha: int
+        minimal score already reached by player
+    beta: int
+        maximal score the opponent allows
+    ply: int
+        distance from the root
+    key: np.uint64
+        Zobrist key of the board
+    k: int
+        number of pieces in a row needed to win
+    lines, cell_lines: np.ndarray
+        line table of the board
+    heuristic_code: int
+        LAST_MOVE_HEURISTIC or WINDOWS_HEURISTIC
+    tt_keys, tt_data, tt_stats: np.ndarray
+        arrays of the TranspositionTable
+    static_order, killers, history, order_stats: np.ndarray
+        arrays of the MoveOrdering
+    hash_move, use_killers, use_history: bool
+        parts of the move ordering used
+    use_table: bool
+        probe and update the transposition table
+    pvs: bool
+        principal variation search
+    moves: np.ndarray
+        buffer of the ordered moves of every ply
+    counters: np.ndarray
+        nodes searched and abort flag, updated in place
+    node_limit: int
+        maximal number of nodes counted, 0 for no limit
+    windows, window_score: np.ndarray
+        window counts of the board, see agents.common.window_state
+
+    Returns
+    -------
+    score: int
+        score of player
+    column: int
+        best column, -1 if none
+    """
+    counters[SEARCH_NODES] += 1
+    if 0 < node_limit < counters[SEARCH_NODES]:
+        counters[SEARCH_ABORTED] = 1
+        return 0, -1
+    max_row, max_column = board.shape
+    opponent = PLAYER1 if player == PLAYER2 else PLAYER2
+    best_score = -99999
+    best_move = -1
+    track = heuristic_code == WINDOWS_HEURISTIC
+
+    # leaves: score the moves by the heuristic
+    if depth == 0 and track:
+        # read from the window counts without making the moves
+        sign = 1 if player == PLAYER1 else -1
+        for column in range(max_column):
+            if heights[column] < max_row:
+                delta, win = window_delta(windows, cell_lines,
+                                          heights[column] * max_column
+                                          + column, player, k)
+                if win:
+                    return 10000, column
+                score = sign * (window_score[0] + delta)
+                if score > best_score:
+                    best_score = score
+                    best_move = column
+                    if best_score > alpha:
+                        alpha = best_score
+                    if alpha >= beta:
+                        break
+        if best_move == -1:
+            best_score = -10000
+        return best_score, best_move
+    if depth == 0:
+        for column in range(max_column):
+            if heights[column] < max_row:
+                row = play(board, heights, column, player, k, cell_lines,
+                           windows, window_score, track)
+                if is_win(board, player, row, column, k, lines, cell_lines,
+                          window_score, track):
+                    take_back(board, heights, row, column, player, k,
+                              cell_lines, windows, window_score,
+                              track)
+                    return 10000, column
+                score = leaf_score(board, player, row, column, k, lines,
+                                   cell_lines, heuristic_code, window_score)
+                take_back(board, heights, row, column, player, k, cell_lines,
+                          windows, window_score, track)
+                if score > best_score:
+                    best_score = score
+                    best_move = column
+                    if best_score > alpha:
+                        alpha = best_score
+                    if alpha >= beta:
+                        break
+        if best_move == -1:
+            best_score = -10000
+        return best_score, best_move
+
+    # immediate wins
+    for column in range(max_column):
+        if heights[column] < max_row:
+            row = play(board, heights, column, player, k, cell_lines,
+                       windows, window_score, track)
+            win = is_win(board, player, row, column, k, lines, cell_lines,
+                         window_score, track)
+            take_back(board, heights, row, column, player, k, cell_lines,
+                      windows, window_score, track)
+            if win:
+                return 10000 * depth, column
+
+    # transposition table
+    alpha_original = alpha
+    tt_key = key ^ ZOBRIST_TO_MOVE[player]
+    found, score, tt_depth, flag, tt_move = False, 0, 0, 0, -1
+    if use_table:
+        found, score, tt_depth, flag, tt_move = tt_probe(tt_keys, tt_data,
+                                                         tt_stats, tt_key)
+    if found and tt_depth >= depth:
+        score = tt_score(score, tt_depth, depth)
+        if flag == EXACT or (flag == LOWER and score >= beta) \
+                or (flag == UPPER and score <= alpha):
+            tt_stats[CUTOFFS] += 1
+            return score, tt_move
+
+    # threats of the opponent: forced moves and moves that lose at once
+    skip, lost = pruned_columns(board, heights, player, k, lines, cell_lines,
+                                windows, track)
+    if lost >= 0:
+        return -10000 * max(depth - 1, 1), lost
+
+    # move ordering: hash move, killer moves, then by history
+    n_moves = 0
+    if hash_move and tt_move >= 0 and heights[tt_move] < max_row \
+            and not skip >> tt_move & 1:
+        moves[ply, n_moves] = tt_move
+        n_moves += 1
+    if use_killers and ply < killers.shape[0]:
+        for killer in killers[ply]:
+            if killer >= 0 and heights[killer] < max_row \
+                    and not skip >> killer & 1 \
+                    and killer not in moves[ply, :n_moves]:
+                moves[ply, n_moves] = killer
+                n_moves += 1
+    n_first = n_moves
+    for column in static_order:
+        if heights[column] >= max_row or skip >> column & 1 \
+                or column in moves[ply, :n_first]:
+            continue
+        i = n_moves
+        if use_history:
+            value = history[player, heights[column], column]
+            while i > n_first and value > history[
+                    player, heights[moves[ply, i-1]], moves[ply, i-1]]:
+                moves[ply, i] = moves[ply, i-1]
+                i -= 1
+        moves[ply, i] = column
+        n_moves += 1
+
+    # search the moves
+    cutoff = False
+    n_searched = 0
+    for i in range(n_moves):
+        column = moves[ply, i]
+        row = play(board, heights, column, player, k, cell_lines, windows,
+                   window_score, track)
+        child_key = zobrist_update(key, row, column, player)
+        window = alpha + 1 if pvs and n_searched > 0 else beta
+        score, _ = negamax(board, heights, opponent, depth-1, -window,
+                           -alpha, ply+1, child_key, k, lines, cell_lines,
+                           heuristic_code, tt_keys, tt_data, tt_stats,
+                           static_order, killers, history, order_stats,
+                           hash_move, use_killers, use_history, use_table,
+                           pvs, moves, counters, node_limit, windows,
+                           window_score)
+        score = -score
+        if alpha < score < beta and window < beta \
+                and not counters[SEARCH_ABORTED]:
+            # null window search failed high, search again with full window
+            score, _ = negamax(board, heights, opponent, depth-1, -beta,
+                               -alpha, ply+1, child_key, k, lines,
+                               cell_lines, heuristic_code, tt_keys, tt_data,
+                               tt_stats, static_order, killers, history,
+                               order_stats, hash_move, use_killers,
+                               use_history, use_table, pvs, moves, counters,
+                               node_limit, windows, window_score)
+            score = -score
+        take_back(board, heights, row, column, player, k, cell_lines,
+                  windows, window_score, track)
+        if counters[SEARCH_ABORTED]:
+            return 0, -1
+        n_searched += 1
+
+        if score > best_score:
+            best_score = score
+            best_move = column
+            if best_score > alpha:
+                alpha = best_score
+            if alpha >= beta:
+                cutoff = True
+                if ply < killers.shape[0] and killers[ply, 0] != column:
+                    killers[ply, 1] = killers[ply, 0]
+                    killers[ply, 0] = column
+                history[player, row, column] += depth * depth
+                break
+
+    if n_searched > 0:
+        order_stats[ORDER_NODES] += 1
+        if cutoff:
+            order_stats[ORDER_CUTOFFS] += 1
+            if n_searched == 1:
+                order_stats[FIRST_MOVE_CUTOFFS] += 1
+
+    # no valid action left
+    if best_move == -1:
+        best_score = -10000
+
+    if best_score <= alpha_original:
+        flag = UPPER
+    elif best_score >= beta:
+        flag = LOWER
+    else:
+        flag = EXACT
+    if use_table:
+        tt_store(tt_keys, tt_data, tt_stats, tt_key, best_score, depth, flag,
+                 best_move)
+    return best_score, best_move
+
+
+# cached entry of negamax: the compiled code of negamax is linked into and
+# loaded from the cache of this non-recursive caller, like solver_negamax
+# through solver_root
+@njit(cache=True)
+def negamax_root(board: np.ndarray,
+                 heights: np.ndarray,
+                 player: BoardPiece,
+                 depth: int,
+                 alpha: int,
+                 beta: int,
+                 ply: int,
+                 key: np.uint64,
+                 k: int,
+                 lines: np.ndarray,
+                 cell_lines: np.ndarray,
+                 heuristic_code: int,
+                 tt_keys: np.ndarray,
+                 tt_data: np.ndarray,
+                 tt_stats: np.ndarray,
+                 static_order: np.ndarray,
+                 killers: np.ndarray,
+                 history: np.ndarray,
+                 order_stats: np.ndarray,
+                 hash_move: bool,
+                 use_killers: bool,
+                 use_history: bool,
+                 use_table: bool,
+                 pvs: bool,
+                 moves: np.ndarray,
+                 counters: np.ndarray,
+                 node_limit: int,
+                 windows: np.ndarray,
+                 window_score: np.ndarray) -> Tuple[int, int]:
+    """
+    Calls negamax with the arguments, see negamax.
+    """
+    return negamax(board, heights, player, depth, alpha, beta, ply, key, k,
+                   lines, cell_lines, heuristic_code, tt_keys, tt_data,
+                   tt_stats, static_order, killers, history, order_stats,
+                   hash_move, use_killers, use_history, use_table, pvs, moves,
+                   counters, node_limit, windows, window_score)
+
+
+def state_negamax(state: MinimaxState,
+                  board: np.ndarray,
+                  heights: np.ndarray,
+                  player: BoardPiece,
+                  depth: int,
+                  alpha: int,
+                  beta: int,
+                  k: int,
+                  heuristic_code: int,
+                  pvs: bool,
+                  counters: np.ndarray,
+                  node_limit: int = 0) -> Tuple[int, int]:
+    """
+    Calls negamax at the root board with the transposition table and move
+    ordering of state, which has to be prepared for board (see
+    MinimaxState.prepare).
+
+    Parameters
+    ----------
+    state: MinimaxState
+        prepared state
+    board, heights: np.ndarray
+        game board and its column heights, changed during the search
+    player: BoardPiece
+        player to move
+    depth, alpha, beta: int
+        depth and window of the search
+    k: int
+        number of pieces in a row needed to win
+    heuristic_code: int
+        LAST_MOVE_HEURISTIC or WINDOWS_HEURISTIC
+    pvs: bool
+        principal variation search
+    counters: np.ndarray
+        counters of negamax, updated in place
+    node_limit: int
+        maximal value of the node counter, 0 for no limit
+
+    Returns
+    -------
+    score: int
+    column: int
+    """
+    ordering = state.ordering
+    lines, cell_lines = line_table(board.shape[0], board.shape[1], k)
+    moves = np.zeros((depth + 1, board.shape[1]), dtype=np.int64)
+    windows, window_score = window_state(board, lines)
+    return negamax_root(board, heights, player, depth, alpha, beta, 0,
+                        state.key, k, lines, cell_lines, heuristic_code,
+                        state.tt.keys, state.tt.data, state.tt.stats,
+                        np.array(ordering.static_order, dtype=np.int64),
+                        ordering.killers, ordering.history, ordering.stats,
+                        ordering.hash_move, ordering.use_killers,
+                        ordering.use_history, state.use_table, pvs, moves,
+                        counters, node_limit, windows, window_score)
+
+
+def negamax_search(board: np.ndarray,
+                   player: BoardPiece,
+                   state: MinimaxState,
+                   timeout: Optional[float] = None,
+                   node_limit: Optional[int] = None,
+                   max_depth: Optional[int] = None,
+                   k: int = CONNECT_N,
+                   heuristic_code: int = WINDOWS_HEURISTIC,
+                   mode: str = ALPHA_BETA) -> Tuple[int, int, int]:
+    """
+    Iterative deepening like iterative_deepening, with the compiled kernel
+    negamax. The kernel cannot read the clock, the time limit is turned
+    into a node limit from the nodes per second of the previous call. If
+    the kernel is stopped by that limit while time is left, the iteration
+    is repeated with a new limit, the transposition table keeps the work
+    already done.
+    Every iteration is searched by mode:
+        ALPHA_BETA: negamax with the full window
+        PVS: principal variation search (negamax with pvs)
+        MTDF: MTD(f), a series of null window searches of negamax that
+            narrows lower and upper bound of the score until they meet,
+            starting from the score of the previous iteration. It relies
+            on the transposition table to not search nodes again.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        current game board, not changed
+    player: BoardPiece
+        player for whom a move is searched
+    state: MinimaxState
+        state with the transposition table and move ordering, nodes and
+        depth are set by the search
+    timeout: float
+        time limit in seconds, None for no limit
+    node_limit: int
+        maximal number of nodes searched, None for no limit
+    max_depth: int
+        maximal search depth, None for no limit
+    k: int
+        number of pieces in a row needed to win
+    heuristic_code: int
+        LAST_MOVE_HEURISTIC or WINDOWS_HEURISTIC (the default)
+    mode: str
+        ALPHA_BETA, PVS or MTDF
+
+    Returns
+    -------
+    score: int
+        score of the deepest completed search
+    column: int
+        best column of the deepest completed search
+    depth: int
+        depth of the deepest completed search
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f'unknown search mode {mode}, '
+                         f'expected one of {SEARCH_MODES}')
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    empty_cells = max(int(np.count_nonzero(board == NO_PLAYER)), 1)
+    if max_depth is None or max_depth > empty_cells:
+        max_depth = empty_cells
+
+    state.prepare(board, player, k, heuristic_code, 'negamax')
+    state.ordering.new_move()
+    board = board.copy()
+    heights = column_heights(board)
+    counters = np.zeros(2, dtype=np.int64)
+
+    def search(depth, alpha, beta, limit):
+        return state_negamax(state, board, heights, player, depth, alpha,
+                             beta, k, heuristic_code, mode == PVS, counters,
+                             limit)
+
+    state.depth = 0
+    score, column = -99999, -1
+    depth = 1
+    nodes_per_second = 0.
+    while depth <= max_depth:
+        # the search of depth 1 is always completed
+        limit = 0
+        if state.depth > 0:
+            if deadline is not None:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                limit = counters[SEARCH_NODES] \
+                    + max(int(remaining * nodes_per_second), 1024)
+            if node_limit is not None:
+                if counters[SEARCH_NODES] >= node_limit:
+                    break
+                limit = node_limit if limit == 0 else min(limit, node_limit)
+
+        counters[SEARCH_ABORTED] = 0
+        nodes = counters[SEARCH_NODES]
+        start = time.perf_counter()
+        if mode == MTDF:
+            guess = score if state.depth > 0 else 0
+            lower, upper = -99999, 99999
+            move = -1
+            while lower < upper:
+                beta = max(guess, lower + 1)
+                guess, searched_move = search(depth, beta - 1, beta, limit)
+                if counters[SEARCH_ABORTED]:
+                    break
+                if guess < beta:
+                    upper = guess
+                else:
+                    # the move of a fail high reaches at least the score
+                    lower = guess
+                    move = searched_move
+            result = (guess, move if move >= 0 else searched_move)
+        else:
+            result = search(depth, -99999, 99999, limit)
+        nodes_per_second = (counters[SEARCH_NODES] - nodes) \
+            / max(time.perf_counter() - start, 1e-6)
+        if counters[SEARCH_ABORTED]:
+            continue
+
+        score, column = result
+        state.depth = depth
+        if abs(score) >= 10000:
+            break
+        depth += 1
+
+    state.nodes = int(counters[SEARCH_NODES])
+    return score, column, state.depth
+
+
+def warmup():
+    """
+    Compiles the numba kernels of this module, of agents.common and of the
+    endgame solver, see agents.common.warmup. The recursive kernels negamax
+    and solver_negamax are loaded from the cache of their callers
+    negamax_root and solver_root, generate_move calls this before its
+    first search.
+    """
+    global _warmed_up
+    _warmed_up = True
+    common_warmup()
+    solver_warmup()
+    board = initialize_game_state()
+    lines, _ = line_table(board.shape[0], board.shape[1], CONNECT_N)
+    score_windows(board, PLAYER1, lines)
+    for heuristic_code in (LAST_MOVE_HEURISTIC, WINDOWS_HEURISTIC):
+        negamax_search(board, PLAYER1, MinimaxState(2**10), max_depth=2,
+                       heuristic_code=heuristic_code)
+    negamax_search(initialize_game_state(7, 8), PLAYER1, MinimaxState(2**10),
+                   max_depth=2, k=5)
@@ -0,0 +1,185 @@
+import numpy as np
+from typing import List, Optional
+from agents.common import BoardPiece, ROWS, COLUMNS
+
+# indices of the statistics counters
+NODES = 0  # nodes at which at least one move was searched
+CUTOFFS = 1  # nodes at which a move caused a cutoff
+FIRST_MOVE_CUTOFFS = 2  # nodes at which the first move caused the cutoff
+N_STATS = 3
+
+
+def center_out(columns: int) -> List[int]:
+    """
+    Returns the columns ordered by their distance to the center, left before
+    right, e.g. [3, 2, 4, 1, 5, 0, 6] for seven columns.
+    """
+    center = (columns - 1) / 2
+    return sorted(range(columns), key=lambda column: abs(column - center))
+
+
+class MoveOrdering:
+
+    def __init__(self,
+                 rows: int = ROWS,
+                 columns: int = COLUMNS,
+                 hash_move: bool = True,
+                 center: bool = True,
+                 killers: bool = True,
+                 history: bool = True,
+                 max_ply: int = 64,
+                 seed: Optional[int] = None):
+        """
+        Orders the moves searched by max_player_move and min_player_move. The
+        best move known for the position (from the transposition table or
+        the previous iteration) comes first, then the killer moves of the
+        ply (the last two moves that caused a cutoff at that ply), then the
+        remaining moves by their history score (sum of depth * depth over
+        the cutoffs the move caused, per player and cell). Ties are broken by
+        the static order, center columns first. Every part can be switched
+        off to measure its effect, without any the columns are tried from
+        left to right.
+
+        Parameters
+        ----------
+        rows: int
+            number of rows of the board
+        columns: int
+            number of columns of the board
+        hash_move: bool
+            search the best move of the transposition table first
+        center: bool
+            static order from the center out instead of left to right
+        killers: bool
+            search the killer moves of the ply next
+        history: bool
+            order the remaining moves by their history score
+        max_ply: int
+            number of plies killer moves are kept for
+        seed: int
+            if given, the static order is perturbed randomly: neighbours in
+            the order are swapped with probability 1/2, such that searches
+            with different seeds (see agents.agent_minimax.lazy_smp) visit
+            the moves in different orders
+        """
+
+        self.hash_move = hash_move
+        self.use_killers = killers
+        self.use_history = history
+        self.static_order = center_out(columns) if center \
+            else list(range(columns))
+        if seed is not None:
+            rng = np.random.default_rng(seed)
+            for i in range(columns - 1):
+                if rng.random() < 0.5:
+                    self.static_order[i], self.static_order[i + 1] = \
+                        self.static_order[i + 1], self.static_order[i]
+        self.killers = np.full((max_ply, 2), -1, dtype=np.int64)
+        self.history = np.zeros((3, rows, columns), dtype=np.int64)
+        self.stats = np.zeros(N_STATS, dtype=np.int64)
+
+    def order(self,
+              heights: np.ndarray,
+              max_row: int,
+              player: BoardPiece,
+              ply: int,
+              tt_move: int) -> List[int]:
+        """
+        Returns the legal columns in the order they are to be searched.
+
+        Parameters
+        ----------
+        heights: np.ndarray
+            column heights of the board
+        max_row: int
+            number of rows of the board
+        player: BoardPiece
+            player to move
+        ply: int
+            distance of the node from the root of the search
+        tt_move: int
+            best move stored for the position, -1 if unknown
+        """
+
+        columns = [column for column in self.static_order
+                   if heights[column] < max_row]
+        if self.use_history:
+            history = self.history[player]
+            columns.sort(key=lambda column: -history[heights[column], column])
+
+        first = []
+        if self.hash_move and tt_move in columns:
+            first.append(tt_move)
+        if self.use_killers and ply < self.killers.shape[0]:
+            for killer in self.killers[ply]:
+                if killer in columns and killer not in first:
+                    first.append(killer)
+        if not first:
+            return columns
+        return first + [column for column in columns if column not in first]
+
+    def searched(self, n_moves: int, cutoff: bool):
+        """
+        Counts a node after its moves were searched, n_moves is the number of
+        moves searched, cutoff whether the last one caused a cutoff.
+        """
+
+        if n_moves == 0:
+            return
+        self.stats[NODES] += 1
+        if cutoff:
+            self.stats[CUTOFFS] += 1
+            if n_moves == 1:
+                self.stats[FIRST_MOVE_CUTOFFS] += 1
+
+    def cutoff(self,
+               player: BoardPiece,
+               row: int,
+               column: int,
+               ply: int,
+               depth: int):
+        """
+        Updates killer moves and history with the move (played in row and
+        column) that caused a cutoff.
+        """
+
+        if ply < self.killers.shape[0] and self.killers[ply, 0] != column:
+            self.killers[ply, 1] = self.killers[ply, 0]
+            self.killers[ply, 0] = column
+        self.history[player, row, column] += depth * depth
+
+    def new_move(self):
+        """
+        Prepares the ordering for the search of the next move: the killer
+        moves are removed and the history scores halved, such that recent
+        cutoffs weigh more.
+        """
+
+        self.killers.fill(-1)
+        self.history //= 2
+
+    def clear(self):
+        """
+        Removes killer moves and history and resets the statistics.
+        """
+
+        self.killers.fill(-1)
+        self.history.fill(0)
+        self.stats.fill(0)
+
+    @property
+    def first_move_cutoff_rate(self) -> float:
+        """
+        Share of the cutoffs that were caused by the first move searched.
+        """
+        return self.stats[FIRST_MOVE_CUTOFFS] / max(self.stats[CUTOFFS], 1)
+
+    def statistics(self) -> dict:
+        """
+        Returns the statistics counters and the first move cutoff rate as
+        dict.
+        """
+        return {'nodes': int(self.stats[NODES]),
+                'cutoffs': int(self.stats[CUTOFFS]),
+                'first_move_cutoffs': int(self.stats[FIRST_MOVE_CUTOFFS]),
+                'first_move_cutoff_rate': self.first_move_cutoff_rate}
@@ -0,0 +1,340 @@
+"""
+Parallel root search of the minimax agent. The moves at the root (and
+optionally the replies to the first move, young brothers wait style) are
+searched by the compiled kernel negamax in the processes of the persistent
+process pool of the agent (see agents.pool). The first move is searched
+first, the others in parallel with the score of the first as bound. The
+best score found at the root is shared through shared memory, a task
+reads it when it starts and raises it when it finishes, so that tasks
+waiting for a free worker start with a narrower window.
+"""
+import atexit
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, Future
+from multiprocessing import shared_memory
+from typing import Optional, Tuple, List
+from agents.common import BoardPiece, CONNECT_N, NO_PLAYER, change_player, \
+    column_heights, make_move, unmake_move, connected_k_cell
+from agents.agent_minimax.minimax import MinimaxState, state_negamax, \
+    negamax_search, WINDOWS_HEURISTIC, SEARCH_NODES, SEARCH_ABORTED, \
+    ALPHA_BETA, PVS, SEARCH_MODES, warmup
+from agents.agent_minimax.move_ordering import center_out
+from agents.pool import get_pool as agent_pool, \
+    shutdown_pool as shutdown_agent_pool
+
+# depths below are searched in the calling process
+MIN_PARALLEL_DEPTH = 5
+# name of the pool of the minimax agent, see agents.pool
+POOL_NAME = 'minimax'
+
+# shared memory of the best root score
+_shared: Optional[shared_memory.SharedMemory] = None
+
+# state of a worker process
+_worker_alpha: Optional[np.ndarray] = None
+_worker_shared: Optional[shared_memory.SharedMemory] = None
+_worker_state: Optional[MinimaxState] = None
+_worker_nodes_per_second = 1e6
+
+
+def get_pool(workers: int) -> Tuple[ProcessPoolExecutor, np.ndarray]:
+    """
+    Returns the process pool of the minimax agent with the given number of
+    workers (see agents.pool.get_pool), which is started on the first call
+    and kept alive for the following moves, and the shared best root
+    score.
+    """
+    global _shared
+    if _shared is None:
+        _shared = shared_memory.SharedMemory(create=True, size=8)
+    pool = agent_pool(POOL_NAME, workers, _init_worker, (_shared.name,))
+    return pool, np.ndarray(1, dtype=np.int64, buffer=_shared.buf)
+
+
+def shutdown_pool():
+    """
+    Stops the workers of the pool and frees the shared memory.
+    """
+    global _shared
+    shutdown_agent_pool(POOL_NAME)
+    if _shared is not None:
+        _shared.close()
+        _shared.unlink()
+    _shared = None
+
+
+atexit.register(shutdown_pool)
+
+
+def _init_worker(shared_name: str):
+    """
+    Attaches a worker to the shared root score and compiles the kernels.
+    """
+    global _worker_shared, _worker_alpha, _worker_state
+    _worker_shared = shared_memory.SharedMemory(name=shared_name)
+    _worker_alpha = np.ndarray(1, dtype=np.int64, buffer=_worker_shared.buf)
+    _worker_state = MinimaxState()
+    warmup()
+
+
+def search_move(board: np.ndarray,
+                player: BoardPiece,
+                column: int,
+                depth: int,
+                alpha: int,
+                beta: int,
+                k: int,
+                heuristic_code: int,
+                pvs: bool,
+                deadline: Optional[float],
+                share: bool) -> Tuple[Optional[int], int]:
+    """
+    Task of a worker: plays column for player and searches the position of
+    the opponent with negamax. With share, alpha is raised to the shared
+    best root score minus one (such that moves as good as the best one get
+    their exact score, which keeps the choice among them identical to the
+    sequential search) and the shared score is raised by the result. The
+    time limit is turned into node limits like in negamax_search.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        game board before the move
+    player: BoardPiece
+        player to move
+    column: int
+        column played
+    depth: int
+        depth of the search at board
+    alpha, beta: int
+        window of the search at board (scores of player)
+    k: int
+        number of pieces in a row needed to win
+    heuristic_code: int
+        heuristic at the leaves, see negamax
+    pvs: bool
+        principal variation search
+    deadline: float
+        time.time() at which the search is given up, None for no limit
+    share: bool
+        use and update the shared best root score
+
+    Returns
+    -------
+    score: int
+        score of the move for player, None if the search was given up
+    nodes: int
+        nodes searched
+    """
+    global _worker_nodes_per_second
+    if share:
+        alpha = max(alpha, int(_worker_alpha[0]) - 1)
+    opponent = change_player(player)
+    board = board.copy()
+    heights = column_heights(board)
+    make_move(board, heights, column, player)
+    _worker_state.prepare(board, opponent, k, heuristic_code, 'negamax')
+
+    counters = np.zeros(2, dtype=np.int64)
+    while True:
+        limit = 0
+        if deadline is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None, int(counters[SEARCH_NODES])
+            limit = counters[SEARCH_NODES] \
+                + max(int(remaining * _worker_nodes_per_second), 1024)
+        counters[SEARCH_ABORTED] = 0
+        nodes = counters[SEARCH_NODES]
+        start = time.perf_counter()
+        score, _ = state_negamax(_worker_state, board, heights, opponent,
+                                 depth - 1, -beta, -alpha, k, heuristic_code,
+                                 pvs, counters, limit)
+        _worker_nodes_per_second = (counters[SEARCH_NODES] - nodes) \
+            / max(time.perf_counter() - start, 1e-6)
+        if not counters[SEARCH_ABORTED]:
+            break
+
+    score = -score
+    if share and score > _worker_alpha[0]:
+        # not atomic: a lost update only leaves a lower, still valid bound
+        _worker_alpha[0] = score
+    return score, int(counters[SEARCH_NODES])
+
+
+def parallel_node(pool: ProcessPoolExecutor,
+                  shared_alpha: np.ndarray,
+                  board: np.ndarray,
+                  player: BoardPiece,
+                  depth: int,
+                  alpha: int,
+                  beta: int,
+                  order: List[int],
+                  split_plies: int,
+                  k: int,
+                  heuristic_code: int,
+                  pvs: bool,
+                  deadline: Optional[float],
+                  root: bool) -> Tuple[Optional[int], int, int]:
+    """
+    Searches board like negamax with the moves in the given order: an
+    immediate win is returned first, then the first move is searched
+    (split again if split_plies > 1), then the other moves in parallel with
+    alpha raised by the score of the first. The score is exact within the
+    window, the move is the first one in order with the best score.
+
+    Returns
+    -------
+    score: int
+        score of player, None if the search was given up
+    column: int
+        best column
+    nodes: int
+        nodes searched
+    """
+    max_row = board.shape[0]
+    heights = column_heights(board)
+    for column in range(board.shape[1]):
+        if heights[column] < max_row:
+            row = make_move(board, heights, column, player)
+            is_win = connected_k_cell(board, player, row, column, k)
+            unmake_move(board, heights, column)
+            if is_win:
+                return 10000 * depth, column, 0
+    order = [column for column in order if heights[column] < max_row]
+    if not order:
+        return -10000, -1, 0
+    if root:
+        shared_alpha[0] = alpha
+
+    def submit(column: int, alpha: int) -> Future:
+        return pool.submit(search_move, board, player, column, depth, alpha,
+                           beta, k, heuristic_code, pvs, deadline, root)
+
+    # the first move, the eldest brother
+    first = order[0]
+    if split_plies > 1 and depth > 2:
+        heights = column_heights(board)
+        child = board.copy()
+        make_move(child, heights, first, player)
+        score, _, nodes = parallel_node(
+            pool, shared_alpha, child, change_player(player), depth - 1,
+            -beta, -alpha, center_out(board.shape[1]), split_plies - 1, k,
+            heuristic_code, pvs, deadline, False)
+        score = None if score is None else -score
+    else:
+        score, nodes = submit(first, alpha).result()
+    if score is None:
+        return None, -1, nodes
+    best_score, best_move = score, first
+    if best_score >= beta or len(order) == 1:
+        return best_score, best_move, nodes
+    if root and best_score > shared_alpha[0]:
+        shared_alpha[0] = best_score
+
+    # the younger brothers in parallel, scores equal to the best one are
+    # exact as the window starts one below it
+    alpha = max(alpha, best_score - 1)
+    futures = [submit(column, alpha) for column in order[1:]]
+    aborted = False
+    for column, future in zip(order[1:], futures):
+        score, move_nodes = future.result()
+        nodes += move_nodes
+        if score is None:
+            aborted = True
+        elif score > best_score:
+            best_score, best_move = score, column
+    if aborted:
+        return None, -1, nodes
+    return best_score, best_move, nodes
+
+
+def parallel_search(board: np.ndarray,
+                    player: BoardPiece,
+                    state: MinimaxState,
+                    timeout: Optional[float] = None,
+                    max_depth: Optional[int] = None,
+                    k: int = CONNECT_N,
+                    heuristic_code: int = WINDOWS_HEURISTIC,
+                    mode: str = PVS,
+                    workers: int = 7,
+                    split_second_ply: bool = True) -> Tuple[int, int, int]:
+    """
+    Iterative deepening like negamax_search, with the moves at the root
+    searched in parallel by the workers of the process pool (see
+    parallel_node) from depth MIN_PARALLEL_DEPTH on. The best move of an
+    iteration is searched first in the next one, the others follow from
+    the center out. Score and move are those of the sequential alpha-beta
+    search at the same depth with the same order at the root.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        current game board, not changed
+    player: BoardPiece
+        player for whom a move is searched
+    state: MinimaxState
+        state of the search of the small depths in this process, nodes and
+        depth are set by the search
+    timeout: float
+        time limit in seconds, None for no limit
+    max_depth: int
+        maximal search depth, None for no limit
+    k: int
+        number of pieces in a row needed to win
+    heuristic_code: int
+        heuristic at the leaves, see negamax
+    mode: str
+        'alphabeta', 'pvs' or 'mtdf', MTD(f) is only used for the depths
+        searched in this process, the workers use principal variation
+        search
+    workers: int
+        number of worker processes
+    split_second_ply: bool
+        also search the replies to the first move at the root in parallel
+
+    Returns
+    -------
+    score: int
+        score of the deepest completed search
+    column: int
+        best column of the deepest completed search
+    depth: int
+        depth of the deepest completed search
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f'unknown search mode {mode}, '
+                         f'expected one of {SEARCH_MODES}')
+    start = time.time()
+    deadline = None if timeout is None else start + timeout
+    empty_cells = max(int(np.count_nonzero(board == NO_PLAYER)), 1)
+    if max_depth is None or max_depth > empty_cells:
+        max_depth = empty_cells
+
+    score, column, depth = negamax_search(
+        board, player, state, timeout, None,
+        min(max_depth, MIN_PARALLEL_DEPTH - 1), k, heuristic_code, mode)
+    nodes = state.nodes
+    if depth < MIN_PARALLEL_DEPTH - 1 or abs(score) >= 10000 \
+            or max_depth < MIN_PARALLEL_DEPTH:
+        return score, column, depth
+
+    pool, shared_alpha = get_pool(workers)
+    for depth in range(MIN_PARALLEL_DEPTH, max_depth + 1):
+        order = [column] + [other for other in center_out(board.shape[1])
+                            if other != column]
+        result, move, depth_nodes = parallel_node(
+            pool, shared_alpha, board.copy(), player, depth, -99999, 99999,
+            order, 2 if split_second_ply else 1, k, heuristic_code,
+            mode != ALPHA_BETA, deadline, True)
+        nodes += depth_nodes
+        if result is None:
+            break
+        score, column = result, move
+        state.depth = depth
+        if abs(score) >= 10000:
+            break
+
+    state.nodes = nodes
+    return score, column, state.depth
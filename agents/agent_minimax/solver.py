@@ -0,0 +1,415 @@
+"""
+Exact endgame solver of the minimax agent. The position is stored in the
+bitboard of agents.common (see board_to_bitboard, rows + 1 bits per
+column, the top one an empty sentinel), as the pieces of the player to
+move and the mask of all pieces, which together identify the position
+(key position + mask).
+A position is solved by a sequence of null-window searches (solver_search)
+that bisect the range of its possible scores, the searches share a
+transposition table.
+
+The score of a position is the one of the player to move: 0 for a draw,
+(cells + 1 - moves) // 2 if the player wins with the move played after
+moves pieces (the earlier the win, the higher the score) and the negative
+score of the opponent if the opponent wins, where cells is the number of
+cells of the board.
+"""
+import numpy as np
+from numba import njit
+from typing import Tuple, Dict, Optional
+from agents.common import BoardPiece, CONNECT_N, board_to_bitboard, \
+    bitboard_masks, bitboard_popcount, bitboard_winning_cells, fits_bitboard
+from agents.agent_minimax.transposition_table import TranspositionTable, \
+    tt_probe, tt_store, EXACT, LOWER, UPPER
+from agents.agent_minimax.move_ordering import center_out
+
+# indices of the counters of the solver kernels
+SOLVER_NODES = 0
+
+
+def fits_solver(rows: int, columns: int) -> bool:
+    """
+    Returns whether boards of the shape fit into the bitboard, see
+    agents.common.fits_bitboard.
+    """
+    return fits_bitboard(rows, columns)
+
+
+# not cached on disk, like agents.agent_minimax.minimax.negamax: numba
+# cannot load a self-recursive kernel from its cache, its code is cached
+# with its caller solver_root instead
+@njit
+def solver_negamax(position: np.uint64,
+                   mask: np.uint64,
+                   moves: int,
+                   alpha: int,
+                   beta: int,
+                   keys: np.ndarray,
+                   data: np.ndarray,
+                   stats: np.ndarray,
+                   counters: np.ndarray,
+                   columns: int,
+                   height: int,
+                   k: int,
+                   cells: int,
+                   bottom: np.uint64,
+                   board_mask: np.uint64,
+                   order: np.ndarray) -> int:
+    """
+    Alpha-beta search of the exact score within the window (alpha, beta).
+    The player to move must not be able to win with the next move, which
+    holds for all positions reached by the moves searched, as only moves
+    after which the opponent cannot win immediately are searched: forced
+    moves (blocking the only winning cell of the opponent, two of them are
+    a loss) and no moves below a winning cell of the opponent. The moves
+    are ordered by the best move stored in the transposition table and by
+    the number of winning cells they create, ties from the center out.
+
+    Parameters
+    ----------
+    position: np.uint64
+        cells of the pieces of the player to move
+    mask: np.uint64
+        cells of all pieces
+    moves: int
+        number of pieces
+    alpha, beta: int
+        search window
+    keys, data, stats: np.ndarray
+        arrays of the transposition table
+    counters: np.ndarray
+        counters, the nodes searched are added to counters[SOLVER_NODES]
+    columns: int
+        number of columns
+    height: int
+        number of bits per column (rows + 1)
+    k: int
+        number of pieces in a row needed to win
+    cells: int
+        number of cells of the board
+    bottom: np.uint64
+        bottom cell of every column
+    board_mask: np.uint64
+        all cells of the board
+    order: np.ndarray
+        columns from the center out
+
+    Returns
+    -------
+    int
+        score of the position if within the window, otherwise a bound on
+        the side of the window it is on
+    """
+    counters[SOLVER_NODES] += 1
+    opponent = position ^ mask
+    possible = (mask + bottom) & board_mask
+    opponent_wins = bitboard_winning_cells(opponent, mask, board_mask,
+                                           height, k)
+    forced = possible & opponent_wins
+    if forced:
+        if forced & (forced - np.uint64(1)):
+            # two winning cells of the opponent cannot both be blocked
+            return -((cells - moves) // 2)
+        possible = forced
+    possible &= ~(opponent_wins >> np.uint64(1))
+    if possible == 0:
+        return -((cells - moves) // 2)
+    if moves >= cells - 2:
+        return 0
+
+    # the opponent cannot win with the next move, the player not before
+    # the move after next
+    lower = -((cells - 2 - moves) // 2)
+    if alpha < lower:
+        alpha = lower
+        if alpha >= beta:
+            return alpha
+    upper = (cells - 1 - moves) // 2
+    if beta > upper:
+        beta = upper
+        if alpha >= beta:
+            return beta
+
+    key = position + mask
+    found, score, _, flag, tt_move = tt_probe(keys, data, stats, key)
+    if found:
+        if flag == EXACT:
+            return score
+        if flag == LOWER:
+            if score > alpha:
+                alpha = score
+        elif score < beta:
+            beta = score
+        if alpha >= beta:
+            return score
+
+    # order the moves by the number of winning cells they create
+    candidates = np.empty(columns, dtype=np.uint64)
+    candidate_columns = np.empty(columns, dtype=np.int64)
+    ranks = np.empty(columns, dtype=np.int64)
+    n = 0
+    for column in order:
+        cell = possible & (((np.uint64(1) << np.uint64(height - 1))
+                            - np.uint64(1))
+                           << np.uint64(column * height))
+        if cell:
+            rank = bitboard_popcount(bitboard_winning_cells(
+                position | cell, mask | cell, board_mask, height, k))
+            if column == tt_move:
+                rank = 1000
+            i = n
+            while i > 0 and ranks[i - 1] < rank:
+                candidates[i] = candidates[i - 1]
+                candidate_columns[i] = candidate_columns[i - 1]
+                ranks[i] = ranks[i - 1]
+                i -= 1
+            candidates[i] = cell
+            candidate_columns[i] = column
+            ranks[i] = rank
+            n += 1
+
+    alpha_start = alpha
+    best = -cells
+    best_move = -1
+    for i in range(n):
+        cell = candidates[i]
+        score = -solver_negamax(opponent, mask | cell, moves + 1, -beta,
+                                -alpha, keys, data, stats, counters,
+                                columns, height, k, cells, bottom,
+                                board_mask, order)
+        if score > best:
+            best = score
+            best_move = candidate_columns[i]
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+
+    if best <= alpha_start:
+        flag = UPPER
+    elif best >= beta:
+        flag = LOWER
+    else:
+        flag = EXACT
+    tt_store(keys, data, stats, key, best, cells - moves, flag, best_move)
+    return best
+
+
+@njit(cache=True)
+def can_win_next(position: np.uint64,
+                 mask: np.uint64,
+                 height: int,
+                 k: int,
+                 bottom: np.uint64,
+                 board_mask: np.uint64) -> bool:
+    """
+    Returns whether the player to move wins with the next move.
+    """
+    possible = (mask + bottom) & board_mask
+    wins = bitboard_winning_cells(position, mask, board_mask, height, k)
+    return bool(wins & possible)
+
+
+@njit(cache=True)
+def solver_search(position: np.uint64,
+                  mask: np.uint64,
+                  moves: int,
+                  keys: np.ndarray,
+                  data: np.ndarray,
+                  stats: np.ndarray,
+                  counters: np.ndarray,
+                  columns: int,
+                  height: int,
+                  k: int,
+                  bottom: np.uint64,
+                  board_mask: np.uint64,
+                  order: np.ndarray) -> int:
+    """
+    Returns the exact score of the position (see the module docstring),
+    found by null-window searches with solver_negamax that halve the range
+    of possible scores, preferring windows near 0 which are cheaper to
+    search. The game must not be over.
+    """
+    cells = columns * (height - 1)
+    if can_win_next(position, mask, height, k, bottom, board_mask):
+        return (cells + 1 - moves) // 2
+    if moves == cells:
+        return 0
+    lower = -((cells - moves) // 2)
+    upper = (cells + 1 - moves) // 2
+    while lower < upper:
+        middle = lower + (upper - lower) // 2
+        if middle <= 0 and int(lower / 2) < middle:
+            middle = int(lower / 2)
+        elif middle >= 0 and int(upper / 2) > middle:
+            middle = int(upper / 2)
+        score = solver_negamax(position, mask, moves, middle, middle + 1,
+                               keys, data, stats, counters, columns, height,
+                               k, cells, bottom, board_mask, order)
+        if score <= middle:
+            upper = score
+        else:
+            lower = score
+    return lower
+
+
+@njit(cache=True)
+def solver_root(position: np.uint64,
+                mask: np.uint64,
+                moves: int,
+                keys: np.ndarray,
+                data: np.ndarray,
+                stats: np.ndarray,
+                counters: np.ndarray,
+                columns: int,
+                height: int,
+                k: int,
+                bottom: np.uint64,
+                board_mask: np.uint64,
+                order: np.ndarray) -> Tuple[int, int]:
+    """
+    Solves the position and returns its score and a move that keeps it,
+    the first one in order: after the score of the position is known, the
+    moves are tested with a null-window search each until one reaches it.
+    """
+    cells = columns * (height - 1)
+    score = solver_search(position, mask, moves, keys, data, stats,
+                          counters, columns, height, k, bottom, board_mask,
+                          order)
+    possible = (mask + bottom) & board_mask
+    wins = bitboard_winning_cells(position, mask, board_mask, height, k) \
+        & possible
+    column_cells = (np.uint64(1) << np.uint64(height - 1)) - np.uint64(1)
+    fallback = -1
+    for column in order:
+        cell = possible & (column_cells << np.uint64(column * height))
+        if not cell:
+            continue
+        if fallback < 0:
+            fallback = column
+        if wins:
+            if wins & cell:
+                return score, column
+            continue
+        child = position ^ mask
+        child_mask = mask | cell
+        if moves + 1 == cells:
+            child_score = 0
+        elif can_win_next(child, child_mask, height, k, bottom, board_mask):
+            child_score = (cells - moves) // 2
+        else:
+            # is the score of the child at most -score?
+            child_score = solver_negamax(
+                child, child_mask, moves + 1, -score, -score + 1, keys, data,
+                stats, counters, columns, height, k, cells, bottom,
+                board_mask, order)
+        if -child_score >= score:
+            return score, column
+    return score, fallback
+
+
+def distance_to_end(score: int, moves: int, cells: int) -> int:
+    """
+    Returns the number of plies (moves of both players, including the last
+    one) until the game ends with perfect play, from a position with moves
+    pieces and the given score: until the winning move, or until the board
+    is full for a draw.
+    """
+    if score == 0:
+        return cells - moves
+    # the winning move is played after last pieces, by the player to move
+    # for a positive score (same parity as moves), by the opponent
+    # otherwise
+    last = cells + 1 - 2 * abs(score)
+    if (last - moves) % 2 != (0 if score > 0 else 1):
+        last -= 1
+    return last - moves + 1
+
+
+class EndgameSolver:
+
+    def __init__(self, tt_size: int = 2**20):
+        """
+        Solves positions exactly, see solver_search. The transposition table
+        and the results of the positions solved are kept for the rest of
+        the game (until the board shape or k changes), such that the
+        following moves are answered mostly from them.
+
+        Parameters
+        ----------
+        tt_size: int
+            number of slots of the transposition table
+        """
+
+        self.tt = TranspositionTable(tt_size)
+        # result per key (position + mask) of the positions solved
+        self.results: Dict[int, Tuple[int, int, int]] = {}
+        # board shape and k of the stored results
+        self.config: Optional[Tuple[Tuple[int, int], int]] = None
+        # nodes searched by the last call of solve
+        self.nodes = 0
+
+    def solve(self,
+              board: np.ndarray,
+              player: BoardPiece,
+              k: int = CONNECT_N) -> Tuple[int, int, int]:
+        """
+        Solves the position of player to move on board. The game must not
+        be over and the board must fit the bitboard (see fits_solver).
+
+        Parameters
+        ----------
+        board: np.ndarray
+            current game board
+        player: BoardPiece
+            player to move
+        k: int
+            number of pieces in a row needed to win
+
+        Returns
+        -------
+        score: int
+            exact score of player, see the module docstring, positive for
+            a win, 0 for a draw and negative for a loss
+        column: int
+            best column, the fastest win or the slowest loss
+        distance: int
+            number of plies until the game ends with perfect play, see
+            distance_to_end
+        """
+
+        rows, columns = board.shape
+        if not fits_solver(rows, columns):
+            raise ValueError(f'board of shape {board.shape} does not fit '
+                             f'the bitboard')
+        config = (board.shape, k)
+        if config != self.config:
+            self.tt.clear()
+            self.results.clear()
+            self.config = config
+        pieces, heights = board_to_bitboard(board)
+        position = pieces[player - 1]
+        mask = pieces[0] | pieces[1]
+        moves = int(np.sum(heights))
+        key = int(position + mask)
+        self.nodes = 0
+        if key not in self.results:
+            height = rows + 1
+            bottom, board_mask = bitboard_masks(rows, columns)
+            counters = np.zeros(1, dtype=np.int64)
+            score, column = solver_root(
+                position, mask, moves, self.tt.keys, self.tt.data,
+                self.tt.stats, counters, columns, height, k, bottom,
+                board_mask, np.array(center_out(columns), dtype=np.int64))
+            self.nodes = int(counters[SOLVER_NODES])
+            self.results[key] = (score, column,
+                                 distance_to_end(score, moves, rows * columns))
+        return self.results[key]
+
+
+def warmup():
+    """
+    Compiles the solver kernels, or loads them from the cache.
+    """
+    from agents.common import initialize_game_state, PLAYER1
+    EndgameSolver(2**10).solve(initialize_game_state(4, 4), PLAYER1)
@@ -0,0 +1,280 @@
+import weakref
+import numpy as np
+from multiprocessing import shared_memory
+from numba import njit
+from typing import Tuple, Optional
+
+# bound type of a stored score
+EXACT = np.uint8(0)  # score is the exact value of the position
+LOWER = np.uint8(1)  # value of the position is at least score (beta cutoff)
+UPPER = np.uint8(2)  # value of the position is at most score (no move > alpha)
+
+# indices of the statistics counters
+PROBES = 0
+HITS = 1
+CUTOFFS = 2
+STORES = 3
+REPLACEMENTS = 4
+N_STATS = 5
+
+# An entry is packed into one unsigned 64 bit integer:
+#   bits  0-31: score + SCORE_OFFSET
+#   bits 32-39: depth
+#   bits 40-47: bound type
+#   bits 48-55: best move + 1 (0 for no move)
+# A data word of 0 marks an empty slot, entries always have depth >= 1.
+# The key word of a slot holds key ^ data. An entry is only found if the
+# two words fit together, so that a slot written by two processes at the
+# same time (see SharedTranspositionTable) is not mistaken for an entry of
+# the position searched (lock-free hashing).
+SCORE_OFFSET = 2**31
+
+
+@njit(cache=True)
+def pack_entry(score: int, depth: int, flag: int, move: int) -> np.uint64:
+    """
+    Packs the fields of an entry into one data word.
+    """
+    return np.uint64(score + SCORE_OFFSET) \
+        | (np.uint64(depth) << np.uint64(32)) \
+        | (np.uint64(flag) << np.uint64(40)) \
+        | (np.uint64(move + 1) << np.uint64(48))
+
+
+@njit(cache=True)
+def unpack_entry(data: np.uint64) -> Tuple[int, int, int, int]:
+    """
+    Unpacks a data word into score, depth, bound type and best move.
+    """
+    score = np.int64(data & np.uint64(0xFFFFFFFF)) - SCORE_OFFSET
+    depth = np.int64((data >> np.uint64(32)) & np.uint64(0xFF))
+    flag = np.int64((data >> np.uint64(40)) & np.uint64(0xFF))
+    move = np.int64((data >> np.uint64(48)) & np.uint64(0xFF)) - 1
+    return score, depth, flag, move
+
+
+@njit(cache=True)
+def tt_probe(keys: np.ndarray,
+             data: np.ndarray,
+             stats: np.ndarray,
+             key: np.uint64) -> Tuple[bool, int, int, int, int]:
+    """
+    Looks up the entry of the position with the given key.
+
+    Parameters
+    ----------
+    keys: np.ndarray
+        keys of the stored positions
+    data: np.ndarray
+        packed entries of the stored positions
+    stats: np.ndarray
+        statistics counters, updated in place
+    key: np.uint64
+        key of the position
+
+    Returns
+    -------
+    found: bool
+        whether the position is stored
+    score: int
+    depth: int
+    flag: int
+        bound type of score (EXACT, LOWER or UPPER)
+    move: int
+        best move, -1 if unknown
+    """
+    stats[PROBES] += 1
+    index = key & np.uint64(keys.shape[0] - 1)
+    word = data[index]
+    if word == 0 or keys[index] ^ word != key:
+        return False, 0, 0, 0, -1
+    stats[HITS] += 1
+    score, depth, flag, move = unpack_entry(word)
+    return True, score, depth, flag, move
+
+
+@njit(cache=True)
+def tt_store(keys: np.ndarray,
+             data: np.ndarray,
+             stats: np.ndarray,
+             key: np.uint64,
+             score: int,
+             depth: int,
+             flag: int,
+             move: int):
+    """
+    Stores the result of a search in the slot of key. The slot is kept for
+    the deeper search: an entry of another position is only replaced if the
+    new search is at least as deep (depth-preferred replacement), the entry
+    of the same position is always updated.
+
+    Parameters
+    ----------
+    keys: np.ndarray
+        keys of the stored positions
+    data: np.ndarray
+        packed entries of the stored positions
+    stats: np.ndarray
+        statistics counters, updated in place
+    key: np.uint64
+        key of the position
+    score: int
+    depth: int
+        remaining search depth of the result
+    flag: int
+        bound type of score (EXACT, LOWER or UPPER)
+    move: int
+        best move, -1 if unknown
+    """
+    index = key & np.uint64(keys.shape[0] - 1)
+    word = data[index]
+    if word != 0 and keys[index] ^ word != key:
+        if depth < np.int64((word >> np.uint64(32)) & np.uint64(0xFF)):
+            return
+        stats[REPLACEMENTS] += 1
+    stats[STORES] += 1
+    word = pack_entry(score, depth, flag, move)
+    keys[index] = key ^ word
+    data[index] = word
+
+
+class TranspositionTable:
+
+    def __init__(self, size: int = 2**20):
+        """
+        Fixed-size hash table of search results, keyed by the Zobrist key
+        of a position (see agents.common.zobrist_hash). Every slot holds the
+        key and one packed entry with score, depth, bound type and best
+        move. The slot of a key is key modulo size.
+
+        Parameters
+        ----------
+        size: int
+            number of slots, rounded up to a power of two
+        """
+
+        size = 1 << max(int(size) - 1, 1).bit_length()
+        self.keys = np.zeros(size, dtype=np.uint64)
+        self.data = np.zeros(size, dtype=np.uint64)
+        self.stats = np.zeros(N_STATS, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.keys.shape[0]
+
+    def probe(self, key: np.uint64) -> Tuple[bool, int, int, int, int]:
+        """
+        Returns found, score, depth, bound type and best move of the
+        position with the given key, see tt_probe.
+        """
+        return tt_probe(self.keys, self.data, self.stats, key)
+
+    def store(self, key: np.uint64, score: int, depth: int, flag: int,
+              move: int):
+        """
+        Stores a search result, see tt_store.
+        """
+        tt_store(self.keys, self.data, self.stats, key, score, depth, flag,
+                 move)
+
+    def clear(self):
+        """
+        Removes all entries and resets the statistics.
+        """
+        self.keys.fill(0)
+        self.data.fill(0)
+        self.stats.fill(0)
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Share of the probes that found their position.
+        """
+        return self.stats[HITS] / max(self.stats[PROBES], 1)
+
+    def statistics(self) -> dict:
+        """
+        Returns the statistics counters and the hit rate as dict.
+        """
+        return {'probes': int(self.stats[PROBES]),
+                'hits': int(self.stats[HITS]),
+                'cutoffs': int(self.stats[CUTOFFS]),
+                'stores': int(self.stats[STORES]),
+                'replacements': int(self.stats[REPLACEMENTS]),
+                'hit_rate': self.hit_rate,
+                'filled': int(np.count_nonzero(self.data)) / len(self)}
+
+
+class SharedTranspositionTable(TranspositionTable):
+
+    def __init__(self, size: int = 2**20, name: Optional[str] = None):
+        """
+        TranspositionTable whose slots live in shared memory
+        (multiprocessing.shared_memory), such that processes searching at
+        the same time share their results. There is no lock: the entries
+        are verified by their key word (key ^ data), an entry torn by two
+        processes writing the slot at the same time is not found.
+        The table is created by one process (name None), which owns it, and
+        attached by the others by its name. Only the owner clears the slots
+        (clear only resets the statistics of the others) and frees the
+        shared memory when the table is deleted. The statistics are kept
+        per process.
+
+        Parameters
+        ----------
+        size: int
+            number of slots, rounded up to a power of two, must be the size
+            of the owner's table when attaching
+        name: str
+            name of the shared memory of the table to attach to
+        """
+
+        size = 1 << max(int(size) - 1, 1).bit_length()
+        self.owner = name is None
+        self.memory = shared_memory.SharedMemory(name=name,
+                                                 create=self.owner,
+                                                 size=16 * size)
+        slots = np.ndarray((2, size), dtype=np.uint64, buffer=self.memory.buf)
+        if self.owner:
+            slots.fill(0)
+        self.keys = slots[0]
+        self.data = slots[1]
+        self.stats = np.zeros(N_STATS, dtype=np.int64)
+        self._finalizer = weakref.finalize(
+            self, _release, self.memory, self.owner)
+
+    @property
+    def name(self) -> str:
+        """
+        Name of the shared memory, to attach the table in other processes.
+        """
+        return self.memory.name
+
+    def clear(self):
+        """
+        Removes all entries (owner only) and resets the statistics.
+        """
+
+        if self.owner:
+            self.keys.fill(0)
+            self.data.fill(0)
+        self.stats.fill(0)
+
+    def close(self):
+        """
+        Detaches the table, the owner frees the shared memory.
+        """
+        self.keys = self.data = None
+        self._finalizer()
+
+    def __reduce__(self):
+        # a copy in another process attaches to the table
+        return SharedTranspositionTable, (len(self), self.name)
+
+
+def _release(memory: shared_memory.SharedMemory, owner: bool):
+    """
+    Closes the shared memory of a table, the owner also unlinks it.
+    """
+    memory.close()
+    if owner:
+        memory.unlink()
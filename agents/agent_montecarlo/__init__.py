@@ -1,4 +1,4 @@
-from .monte_carlo import generate_move
+from .monte_carlo import generate_move, warmup
 
 #MonteCarlo
 #from .monte_carlo_node import MonteCarloNode
@@ -1,16 +1,29 @@
 import numpy as np
 import time
-from agents.common import BoardPiece, PlayerAction, apply_player_action, \
-    connected_four, change_player, valid_action
+from typing import Optional
+from agents.common import BoardPiece, PlayerAction, NO_PLAYER, \
+    change_player, CONNECT_N, column_heights, OPENING_BOOK, \
+    warmup as common_warmup
 from agents.agent_montecarlo.monte_carlo_node import MonteCarloNode
+from agents.agent_montecarlo.node_pool import WON, \
+    warmup as node_pool_warmup
+from agents.agent_montecarlo.rollout import playout, playouts, \
+    rng_state, random_below, warmup as rollout_warmup
+from agents.agent_minimax.book import book_move
 
 
 def generate_move(board: np.ndarray,
                   player: BoardPiece,
-                  saved_state: dict):
+                  saved_state: dict,
+                  k: int = CONNECT_N,
+                  book: Optional[str] = OPENING_BOOK,
+                  rollouts: int = 1,
+                  workers: int = 1):
     """
     Generates move for player by calling running the tree search by calling
     run_search() and then selecting the best action by calling best_action().
+    Positions in the opening book are answered without search, the tree is
+    then built anew for the next move.
 
     Parameters
     ----------
@@ -22,24 +35,53 @@ def generate_move(board: np.ndarray,
         saved states for both players in form: {PLAYER1: ..., PLAYER2: ...}
         whereby the value for the Monte Carlo player is type MonteCarlo and for
         the other player is int.
+    k: int
+        number of pieces in a row needed to win
+    book: str
+        path of the opening book (see agents.opening_book), None to always
+        search
+    rollouts: int
+        number of simulations per expanded node of a new tree, see
+        MonteCarlo
+    workers: int
+        number of worker processes searching a tree each, whose statistics
+        are summed (see agents.agent_montecarlo.parallel), 1 to search a
+        single tree in this process
 
     Returns
     -------
     action: PlayerAction
         column to be played
     mcst: MonteCarlo
-        MonteCarlo object with root node at the selected action
+        MonteCarlo object with root node at the selected action, None if the
+        move was taken from the book; the ParallelMonteCarlo for more than
+        one worker
     """
 
+    action = book_move(board, player, k, book)
+    if action is not None:
+        return PlayerAction(action), None
+
+    if workers > 1:
+        from agents.agent_montecarlo.parallel import ParallelMonteCarlo
+        mcst = saved_state[player]
+        # the trees in the workers are moved to the board by the search
+        if not isinstance(mcst, ParallelMonteCarlo) \
+                or mcst.workers != workers:
+            mcst = ParallelMonteCarlo(workers, k=k, rollouts=rollouts)
+        mcst.run_search(board, player, timeout=2)
+        return mcst.best_action(), mcst
+
     # create new monte carlo search tree:
     if saved_state[player] is None:
-        mcst = MonteCarlo(board, player, explore_param=np.sqrt(2))
+        mcst = MonteCarlo(board, player, explore_param=np.sqrt(2), k=k,
+                          rollouts=rollouts)
 
     # move root of monte carlo tree search to current node
     else:
         action_opponent = saved_state[change_player(player)]
         mcst = saved_state[player]
-        mcst.root = mcst.root.children[action_opponent]
+        mcst.root = mcst.root.expand(action_opponent)
 
     mcst.run_search(timeout=2)
     action = mcst.best_action()
@@ -51,7 +93,8 @@ def generate_move(board: np.ndarray,
 class MonteCarlo:
 
     def __init__(self, board: np.ndarray, player: BoardPiece,
-                 explore_param: int = np.sqrt(2)):
+                 explore_param: int = np.sqrt(2), k: int = CONNECT_N,
+                 rollouts: int = 1):
         """
         Parameters
         ----------
@@ -61,15 +104,26 @@ class MonteCarlo:
             current player
         explore_param: float
             explore parameter for UCB1 algorithm
+        k: int
+            number of pieces in a row needed to win
+        rollouts: int
+            number of simulations run from every expanded node, more than
+            one are run at once by the parallel kernel playouts and
+            backpropagated together (leaf parallelism)
         """
 
         self.explore_param = explore_param
-        self.root = MonteCarloNode(None, board, player, None)
+        self.root = MonteCarloNode(None, board, player, None, k)
+        self.rollouts = rollouts
+        # states of the random number generators of the playouts
+        self.rng_state = rng_state(np.random.randint(2**31), rollouts)
 
     def run_search(self, timeout: int = 1):
         """
         From given node, repeatedly run the Monte Carlo tree search to build
-        statistics until timeout is reached.
+        statistics until timeout is reached. If the root was moved to a
+        later position, the pool is first compacted to its subtree (see
+        NodePool.compact).
 
         Parameters
         ----------
@@ -77,37 +131,61 @@ class MonteCarlo:
             simulation time in seconds
         """
 
-        # count = 0
-
+        pool = self.root.pool
+        if self.root.index != 0:
+            pool.compact(self.root.index)
+            self.root = MonteCarloNode.view(pool, 0)
+        root = self.root.index
+        root_board = pool.board_of(root)
+        root_heights = column_heights(root_board)
+        board = root_board.copy()
+        heights = root_heights.copy()
         end = time.time() + timeout
         while time.time() < end:
-            # count += 1
+            board[:] = root_board
+            heights[:] = root_heights
 
             # phase 1 - SELECTION:
-            selected_node = self.select(self.root)
+            selected = pool.select(root, self.explore_param, board, heights)
 
             # phase 2 - EXPANSION
-            if not selected_node.is_won:
-
-                action_expansion = np.random.choice(selected_node.unexpanded_actions())
-                expanded_node = selected_node.expand(action_expansion)
-
-                # phase 3 - SIMULATION:
-                winner = self.simulate(expanded_node)
-
+            if pool.flags[selected] & WON:
+                expanded = selected
+                winner = change_player(pool.player[selected])
             else:
-                expanded_node = selected_node
-                winner = change_player(selected_node.player)
+                actions = pool.unexpanded_actions(selected, heights)
+                if len(actions) > 0:
+                    action = actions[random_below(self.rng_state,
+                                                  len(actions))]
+                    expanded = pool.expand(selected, action, board, heights)
+
+                    # phase 3 - SIMULATION (on the scratch board):
+                    if self.rollouts > 1:
+                        outcomes = playouts(board, heights,
+                                            pool.player[expanded],
+                                            pool.action[expanded], pool.k,
+                                            pool.lines, pool.cell_lines,
+                                            self.rng_state)
+                        pool.backpropagate_outcomes(expanded, outcomes)
+                        continue
+                    winner = playout(board, heights, pool.player[expanded],
+                                     pool.action[expanded], pool.k,
+                                     pool.lines, pool.cell_lines,
+                                     self.rng_state)
+                    if winner == NO_PLAYER:
+                        winner = None
+                else:
+                    # board full, the game ends drawn
+                    expanded = selected
+                    winner = None
 
             # phase 4 - BACKPROPAGATION:
-            self.backpropagation(expanded_node, winner)
-
-        # print('number simulations: ', count)
+            pool.backpropagate(expanded, winner, self.rollouts)
 
     def select(self, node: MonteCarloNode):
         """
-        Recursively select child node following the UCB1 algorithm until
-        reached node is not fully expanded.
+        Select child nodes following the UCB1 algorithm until reached node is
+        not fully expanded (see NodePool.select).
 
         Parameters
         ----------
@@ -119,26 +197,14 @@ class MonteCarlo:
         selected child node: MonteCarloNode
         """
 
-        if not node.is_fully_expanded():
-            return node
-
-        selected_child = node.children[np.random.choice(valid_action(
-                         node.board))]
-        maximum = np.NINF
-
-        for action, child_node in node.children.items():
-            ucb = child_node.UCB1(self.explore_param)
-
-            if ucb > maximum:
-                maximum = ucb
-                selected_child = child_node
-
-        return self.select(selected_child)
+        return MonteCarloNode.view(node.pool,
+                                   node.pool.select(node.index,
+                                                    self.explore_param))
 
     def simulate(self, node: MonteCarloNode) -> BoardPiece:
         """
         Simulates game till terminal state by selecting actions randomly and
-        return winner.
+        return winner (see rollout).
 
         Parameters
         ----------
@@ -151,29 +217,43 @@ class MonteCarlo:
             Player who wins the game
         """
 
-        board = node.board
-        player = change_player(node.player)
-        last_action = node.last_action
+        return self.rollout(node.board, node.player, node.last_action)
+
+    def rollout(self,
+                board: np.ndarray,
+                player: BoardPiece,
+                last_action: Optional[PlayerAction]) -> BoardPiece:
+        """
+        Simulates game till terminal state by selecting actions randomly and
+        return winner. The game is played out on a copy of the board by the
+        compiled kernel playout (see agents.agent_montecarlo.rollout) with
+        the random number generator of the tree.
 
-        # while game is not won
-        while not connected_four(board, player, last_action):
-            try:
-                action = np.random.choice(valid_action(board))
-            except:
-                # simulated game ends drawn
-                return None
+        Parameters
+        ----------
+        board: np.ndarray
+            game board of the node to simulate from, not changed
+        player: BoardPiece
+            player to move
+        last_action: PlayerAction
+            action of the opponent that led to board, None if unknown
 
-            player = change_player(player)
-            board = apply_player_action(board, action, player, copy=True)
-            last_action = action
+        Returns
+        -------
+        winner: BoardPiece
+            Player who wins the game, None for a draw
+        """
 
-        return BoardPiece(player)
+        pool = self.root.pool
+        winner = playout(board.copy(), column_heights(board), player,
+                         -1 if last_action is None else last_action, pool.k,
+                         pool.lines, pool.cell_lines, self.rng_state)
+        return None if winner == NO_PLAYER else BoardPiece(winner)
 
     def backpropagation(self, node: MonteCarloNode, winner: BoardPiece):
         """
         Back propagate  simulated win, e.g updates all ancestor statics
-        starting from the simulation node by recursively calling the
-        backpropagation function.
+        starting from the simulation node (see NodePool.backpropagate).
 
         Parameters
         ----------
@@ -182,14 +262,7 @@ class MonteCarlo:
         winner: BoardPiece
         """
 
-        node.n_simulations += 1
-        if node.parent is not None:
-            if winner is not None:
-                # unequality because each node’s statistics are used for its
-                # parent node’s choice, not its own
-                if node.player != winner:
-                    node.n_wins += 1
-            self.backpropagation(node.parent, winner)
+        node.pool.backpropagate(node.index, winner)
 
     def best_action(self, visualise=False) -> PlayerAction:
         """
@@ -227,3 +300,13 @@ class MonteCarlo:
                 player_action = PlayerAction(action)
 
         return PlayerAction(player_action)
+
+
+def warmup():
+    """
+    Compiles the numba kernels of the Monte Carlo agent and of
+    agents.common (or loads them from the cache), see agents.common.warmup.
+    """
+    common_warmup()
+    node_pool_warmup()
+    rollout_warmup()
@@ -1,50 +1,147 @@
 import numpy as np
-from agents.common import apply_player_action, change_player, valid_action, \
-    PlayerAction, BoardPiece, connected_four
+from typing import Dict, Optional
+from agents.common import PlayerAction, BoardPiece, CONNECT_N
+from agents.agent_montecarlo.node_pool import NodePool, WON
 
 
 class MonteCarloNode(object):
 
     def __init__(self, parent, board: np.ndarray,
-                 player: BoardPiece, last_action: PlayerAction):
+                 player: BoardPiece, last_action: PlayerAction,
+                 k: int = CONNECT_N):
         """
+        Root node of a new tree, stored in its own NodePool. The other nodes
+        are created by expand (see MonteCarloNode.view), a node is a view
+        of its index in the pool.
 
         Parameters
         ----------
         parent: MonteCarloNode
-            parent of node
+            parent of node, None (children are created by expand)
         board: np.ndarray
             game board belonging to node
         player: BoardPiece
             player who chooses action (child node of current node)
         last_action: PlayerAction
-            action that led to this node
+            action that led to this node, None
+        k: int
+            number of pieces in a row needed to win
         """
 
-        # game state attributes
-        self.board = board
-        self.player = player
-        self.last_action = last_action
+        if parent is not None or last_action is not None:
+            raise ValueError('child nodes are created by expand')
+        self.pool = NodePool(board, player, k)
+        self.index = 0
 
-        # Monte Carlo attributes
-        self.n_simulations = 0
-        self.n_wins = 0
-        self.is_won = False
+    @classmethod
+    def view(cls, pool: NodePool, index: int) -> Optional['MonteCarloNode']:
+        """
+        Returns the node at index in pool, None for index -1.
+        """
+        if index < 0:
+            return None
+        node = cls.__new__(cls)
+        node.pool = pool
+        node.index = int(index)
+        return node
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, MonteCarloNode) and self.pool is other.pool \
+            and self.index == other.index
+
+    def __hash__(self) -> int:
+        return hash((id(self.pool), self.index))
+
+    # game state attributes
+
+    @property
+    def board(self) -> np.ndarray:
+        """
+        Game board belonging to node, replayed from the board of the first
+        node of the pool (see NodePool.board_of).
+        """
+        return self.pool.board_of(self.index)
+
+    @board.setter
+    def board(self, board: np.ndarray):
+        if self.index != 0:
+            raise ValueError('only the board of the first node is stored')
+        self.pool.board[:] = board
+
+    @property
+    def player(self) -> BoardPiece:
+        """
+        Player who chooses action (child node of current node).
+        """
+        return BoardPiece(self.pool.player[self.index])
+
+    @property
+    def last_action(self) -> Optional[PlayerAction]:
+        """
+        Action that led to this node, None for the root.
+        """
+        action = self.pool.action[self.index]
+        return None if action < 0 else PlayerAction(action)
+
+    @property
+    def k(self) -> int:
+        return self.pool.k
+
+    # Monte Carlo attributes
 
-        # Tree attributes
-        self.parent = parent
-        self.children = {}
+    @property
+    def n_simulations(self) -> int:
+        return int(self.pool.visits[self.index])
 
-        # dict for children nodes for all valid actions: {action: child_node}
-        # all child nodes are set to None (unexpanded node)
-        for move in valid_action(self.board):
-            self.children[move] = None
+    @n_simulations.setter
+    def n_simulations(self, n_simulations: int):
+        self.pool.visits[self.index] = n_simulations
 
-    def expand(self, action: PlayerAction):
+    @property
+    def n_wins(self) -> int:
+        return int(self.pool.wins[self.index])
+
+    @n_wins.setter
+    def n_wins(self, n_wins: int):
+        self.pool.wins[self.index] = n_wins
+
+    @property
+    def is_won(self) -> bool:
+        """
+        Whether the action that led to this node won the game.
+        """
+        return bool(self.pool.flags[self.index] & WON)
+
+    @is_won.setter
+    def is_won(self, is_won: bool):
+        if is_won:
+            self.pool.flags[self.index] |= WON
+        else:
+            self.pool.flags[self.index] &= ~np.uint8(WON)
+
+    # Tree attributes
+
+    @property
+    def parent(self) -> Optional['MonteCarloNode']:
+        return MonteCarloNode.view(self.pool, self.pool.parent[self.index])
+
+    @property
+    def children(self) -> Dict[int, Optional['MonteCarloNode']]:
+        """
+        Children nodes for all valid actions: {action: child_node}, None
+        for unexpanded children.
+        """
+        return {action: MonteCarloNode.view(self.pool,
+                                            self.pool.child(self.index,
+                                                            action))
+                for action in self.pool.valid_actions(self.index)}
+
+    def expand(self, action: PlayerAction) -> Optional['MonteCarloNode']:
         """
         Expands the tree for the given action, e.g. creates a new
         MonteCarloNode for the child of the current node that belongs to the
-        new action. Returns the new child node.
+        new action. Returns the new child node (the existing one if it was
+        expanded before), None if the node is won.
 
         Parameters
         ----------
@@ -57,21 +154,8 @@ class MonteCarloNode(object):
             expanded child node
         """
 
-        if not self.is_won:
-            new_board = apply_player_action(self.board,
-                                            action,
-                                            self.player,
-                                            copy=True)
-            self.children[action] = MonteCarloNode(self,
-                                                   new_board,
-                                                   change_player(self.player),
-                                                   PlayerAction(action))
-
-            if connected_four(new_board, self.player, action):
-
-                self.children[action].is_won = True
-
-        return self.children[action]
+        return MonteCarloNode.view(self.pool,
+                                   self.pool.expand(self.index, action))
 
     def unexpanded_actions(self) -> np.ndarray:
         """
@@ -84,12 +168,9 @@ class MonteCarloNode(object):
 
         """
 
-        child_nodes = np.array(list(self.children.values()))
-        actions = np.array(list(self.children.keys()))
+        return self.pool.unexpanded_actions(self.index)
 
-        return actions[np.argwhere(child_nodes == None)[:, 0]]
-
-    def is_fully_expanded(self):
+    def is_fully_expanded(self) -> bool:
         """
         Returns whether current node cannot be further expanded, e.g all
         child nodes are not None.
@@ -99,10 +180,7 @@ class MonteCarloNode(object):
         boolean
         """
 
-        if any(np.array(list(self.children.values())) == None):
-            return False
-
-        return True
+        return self.pool.is_fully_expanded(self.index)
 
     def UCB1(self, explore_param: float) -> float:
         """
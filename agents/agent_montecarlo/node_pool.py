@@ -0,0 +1,429 @@
+"""
+Storage of the Monte Carlo search tree as a structure of arrays: every node
+is an index into preallocated NumPy arrays (visits, wins, parent, first
+child, action, player and flags) instead of a Python object. The
+children of a node are a block of one slot per column, allocated when its
+first child is expanded, so that the child of an action is found at
+first_child + action. The arrays grow geometrically; when the root moves
+on to a later position the pool is compacted to the subtree of the new
+root, so that the slots of the discarded subtrees are reused.
+Nodes store only the action that led to them, the board of the first node
+(index 0) is kept by the pool and the board of any other node is replayed
+from it. The search keeps a single scratch board: select plays the actions
+on it while it descends and expand plays the expanded one.
+Selection, expansion and backpropagation run in compiled kernels on the
+indices, MonteCarloNode is a view of one index for code working on single
+nodes.
+"""
+import numpy as np
+from numba import njit
+from typing import Optional
+from agents.common import BoardPiece, PlayerAction, NO_PLAYER, PLAYER1, \
+    PLAYER2, CONNECT_N, initialize_game_state, line_table, column_heights, \
+    make_move, connected_four_cell, connected_lines
+
+# flags of a slot
+EXPANDED = 1  # the slot holds a node
+WON = 2  # the move leading to the node won the game
+
+
+class NodePool:
+
+    def __init__(self, board: np.ndarray, player: BoardPiece,
+                 k: int = CONNECT_N, capacity: int = 1024):
+        """
+        Pool of the nodes of a tree, holding the root (index 0) for board
+        and player to move.
+
+        Parameters
+        ----------
+        board: np.ndarray
+            game board of the root
+        player: BoardPiece
+            player to move at the root
+        k: int
+            number of pieces in a row needed to win
+        capacity: int
+            number of slots allocated at first
+        """
+
+        self.rows, self.columns = board.shape
+        self.k = k
+        self.lines, self.cell_lines = line_table(self.rows, self.columns, k)
+        self.size = 0
+        self.capacity = 0
+        self.visits = np.zeros(0, dtype=np.int32)
+        self.wins = np.zeros(0, dtype=np.int32)
+        self.parent = np.zeros(0, dtype=np.int32)
+        self.first_child = np.zeros(0, dtype=np.int32)
+        self.action = np.zeros(0, dtype=PlayerAction)
+        self.player = np.zeros(0, dtype=BoardPiece)
+        self.flags = np.zeros(0, dtype=np.uint8)
+        self.grow(capacity)
+
+        root = self.allocate(1)
+        self.player[root] = player
+        self.flags[root] = EXPANDED
+        # board of node 0
+        self.board = board.copy()
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Number of bytes of the arrays.
+        """
+        return sum(array.nbytes for array in (
+            self.visits, self.wins, self.parent, self.first_child,
+            self.action, self.player, self.flags))
+
+    def grow(self, capacity: int):
+        """
+        Reallocates the arrays with at least capacity slots, the new slots
+        are empty (no parent, no children).
+        """
+        capacity = max(capacity, 2 * self.capacity)
+        new = capacity - self.capacity
+        self.visits = np.concatenate((self.visits,
+                                      np.zeros(new, dtype=np.int32)))
+        self.wins = np.concatenate((self.wins, np.zeros(new, dtype=np.int32)))
+        self.parent = np.concatenate((self.parent,
+                                      np.full(new, -1, dtype=np.int32)))
+        self.first_child = np.concatenate((self.first_child,
+                                           np.full(new, -1, dtype=np.int32)))
+        self.action = np.concatenate((self.action,
+                                      np.full(new, -1, dtype=PlayerAction)))
+        self.player = np.concatenate((self.player,
+                                      np.zeros(new, dtype=BoardPiece)))
+        self.flags = np.concatenate((self.flags,
+                                     np.zeros(new, dtype=np.uint8)))
+        self.capacity = capacity
+
+    def allocate(self, n: int) -> int:
+        """
+        Returns the index of the first of n consecutive empty slots, growing
+        the arrays if needed.
+        """
+        start = self.size
+        if start + n > self.capacity:
+            self.grow(start + n)
+        self.size += n
+        return start
+
+    def board_of(self, index: int) -> np.ndarray:
+        """
+        Returns the board of node index, replayed from the board of node 0.
+        """
+        board = self.board.copy()
+        replay(index, board, column_heights(board), self.parent, self.action,
+               self.player)
+        return board
+
+    def compact(self, index: int):
+        """
+        Makes node index the root (index 0) of the pool: its subtree is
+        moved to the first slots in breadth-first order with the blocks of
+        children kept together, the rest of the tree is dropped and the
+        board of node index becomes the board of node 0. Indices (and views)
+        of the nodes taken before are no longer valid.
+        """
+        if index == 0:
+            return
+        board = self.board_of(index)
+        visits = np.zeros(self.capacity, dtype=np.int32)
+        wins = np.zeros(self.capacity, dtype=np.int32)
+        parent = np.full(self.capacity, -1, dtype=np.int32)
+        first_child = np.full(self.capacity, -1, dtype=np.int32)
+        action = np.full(self.capacity, -1, dtype=PlayerAction)
+        player = np.zeros(self.capacity, dtype=BoardPiece)
+        flags = np.zeros(self.capacity, dtype=np.uint8)
+        self.size = compact_subtree(
+            index, self.columns, self.visits, self.wins, self.first_child,
+            self.player, self.flags, visits, wins, parent, first_child,
+            action, player, flags)
+        self.visits, self.wins, self.parent = visits, wins, parent
+        self.first_child, self.action = first_child, action
+        self.player, self.flags = player, flags
+        self.board = board
+
+    def expand(self,
+               index: int,
+               action: PlayerAction,
+               board: Optional[np.ndarray] = None,
+               heights: Optional[np.ndarray] = None) -> int:
+        """
+        Returns the child of node index for action, which is created if it
+        does not exist yet, -1 if the node is won (has no children). The
+        action is played on board and heights, the board of node index
+        and its column heights, which is replayed if not given.
+        """
+        if self.flags[index] & WON:
+            return -1
+        if board is None:
+            board = self.board_of(index)
+            heights = column_heights(board)
+        if self.first_child[index] < 0:
+            self.first_child[index] = self.allocate(self.columns)
+        return expand_child(index, action, self.k, self.lines,
+                            self.cell_lines, self.parent, self.first_child,
+                            self.action, self.player, self.flags, board,
+                            heights)
+
+    def select(self,
+               index: int,
+               explore_param: float,
+               board: Optional[np.ndarray] = None,
+               heights: Optional[np.ndarray] = None) -> int:
+        """
+        Descends from node index to the first node that is won, not fully
+        expanded or without valid action, choosing the child with maximal
+        UCB1 value (see MonteCarloNode.UCB1) at every node. The actions are
+        played on board and heights, the board of node index and its column
+        heights, which is replayed if not given.
+        """
+        if board is None:
+            board = self.board_of(index)
+            heights = column_heights(board)
+        return select_node(index, explore_param, self.visits, self.wins,
+                           self.first_child, self.player, self.flags, board,
+                           heights)
+
+    def backpropagate(self, index: int, winner: BoardPiece, n: int = 1):
+        """
+        Counts n simulations with winner (None for a draw) in node index and
+        all its ancestors, and n wins in every node that is not the root and
+        whose player (to move) did not win.
+        """
+        outcomes = np.zeros(3, dtype=np.int64)
+        outcomes[NO_PLAYER if winner is None else winner] = n
+        backpropagate(index, outcomes, self.visits, self.wins, self.parent,
+                      self.player)
+
+    def backpropagate_outcomes(self, index: int, outcomes: np.ndarray):
+        """
+        Like backpropagate for a batch of simulations, outcomes holds the
+        number of draws (index NO_PLAYER) and wins of PLAYER1 and PLAYER2.
+        """
+        backpropagate(index, outcomes, self.visits, self.wins, self.parent,
+                      self.player)
+
+    def child(self, index: int, action: PlayerAction) -> int:
+        """
+        Returns the child of node index for action, -1 if it is not
+        expanded.
+        """
+        start = self.first_child[index]
+        if start < 0 or not self.flags[start + action] & EXPANDED:
+            return -1
+        return int(start + action)
+
+    def valid_actions(self,
+                      index: int,
+                      heights: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Returns the columns that are not full on the board of node index,
+        with heights the column heights of its board if given.
+        """
+        if heights is None:
+            heights = column_heights(self.board_of(index))
+        return np.flatnonzero(heights < self.rows)
+
+    def unexpanded_actions(self,
+                           index: int,
+                           heights: Optional[np.ndarray] = None) \
+            -> np.ndarray:
+        """
+        Returns the valid actions of node index whose children are not
+        expanded, with heights the column heights of its board if given.
+        """
+        actions = self.valid_actions(index, heights)
+        start = self.first_child[index]
+        if start < 0:
+            return actions
+        return actions[self.flags[start + actions] & EXPANDED == 0]
+
+    def is_fully_expanded(self, index: int) -> bool:
+        """
+        Returns whether all children of node index are expanded.
+        """
+        return len(self.unexpanded_actions(index)) == 0
+
+
+@njit(cache=True)
+def replay(index: int,
+           board: np.ndarray,
+           heights: np.ndarray,
+           parent: np.ndarray,
+           action: np.ndarray,
+           player: np.ndarray):
+    """
+    Plays the actions from node 0 to node index on board (the board of
+    node 0) and heights in place.
+    """
+    path = []
+    while parent[index] >= 0:
+        path.append(index)
+        index = parent[index]
+    for i in range(len(path) - 1, -1, -1):
+        node = path[i]
+        make_move(board, heights, action[node], player[parent[node]])
+
+
+@njit(cache=True)
+def expand_child(index: int,
+                 action: int,
+                 k: int,
+                 lines: np.ndarray,
+                 cell_lines: np.ndarray,
+                 parent: np.ndarray,
+                 first_child: np.ndarray,
+                 actions: np.ndarray,
+                 player: np.ndarray,
+                 flags: np.ndarray,
+                 board: np.ndarray,
+                 heights: np.ndarray) -> int:
+    """
+    Kernel of NodePool.expand, the block of children of node index has to be
+    allocated.
+    """
+    mover = player[index]
+    row = make_move(board, heights, action, mover)
+    child = first_child[index] + action
+    if flags[child] & EXPANDED:
+        return child
+    parent[child] = index
+    actions[child] = action
+    player[child] = PLAYER1 if mover == PLAYER2 else PLAYER2
+    flags[child] = EXPANDED
+    if k == CONNECT_N:
+        won = connected_four_cell(board, mover, row, action)
+    else:
+        won = connected_lines(board, mover, row, action, lines, cell_lines)
+    if won:
+        flags[child] |= WON
+    return child
+
+
+@njit(cache=True)
+def select_node(index: int,
+                explore_param: float,
+                visits: np.ndarray,
+                wins: np.ndarray,
+                first_child: np.ndarray,
+                player: np.ndarray,
+                flags: np.ndarray,
+                board: np.ndarray,
+                heights: np.ndarray) -> int:
+    """
+    Kernel of NodePool.select.
+    """
+    max_row, max_column = board.shape
+    while not flags[index] & WON:
+        start = first_child[index]
+        if start < 0:
+            return index
+        selected = -1
+        maximum = -np.inf
+        for action in range(max_column):
+            if heights[action] >= max_row:
+                continue
+            child = start + action
+            if not flags[child] & EXPANDED:
+                return index
+            if visits[child] != 0 and visits[index] != 0:
+                ucb = wins[child] / visits[child] + explore_param * np.sqrt(
+                    np.log(visits[index]) / visits[child])
+            else:
+                ucb = np.random.randint(-5, 5)
+            if ucb > maximum:
+                maximum = ucb
+                selected = child
+        if selected < 0:
+            return index
+        make_move(board, heights, selected - start, player[index])
+        index = selected
+    return index
+
+
+@njit(cache=True)
+def backpropagate(index: int,
+                  outcomes: np.ndarray,
+                  visits: np.ndarray,
+                  wins: np.ndarray,
+                  parent: np.ndarray,
+                  player: np.ndarray):
+    """
+    Kernel of NodePool.backpropagate, outcomes holds the number of
+    simulations drawn and won by each player.
+    """
+    n = outcomes[NO_PLAYER] + outcomes[PLAYER1] + outcomes[PLAYER2]
+    while index >= 0:
+        visits[index] += n
+        if parent[index] >= 0:
+            wins[index] += outcomes[PLAYER1 if player[index] == PLAYER2
+                                    else PLAYER2]
+        index = parent[index]
+
+
+@njit(cache=True)
+def compact_subtree(index: int,
+                    columns: int,
+                    visits: np.ndarray,
+                    wins: np.ndarray,
+                    first_child: np.ndarray,
+                    player: np.ndarray,
+                    flags: np.ndarray,
+                    new_visits: np.ndarray,
+                    new_wins: np.ndarray,
+                    new_parent: np.ndarray,
+                    new_first_child: np.ndarray,
+                    new_action: np.ndarray,
+                    new_player: np.ndarray,
+                    new_flags: np.ndarray) -> int:
+    """
+    Kernel of NodePool.compact, copies the subtree of node index into the
+    new (empty) arrays and returns the number of slots used.
+    """
+    # nodes in breadth-first order with their new indices
+    old = [index]
+    new = [0]
+    size = 1
+    head = 0
+    while head < len(old):
+        node = old[head]
+        slot = new[head]
+        head += 1
+        new_visits[slot] = visits[node]
+        new_wins[slot] = wins[node]
+        new_player[slot] = player[node]
+        new_flags[slot] = flags[node]
+        start = first_child[node]
+        if start < 0:
+            continue
+        new_first_child[slot] = size
+        for action in range(columns):
+            if flags[start + action] & EXPANDED:
+                new_parent[size + action] = slot
+                new_action[size + action] = action
+                old.append(start + action)
+                new.append(size + action)
+        size += columns
+    return size
+
+
+def warmup():
+    """
+    Compiles the kernels of this module, see agents.common.warmup.
+    """
+    pool = NodePool(initialize_game_state(), PLAYER1)
+    for action in (3, PlayerAction(3)):
+        child = pool.expand(0, action)
+        pool.backpropagate(child, PLAYER1)
+        pool.backpropagate(child, None)
+    pool.select(0, np.sqrt(2))
+    pool.select(0, 1)
+    pool.expand(pool.expand(0, 3), 3)
+    pool.board_of(pool.child(0, 3))
+    pool.compact(pool.child(0, 3))
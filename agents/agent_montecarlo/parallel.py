@@ -0,0 +1,212 @@
+"""
+Root parallel Monte Carlo tree search. Every worker of a persistent
+process pool of the Monte Carlo agent (see agents.pool), one per number
+of workers so that searches with different numbers of workers keep their
+trees, grows its own tree from the position to move with its own random
+seed, and the statistics of the children of the roots are summed before
+the move with the most wins is chosen. The trees stay in the workers between
+moves: the next search of a tree moves its root along the moves played
+since (ours and the opponent's, found by comparing the boards), so that
+the statistics gathered below them are reused.
+"""
+import uuid
+import numpy as np
+from typing import Optional, Tuple, Dict
+from agents.common import BoardPiece, PlayerAction, NO_PLAYER, CONNECT_N, \
+    change_player, column_heights
+from agents.pool import get_pool
+from agents.agent_montecarlo.monte_carlo import MonteCarlo, warmup
+from agents.agent_montecarlo.rollout import rng_state
+
+# trees of a worker process per (key of the ParallelMonteCarlo, seed) with
+# the number of their last search, the MAX_TREES used last (e.g. of both
+# players) are kept
+_worker_trees: Dict[Tuple[str, int], MonteCarlo] = {}
+MAX_TREES = 2
+# name of the pool of the Monte Carlo agent per number of workers, see
+# agents.pool
+POOL_NAME = 'montecarlo-{}'
+
+
+def pool_name(workers: int) -> str:
+    """
+    Returns the name of the pool with the given number of workers.
+    """
+    return POOL_NAME.format(workers)
+
+
+def _init_worker():
+    """
+    Compiles the kernels of the Monte Carlo agent in a worker.
+    """
+    warmup()
+
+
+def reroot(tree: MonteCarlo, board: np.ndarray, player: BoardPiece) -> bool:
+    """
+    Moves the root of tree to the position board with player to move along
+    the moves played since the board of the root, expanding them if
+    needed. Returns False (and leaves the tree unchanged) if board does
+    not follow from the board of the root.
+    """
+    root = tree.root
+    old = root.board
+    if old.shape != board.shape \
+            or np.any((old != NO_PLAYER) & (old != board)):
+        return False
+    added = old != board
+    heights = column_heights(old)
+    mover = root.player
+    for _ in range(np.count_nonzero(added)):
+        # the next move is the one of mover on top of a column
+        columns = [column for column in range(board.shape[1])
+                   if heights[column] < board.shape[0]
+                   and added[heights[column], column]
+                   and board[heights[column], column] == mover]
+        if len(columns) != 1:
+            return False
+        root = root.expand(columns[0])
+        if root is None:
+            return False
+        heights[columns[0]] += 1
+        mover = change_player(mover)
+    if mover != player:
+        return False
+    tree.root = root
+    return True
+
+
+def search_tree(key: str,
+                seed: int,
+                search: int,
+                board: np.ndarray,
+                player: BoardPiece,
+                timeout: float,
+                k: int,
+                rollouts: int,
+                explore_param: float) -> dict:
+    """
+    Task of a worker: searches the position for timeout seconds (from the
+    start of the task, so that starting the workers of the pool does not
+    take the time of the first search) with the tree of key and seed
+    after moving its root to the position (see reroot), or with a new tree
+    if there is none or the position does not follow from its root. search
+    is the number of the search of the ParallelMonteCarlo.
+
+    Returns
+    -------
+    dict
+        seed, wins and simulations of the children of the root per column,
+        simulations of the root, nodes of the tree and whether the tree was
+        reused
+    """
+    tree = _worker_trees.pop((key, seed), None)
+    if tree is None:
+        # the pool does not send a seed to the same process every time, take
+        # over a tree of the key that is not part of this search instead
+        for other in list(_worker_trees):
+            if other[0] == key and _worker_trees[other].search < search:
+                tree = _worker_trees.pop(other)
+                break
+    reused = tree is not None and reroot(tree, board, player)
+    if not reused:
+        tree = MonteCarlo(board, player, explore_param, k, rollouts)
+        tree.rng_state = rng_state(seed, rollouts)
+    if len(_worker_trees) >= MAX_TREES:
+        # drop the tree used least recently
+        del _worker_trees[next(iter(_worker_trees))]
+    _worker_trees[(key, seed)] = tree
+    tree.search = search
+
+    tree.run_search(timeout=timeout)
+    pool, root = tree.root.pool, tree.root.index
+    wins = np.zeros(board.shape[1], dtype=np.int64)
+    simulations = np.zeros(board.shape[1], dtype=np.int64)
+    for action in range(board.shape[1]):
+        child = pool.child(root, action)
+        if child >= 0:
+            wins[action] = pool.wins[child]
+            simulations[action] = pool.visits[child]
+    return {'seed': seed, 'wins': wins, 'simulations': simulations,
+            'root_simulations': int(pool.visits[root]), 'nodes': len(pool),
+            'reused': reused}
+
+
+class ParallelMonteCarlo:
+
+    def __init__(self, workers: int, k: int = CONNECT_N,
+                 rollouts: int = 1, explore_param: float = np.sqrt(2),
+                 seed: Optional[int] = None):
+        """
+        Root parallel search of a player, kept between its moves. Its trees
+        live in the workers, identified by a random key and the seed of
+        the worker.
+
+        Parameters
+        ----------
+        workers: int
+            number of worker processes, each growing one tree
+        k: int
+            number of pieces in a row needed to win
+        rollouts: int
+            number of simulations per expanded node, see MonteCarlo
+        explore_param: float
+            explore parameter for UCB1 algorithm
+        seed: int
+            seed of the first worker, the others use the following ones,
+            random if not given
+        """
+
+        self.workers = workers
+        self.k = k
+        self.rollouts = rollouts
+        self.explore_param = explore_param
+        self.key = uuid.uuid4().hex
+        if seed is None:
+            seed = np.random.randint(2**31)
+        self.seeds = [seed + i for i in range(workers)]
+        self.searches = 0
+        # summed statistics of the children of the roots of the last search
+        self.n_wins = np.zeros(0, dtype=np.int64)
+        self.n_simulations = np.zeros(0, dtype=np.int64)
+        self.valid_actions = np.zeros(0, dtype=np.int64)
+        # results of the workers (see search_tree) of the last search
+        self.worker_statistics = []
+
+    def run_search(self, board: np.ndarray, player: BoardPiece,
+                   timeout: float = 1):
+        """
+        Searches the position in all workers for timeout seconds each and
+        sums the statistics of the children of their roots.
+
+        Parameters
+        ----------
+        board: np.ndarray
+            current game board
+        player: BoardPiece
+            player to move
+        timeout: float
+            simulation time in seconds
+        """
+
+        self.searches += 1
+        pool = get_pool(pool_name(self.workers), self.workers,
+                        _init_worker)
+        futures = [pool.submit(search_tree, self.key, seed, self.searches,
+                               board, player, timeout, self.k, self.rollouts,
+                               self.explore_param)
+                   for seed in self.seeds]
+        self.worker_statistics = [future.result() for future in futures]
+        self.n_wins = sum(result['wins']
+                          for result in self.worker_statistics)
+        self.n_simulations = sum(result['simulations']
+                                 for result in self.worker_statistics)
+        self.valid_actions = np.flatnonzero(board[-1] == NO_PLAYER)
+
+    def best_action(self) -> PlayerAction:
+        """
+        Chooses the valid action with the most wins summed over the trees of
+        the last search.
+        """
+        actions = self.valid_actions
+        return PlayerAction(actions[np.argmax(self.n_wins[actions])])
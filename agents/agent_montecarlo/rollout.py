@@ -0,0 +1,169 @@
+"""
+Compiled random playouts of the Monte Carlo agent. A playout plays random
+moves on a scratch board until a player connects k or the board is full.
+The random numbers come from a xorshift64* generator whose state is an
+element of a uint64 array passed into the kernel, so that no call into NumPy's
+random module happens per move and every tree or worker can have its own
+reproducible stream. The columns that are not full are kept in an array,
+a full column is swapped with the last one, so that a random move is
+drawn in constant time. playouts runs many playouts from the same board
+at once in parallel threads (leaf parallelism), each with its own
+generator.
+"""
+import numpy as np
+from numba import njit, prange
+from agents.common import BoardPiece, NO_PLAYER, PLAYER1, PLAYER2, \
+    CONNECT_N, initialize_game_state, column_heights, line_table, \
+    connected_four_cell, connected_lines
+
+# multiplier of the xorshift64* generator
+XORSHIFT_MULTIPLIER = np.uint64(2685821657736338717)
+
+
+def rng_state(seed: int, n: int = 1) -> np.ndarray:
+    """
+    Returns the states of n random number generators for the kernels of
+    this module, derived from seed (any integer). The kernels taking a
+    single state use the first one.
+    """
+    state = np.random.SeedSequence(seed).generate_state(n, dtype=np.uint64)
+    state |= np.uint64(1)  # a state must not be zero
+    return state
+
+
+@njit(cache=True)
+def random_below(state: np.ndarray, n: int) -> int:
+    """
+    Advances the xorshift64* generator state in place and returns a
+    random integer in [0, n), by multiplying the upper 32 bits of the
+    output with n.
+    """
+    x = state[0]
+    x ^= x >> np.uint64(12)
+    x ^= x << np.uint64(25)
+    x ^= x >> np.uint64(27)
+    state[0] = x
+    high = (x * XORSHIFT_MULTIPLIER) >> np.uint64(32)
+    return int((high * np.uint64(n)) >> np.uint64(32))
+
+
+@njit(cache=True)
+def playout(board: np.ndarray,
+            heights: np.ndarray,
+            player: BoardPiece,
+            last_action: int,
+            k: int,
+            lines: np.ndarray,
+            cell_lines: np.ndarray,
+            state: np.ndarray) -> BoardPiece:
+    """
+    Plays random moves until the game ends and returns the winner.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        game board, the moves are played on it in place
+    heights: np.ndarray
+        column heights of the board, updated in place
+    player: BoardPiece
+        player to move
+    last_action: int
+        column of the last move (of the opponent), -1 if unknown; if that
+        move connected k the opponent is the winner
+    k: int
+        number of pieces in a row needed to win
+    lines, cell_lines: np.ndarray
+        line table of the board (used for k other than four)
+    state: np.ndarray
+        state of the random number generator, see rng_state
+
+    Returns
+    -------
+    BoardPiece
+        winner, NO_PLAYER for a draw
+    """
+    max_row, max_column = board.shape
+    opponent = PLAYER1 if player == PLAYER2 else PLAYER2
+    if last_action >= 0 and heights[last_action] > 0:
+        row = heights[last_action] - 1
+        if board[row, last_action] == opponent:
+            if k == CONNECT_N:
+                won = connected_four_cell(board, opponent, row, last_action)
+            else:
+                won = connected_lines(board, opponent, row, last_action,
+                                      lines, cell_lines)
+            if won:
+                return opponent
+
+    columns = np.empty(max_column, dtype=np.int64)
+    n_columns = 0
+    for column in range(max_column):
+        if heights[column] < max_row:
+            columns[n_columns] = column
+            n_columns += 1
+
+    while n_columns > 0:
+        i = random_below(state, n_columns)
+        column = columns[i]
+        row = heights[column]
+        board[row, column] = player
+        heights[column] = row + 1
+        if k == CONNECT_N:
+            won = connected_four_cell(board, player, row, column)
+        else:
+            won = connected_lines(board, player, row, column, lines,
+                                  cell_lines)
+        if won:
+            return player
+        if row + 1 == max_row:
+            n_columns -= 1
+            columns[i] = columns[n_columns]
+        player = PLAYER1 if player == PLAYER2 else PLAYER2
+    return NO_PLAYER
+
+
+@njit(parallel=True, cache=True)
+def playouts(board: np.ndarray,
+             heights: np.ndarray,
+             player: BoardPiece,
+             last_action: int,
+             k: int,
+             lines: np.ndarray,
+             cell_lines: np.ndarray,
+             states: np.ndarray) -> np.ndarray:
+    """
+    Plays one playout per generator state from board in parallel, each on
+    its own copy of the board, see playout for the parameters.
+
+    Returns
+    -------
+    np.ndarray
+        number of playouts ending drawn (index NO_PLAYER) and won by
+        PLAYER1 and PLAYER2
+    """
+    n = states.shape[0]
+    winners = np.empty(n, dtype=np.int64)
+    for i in prange(n):
+        winners[i] = playout(board.copy(), heights.copy(), player,
+                             last_action, k, lines, cell_lines,
+                             states[i:i + 1])
+    outcomes = np.zeros(3, dtype=np.int64)
+    for i in range(n):
+        outcomes[winners[i]] += 1
+    return outcomes
+
+
+def warmup():
+    """
+    Compiles the kernels of this module, see agents.common.warmup.
+    """
+    state = rng_state(0)
+    for k in (CONNECT_N, CONNECT_N + 1):
+        board = initialize_game_state()
+        lines, cell_lines = line_table(*board.shape, k)
+        for player, last_action in ((PLAYER1, -1), (BoardPiece(PLAYER2), 3),
+                                    (PLAYER1, np.int8(3))):
+            playout(board.copy(), column_heights(board), player,
+                    last_action, k, lines, cell_lines, state)
+            playouts(board, column_heights(board), player, last_action, k,
+                     lines, cell_lines, rng_state(0, 2))
@@ -0,0 +1,33 @@
+"""
+Compiles the numba kernels of all agents ahead of time into numba's on-disk
+cache (the __pycache__ directories next to the modules), so that neither
+tests, tournament workers nor the command line compile them again. The
+self-recursive kernels negamax and solver_negamax cannot be cached on
+their own, their code is cached with their callers negamax_root and
+solver_root and loaded from there. A process still loads the cache once,
+which the warmup functions of the agents do before the first move. Run
+it once after installing or changing the code:
+
+    python -m agents.aot
+
+Set NUMBA_CACHE_DIR to build the cache for a read-only installation.
+"""
+import time
+
+
+def build():
+    """
+    Imports the agents and calls the warmup functions of their modules.
+    """
+    from agents import common
+    from agents.agent_minimax import minimax
+    from agents.agent_montecarlo import node_pool, rollout
+
+    for module in (common, minimax, node_pool, rollout):
+        t0 = time.time()
+        module.warmup()
+        print(f'{module.__name__}: {time.time() - t0:.3f}s')
+
+
+if __name__ == '__main__':
+    build()
@@ -1,7 +1,9 @@
+import os
 from enum import Enum
+from functools import lru_cache
 import numpy as np
-from typing import Optional, Callable, Tuple
-from numba import njit
+from typing import Optional, Callable, Tuple, Union, Sequence
+from numba import njit, prange
 
 # board[i, j] == PLAYER2 where max_player 2 (max_player to move second) has a piece,
 # board[i, j] == PLAYER1 where max_player 1 (max_player to move first) has a piece
@@ -19,6 +21,14 @@ PLAYER2_PRINT = BoardPiecePrint('O')
 
 PlayerAction = np.int8  # The column to be played
 
+# default shape of the board and number of pieces in a row needed to win
+ROWS = 6
+COLUMNS = 7
+CONNECT_N = 4
+
+# path of the opening book of the agents, see agents.opening_book
+OPENING_BOOK = os.path.join(os.path.dirname(__file__), 'opening_book.bin')
+
 
 class GameState(Enum):
     IS_WIN = 1
@@ -37,15 +47,16 @@ GenMove = Callable[
 ]
 
 
-def initialize_game_state() -> np.ndarray:
+def initialize_game_state(rows: int = ROWS,
+                          columns: int = COLUMNS) -> np.ndarray:
     """
-    Initializes a new empty game board as a ndarray with shape (6,7) and
-    data type BoardPiece initialized to 0 (NO_PLAYER).
+    Initializes a new empty game board as a ndarray with shape (rows,columns)
+    and data type BoardPiece initialized to 0 (NO_PLAYER).
 
     return: ndarray
-        empty board, shape: 6x7
+        empty board, shape: 6x7 by default
     """
-    board = np.empty((6, 7), dtype=BoardPiece)
+    board = np.empty((rows, columns), dtype=BoardPiece)
     board.fill(NO_PLAYER)
     return board
 
@@ -84,8 +95,7 @@ def pretty_print_board(board: np.ndarray) -> str:
     board_print[board == PLAYER2] = PLAYER2_PRINT
     board_print = np.flip(board_print, 0)
 
-    top = '|=============|\n'
-    bottom = '|=============|\n|0 1 2 3 4 5 6|'
+    top, bottom = _board_frame(board.shape[1])
 
     pp_board = top
     for row in board_print:
@@ -95,36 +105,70 @@ def pretty_print_board(board: np.ndarray) -> str:
     return pp_board
 
 
+def _board_frame(columns: int) -> Tuple[str, str]:
+    """
+    Returns the top and the bottom lines of pretty_print_board for a board
+    with the given number of columns.
+    """
+    top = '|' + '=' * (2 * columns - 1) + '|\n'
+    bottom = top + '|' + ' '.join(str(j % 10) for j in range(columns)) + '|'
+    return top, bottom
+
+
+# byte value of the printed pieces -> BoardPiece, for parsing boards in bulk
+PRINT_TO_PIECE = np.zeros(256, dtype=BoardPiece)
+PRINT_TO_PIECE[ord(PLAYER1_PRINT)] = PLAYER1
+PRINT_TO_PIECE[ord(PLAYER2_PRINT)] = PLAYER2
+
+
 def string_to_board(pp_board: str) -> np.ndarray:
     """
     Takes the output of pretty_print_board and turns it back into an ndarray.
     This is quite useful for debugging, when the agent crashed and you have the
-    last board state as a string.
+    last board state as a string. The shape of the board is taken from the
+    string.
 
     Parameters
     ----------
     pp_board
     """
-    top = '|=============|\n'
-    bottom = '|=============|\n|0 1 2 3 4 5 6|'
-
-    pp_board = pp_board[len(top):(len(pp_board)-len(bottom))-1]
-    pp_board = np.array(pp_board.split('\n'))
+    return strings_to_boards([pp_board])[0]
 
-    board_print = np.empty((6, 7), dtype=BoardPiecePrint)
 
-    for i in range(len(board_print)):
-        row = pp_board[i][1:-1:2]
-        for j in range(len(board_print[0])):
-            board_print[i, j] = row[j]
+def strings_to_boards(pp_boards: Sequence[str]) -> np.ndarray:
+    """
+    Turns many outputs of pretty_print_board of boards with the same shape
+    back into a stack of boards at once. The characters are not parsed one
+    by one: the strings are joined into one byte buffer, reshaped into
+    (boards, lines, characters) and the pieces are looked up in
+    PRINT_TO_PIECE, which parses a million boards in about a second.
+    Raises ValueError if the strings do not have the same length.
 
-    board = np.empty_like(board_print, dtype=BoardPiece)
-    board[board_print == NO_PLAYER_PRINT] = NO_PLAYER
-    board[board_print == PLAYER1_PRINT] = PLAYER1
-    board[board_print == PLAYER2_PRINT] = PLAYER2
-    board = np.flip(board, 0)
+    Parameters
+    ----------
+    pp_boards: Sequence[str]
+        boards in string representation, see pretty_print_board
 
-    return board
+    Returns
+    -------
+    np.ndarray
+        game boards, shape: (N, rows, columns), (0, ROWS, COLUMNS) for no
+        strings
+    """
+    if len(pp_boards) == 0:
+        return np.zeros((0, ROWS, COLUMNS), dtype=BoardPiece)
+    length = len(pp_boards[0]) + 1
+    if any(len(pp_board) + 1 != length for pp_board in pp_boards):
+        raise ValueError('boards of different shapes')
+    width = pp_boards[0].index('\n') + 1
+    rows = pp_boards[0].count('\n') - 2
+    columns = width // 2 - 1
+
+    data = np.frombuffer('\n'.join(pp_boards).encode('ascii') + b'\n',
+                        dtype=np.uint8)
+    cells = data.reshape(len(pp_boards), length)[:, width:width*(rows+1)]
+    cells = cells.reshape(len(pp_boards), rows, width)[:, ::-1, 1:-2:2]
+    return PRINT_TO_PIECE[cells]
 
 
 def apply_player_action(board: np.ndarray,
@@ -164,7 +208,7 @@ def apply_player_action(board: np.ndarray,
     raise NameError(f'action {action} not possible')
 
 
-@njit()
+@njit(cache=True)
 def connected_four(board: np.ndarray,
                    player: BoardPiece,
                    last_action: PlayerAction) -> bool:
@@ -191,7 +235,6 @@ def connected_four(board: np.ndarray,
     """
 
     max_row = board.shape[0]
-    max_column = board.shape[1]
 
     last_row = 0
 
@@ -204,6 +247,41 @@ def connected_four(board: np.ndarray,
             last_row = max_row-i
             break
 
+    return connected_four_cell(board, player, last_row, last_action)
+
+
+@njit(cache=True)
+def connected_four_cell(board: np.ndarray,
+                        player: BoardPiece,
+                        last_row: int,
+                        last_action: PlayerAction) -> bool:
+    """
+    Returns True if the piece of `player` at board[last_row, last_action]
+    is part of four adjacent pieces equal to `player` arranged in either a
+    horizontal, vertical, or diagonal line. Returns False otherwise.
+    Used by connected_four and by Board, which already knows the row of the
+    last piece.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        array representation of the current board
+    player: BoardPiece
+        player who did the last move
+    last_row: int
+        row of the last piece
+    last_action: PlayerAction
+        last action of the player (last column that was played)
+
+    Returns
+    -------
+    bool
+        four connected pieces True or False
+    """
+
+    max_row = board.shape[0]
+    max_column = board.shape[1]
+
     max_connect = 0
 
     # check vertical
@@ -266,7 +344,7 @@ def connected_four(board: np.ndarray,
     return False
 
 
-@njit()
+@njit(cache=True)
 def connected_n(board: np.ndarray,
                 player: BoardPiece,
                 last_action: PlayerAction,
@@ -425,9 +503,438 @@ def connected_n(board: np.ndarray,
     return count
 
 
+# Line tables
+# -----------
+# For boards of any shape and any number k of pieces in a row needed to win,
+# line_table lists the flat indices (row * columns + column) of the cells of
+# every line of k cells in which a player can win, and for every cell the
+# lines through it. They are computed once per shape and passed to the
+# compiled kernels below. The default 6x7 connect four keeps using the hard
+# coded connected_four and connected_n.
+
+@lru_cache(maxsize=None)
+def line_table(rows: int = ROWS,
+               columns: int = COLUMNS,
+               k: int = CONNECT_N) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the table of all winning lines of a board with the given shape
+    and the lines through every cell. The arrays are cached and read-only.
+
+    Parameters
+    ----------
+    rows: int
+        number of rows of the board
+    columns: int
+        number of columns of the board
+    k: int
+        number of pieces in a row needed to win
+
+    Returns
+    -------
+    lines: np.ndarray
+        flat cell indices of every line, shape: (number of lines, k)
+    cell_lines: np.ndarray
+        indices of the lines through every cell, padded with -1,
+        shape: (rows * columns, maximal number of lines through a cell)
+    """
+    lines = []
+    for d_row, d_column in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        for row in range(rows):
+            for column in range(columns):
+                end_row = row + (k - 1) * d_row
+                end_column = column + (k - 1) * d_column
+                if 0 <= end_row < rows and 0 <= end_column < columns:
+                    lines.append([(row + i * d_row) * columns
+                                  + column + i * d_column for i in range(k)])
+    lines = np.array(lines, dtype=np.intp).reshape(-1, k)
+
+    through = [[] for _ in range(rows * columns)]
+    for i, line in enumerate(lines):
+        for cell in line:
+            through[cell].append(i)
+    cell_lines = np.full((rows * columns, max(map(len, through), default=0)),
+                         -1, dtype=np.intp)
+    for cell, line_indices in enumerate(through):
+        cell_lines[cell, :len(line_indices)] = line_indices
+
+    lines.flags.writeable = False
+    cell_lines.flags.writeable = False
+    return lines, cell_lines
+
+
+@njit(cache=True)
+def connected_lines(board: np.ndarray,
+                    player: BoardPiece,
+                    row: int,
+                    column: int,
+                    lines: np.ndarray,
+                    cell_lines: np.ndarray) -> bool:
+    """
+    Returns True if one of the lines through board[row, column] (see
+    line_table) is completely occupied by player.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        array representation of the current board
+    player: BoardPiece
+        player who did the last move
+    row: int
+        row of the last piece
+    column: int
+        column of the last piece
+    lines: np.ndarray
+        lines of the board, see line_table
+    cell_lines: np.ndarray
+        lines through every cell, see line_table
+
+    Returns
+    -------
+    bool
+    """
+    max_column = board.shape[1]
+    for line in cell_lines[row * max_column + column]:
+        if line < 0:
+            break
+        connected = True
+        for cell in lines[line]:
+            if board[cell // max_column, cell % max_column] != player:
+                connected = False
+                break
+        if connected:
+            return True
+    return False
+
+
+@njit(cache=True)
+def count_lines(board: np.ndarray,
+                player: BoardPiece,
+                row: int,
+                column: int,
+                n: int,
+                lines: np.ndarray,
+                cell_lines: np.ndarray) -> int:
+    """
+    Returns the number of lines through board[row, column] (see line_table)
+    that hold exactly n pieces of player and no piece of the opponent, i.e.
+    in which player still can connect k pieces.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        array representation of the current board
+    player: BoardPiece
+        player who did the last move
+    row: int
+        row of the last piece
+    column: int
+        column of the last piece
+    n: int
+        number of pieces of player
+    lines: np.ndarray
+        lines of the board, see line_table
+    cell_lines: np.ndarray
+        lines through every cell, see line_table
+
+    Returns
+    -------
+    count: int
+    """
+    max_column = board.shape[1]
+    count = 0
+    for line in cell_lines[row * max_column + column]:
+        if line < 0:
+            break
+        pieces = 0
+        for cell in lines[line]:
+            piece = board[cell // max_column, cell % max_column]
+            if piece == player:
+                pieces += 1
+            elif piece != NO_PLAYER:
+                pieces = -1
+                break
+        if pieces == n:
+            count += 1
+    return count
+
+
+@njit(cache=True)
+def window_counts(board: np.ndarray, lines: np.ndarray) -> np.ndarray:
+    """
+    Counts the pieces of both players in every window (line of k cells, see
+    line_table) of the board. Only windows without pieces of the opponent
+    are counted, i.e. windows in which the player still can connect k
+    pieces.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        array representation of the current board
+    lines: np.ndarray
+        windows of the board, see line_table
+
+    Returns
+    -------
+    counts: np.ndarray
+        counts[player, n] is the number of windows with n pieces of player
+        and k-n empty cells, shape: (3, k+1)
+    """
+    cells = board.ravel()
+    counts = np.zeros((3, lines.shape[1] + 1), dtype=np.int64)
+    for i in range(lines.shape[0]):
+        n_player1 = 0
+        n_player2 = 0
+        for j in range(lines.shape[1]):
+            piece = cells[lines[i, j]]
+            if piece == PLAYER1:
+                n_player1 += 1
+            elif piece == PLAYER2:
+                n_player2 += 1
+        if n_player2 == 0:
+            counts[PLAYER1, n_player1] += 1
+        if n_player1 == 0:
+            counts[PLAYER2, n_player2] += 1
+    return counts
+
+
+# Incremental window counts
+# -------------------------
+# Instead of counting all windows of a board again for every evaluation,
+# the pieces of both players in every window are kept in an array
+#   windows: np.ndarray, windows[line, player] pieces of player in the line
+# together with
+#   score: np.ndarray, score[0] the window score of PLAYER1 (WINDOW_WEIGHTS[0]
+#          per open window with k-1 pieces and WINDOW_WEIGHTS[1] per open
+#          window with k-2 pieces, minus the same for PLAYER2) and
+#          score[player] the number of windows completed by player
+# Dropping or removing a piece only updates the windows through its cell.
+
+WINDOW_WEIGHTS = (100, 10)
+
+
+@njit(cache=True)
+def window_value(n_player1: int, n_player2: int, k: int) -> int:
+    """
+    Returns the contribution of a window with the given pieces to the
+    window score of PLAYER1.
+    """
+    if n_player2 == 0:
+        if n_player1 == k - 1:
+            return WINDOW_WEIGHTS[0]
+        if n_player1 == k - 2:
+            return WINDOW_WEIGHTS[1]
+    elif n_player1 == 0:
+        if n_player2 == k - 1:
+            return -WINDOW_WEIGHTS[0]
+        if n_player2 == k - 2:
+            return -WINDOW_WEIGHTS[1]
+    return 0
+
+
+@njit(cache=True)
+def window_state(board: np.ndarray,
+                 lines: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Counts the pieces in every window of the board from scratch.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        array representation of the current board
+    lines: np.ndarray
+        windows of the board, see line_table
+
+    Returns
+    -------
+    windows: np.ndarray
+        pieces of both players per window, shape: (number of lines, 3)
+    score: np.ndarray
+        window score of PLAYER1 and the windows completed by both players,
+        shape: (3,)
+    """
+    cells = board.ravel()
+    k = lines.shape[1]
+    windows = np.zeros((lines.shape[0], 3), dtype=np.int64)
+    score = np.zeros(3, dtype=np.int64)
+    for i in range(lines.shape[0]):
+        for j in range(k):
+            windows[i, cells[lines[i, j]]] += 1
+        score[0] += window_value(windows[i, PLAYER1], windows[i, PLAYER2], k)
+        for player in (PLAYER1, PLAYER2):
+            if windows[i, player] == k:
+                score[player] += 1
+    return windows, score
+
+
+@njit(cache=True)
+def window_update(windows: np.ndarray,
+                  score: np.ndarray,
+                  cell_lines: np.ndarray,
+                  cell: int,
+                  player: BoardPiece,
+                  delta: int,
+                  k: int):
+    """
+    Updates the window counts in place after a piece of player was dropped
+    (delta 1) into or removed (delta -1) from a cell.
+
+    Parameters
+    ----------
+    windows, score: np.ndarray
+        window counts, see window_state
+    cell_lines: np.ndarray
+        lines through every cell, see line_table
+    cell: int
+        flat index of the cell (row * columns + column)
+    player: BoardPiece
+        owner of the piece
+    delta: int
+        1 for a piece dropped, -1 for a piece removed
+    k: int
+        number of pieces in a row needed to win
+    """
+    for j in range(cell_lines.shape[1]):
+        line = cell_lines[cell, j]
+        if line < 0:
+            break
+        n_player1 = windows[line, PLAYER1]
+        n_player2 = windows[line, PLAYER2]
+        score[0] -= window_value(n_player1, n_player2, k)
+        if windows[line, player] == k:
+            score[player] -= 1
+        windows[line, player] += delta
+        if windows[line, player] == k:
+            score[player] += 1
+        score[0] += window_value(windows[line, PLAYER1],
+                                 windows[line, PLAYER2], k)
+
+
+@njit(cache=True)
+def window_delta(windows: np.ndarray,
+                 cell_lines: np.ndarray,
+                 cell: int,
+                 player: BoardPiece,
+                 k: int) -> Tuple[int, bool]:
+    """
+    Returns the change of the window score of PLAYER1 and whether player
+    completes a window if a piece of player is dropped into the cell,
+    without updating the window counts (see window_update).
+    """
+    delta = 0
+    won = False
+    for j in range(cell_lines.shape[1]):
+        line = cell_lines[cell, j]
+        if line < 0:
+            break
+        n_player1 = windows[line, PLAYER1]
+        n_player2 = windows[line, PLAYER2]
+        delta -= window_value(n_player1, n_player2, k)
+        if player == PLAYER1:
+            n_player1 += 1
+            won |= n_player1 == k
+        else:
+            n_player2 += 1
+            won |= n_player2 == k
+        delta += window_value(n_player1, n_player2, k)
+    return delta, won
+
+
+def last_row(board: np.ndarray, last_action: PlayerAction) -> int:
+    """
+    Returns the row of the top piece in column last_action.
+    """
+    return int(np.flatnonzero(board[:, last_action] != NO_PLAYER)[-1])
+
+
+def connected_k_cell(board: np.ndarray,
+                     player: BoardPiece,
+                     row: int,
+                     column: int,
+                     k: int = CONNECT_N) -> bool:
+    """
+    Returns True if the piece of player at board[row, column] is part of k
+    adjacent pieces of player. Uses connected_four_cell for k = 4 and the
+    line table of the board otherwise.
+    """
+    if k == CONNECT_N:
+        return connected_four_cell(board, player, row, column)
+    return connected_lines(board, player, row, column,
+                           *line_table(board.shape[0], board.shape[1], k))
+
+
+def connected_k(board: np.ndarray,
+                player: BoardPiece,
+                last_action: Optional[PlayerAction],
+                k: int = CONNECT_N) -> bool:
+    """
+    Returns True if the last action of player connected k adjacent pieces
+    of player, the generalisation of connected_four to any k and any board
+    shape.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        array representation of the current board
+    player: BoardPiece
+        player who did the last move
+    last_action: PlayerAction
+        last action of the player (last column that was played)
+    k: int
+        number of pieces in a row needed to win
+
+    Returns
+    -------
+    bool
+    """
+    if last_action is None:
+        return False
+    if k == CONNECT_N:
+        return connected_four(board, player, last_action)
+    return connected_k_cell(board, player, last_row(board, last_action),
+                            last_action, k)
+
+
+# GameState values as plain integers for the compiled kernels
+IS_WIN_CODE = np.int8(GameState.IS_WIN.value)
+IS_DRAW_CODE = np.int8(GameState.IS_DRAW.value)
+STILL_PLAYING_CODE = np.int8(GameState.STILL_PLAYING.value)
+
+
+@njit(cache=True)
+def end_state_code(board: np.ndarray,
+                   player: BoardPiece,
+                   last_action: int) -> np.int8:
+    """
+    Kernel of check_end_state and check_end_state_batch, returns the value
+    of the GameState instead of the GameState itself. A negative last_action
+    stands for no last action, in which case the game cannot be won.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        game board in array representation to check for state
+    player: BoardPiece
+        player who did the last move
+    last_action: int
+        last action of the player (last column that was played) or -1
+
+    Returns
+    -------
+    np.int8
+        GameState value
+    """
+    if last_action >= 0 and connected_four(board, player, last_action):
+        return IS_WIN_CODE
+    for piece in board.ravel():
+        if piece == NO_PLAYER:
+            return STILL_PLAYING_CODE
+    return IS_DRAW_CODE
+
+
 def check_end_state(board: np.ndarray,
                     player: BoardPiece,
-                    last_action: PlayerAction) -> GameState:
+                    last_action: PlayerAction,
+                    k: int = CONNECT_N) -> GameState:
     """
     Returns the current game state for the current `max_player`, i.e. did their
     last action lead to a win (GameState.IS_WIN) or drawn (GameState.IS_DRAW)
@@ -441,17 +948,68 @@ def check_end_state(board: np.ndarray,
         player who did the last move
     last_action: PlayerAction
         last action of the player (last column that was played)
+    k: int
+        number of pieces in a row needed to win
 
     Returns
     -------
     GameState
     """
-    if connected_four(board, player, last_action):
-        return GameState.IS_WIN
-    elif np.all(board != NO_PLAYER):
-        return GameState.IS_DRAW
-    else:
-        return GameState.STILL_PLAYING
+    if k != CONNECT_N:
+        if connected_k(board, player, last_action, k):
+            return GameState.IS_WIN
+        last_action = None
+    if last_action is None:
+        last_action = -1
+    return GameState(end_state_code(board, player, last_action))
+
+
+@njit(parallel=True, cache=True)
+def _end_state_batch(boards: np.ndarray,
+                     players: np.ndarray,
+                     last_actions: np.ndarray) -> np.ndarray:
+    """
+    Kernel of check_end_state_batch for k = CONNECT_N, calls end_state_code
+    for the boards in parallel.
+    """
+    n = boards.shape[0]
+    states = np.empty(n, dtype=np.int8)
+    for i in prange(n):
+        states[i] = end_state_code(boards[i], players[i], last_actions[i])
+    return states
+
+
+def check_end_state_batch(boards: np.ndarray,
+                          players: np.ndarray,
+                          last_actions: np.ndarray,
+                          k: int = CONNECT_N) -> np.ndarray:
+    """
+    Calls check_end_state for a stack of boards and returns the GameState
+    values (GameState.IS_WIN.value, ...) of all boards. For k = CONNECT_N
+    the boards are checked by one compiled kernel in parallel.
+
+    Parameters
+    ----------
+    boards: np.ndarray
+        game boards, shape: (N, rows, columns)
+    players: np.ndarray
+        player who did the last move on every board, shape: (N,)
+    last_actions: np.ndarray
+        last column played on every board or -1, shape: (N,)
+    k: int
+        number of pieces in a row needed to win
+
+    Returns
+    -------
+    np.ndarray
+        GameState values, shape: (N,)
+    """
+    if k == CONNECT_N:
+        return _end_state_batch(boards, players, last_actions)
+    return np.array([check_end_state(board, player,
+                                     None if action < 0 else action, k).value
+                     for board, player, action
+                     in zip(boards, players, last_actions)], dtype=np.int8)
 
 
 def change_player(player: BoardPiece) -> BoardPiece:
@@ -487,3 +1045,980 @@ def valid_action(board: np.ndarray) -> np.ndarray:
     np.array of valid columns
     """
     return np.argwhere(board[-1, :] == NO_PLAYER).flatten()
+
+
+def get_legal_moves(board: Union[np.ndarray, 'Board']) -> np.ndarray:
+    """
+    Returns the legal moves, e.g. all columns that are not full, of a game
+    board in array representation or of a Board.
+
+    Parameters
+    ----------
+    board: np.ndarray or Board
+        current game board
+    Returns
+    -------
+    np.array of valid columns
+    """
+    if isinstance(board, Board):
+        return board.valid_action()
+    return valid_action(board)
+
+
+@njit(cache=True)
+def column_heights(board: np.ndarray) -> np.ndarray:
+    """
+    Returns the number of pieces in every column of the board, i.e. the
+    row in which the next piece dropped into the column lands.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        game board in array representation
+
+    Returns
+    -------
+    np.ndarray
+        heights of all columns
+    """
+    max_row, max_column = board.shape
+    heights = np.zeros(max_column, dtype=BoardPiece)
+    for column in range(max_column):
+        for row in range(max_row - 1, -1, -1):
+            if board[row, column] != NO_PLAYER:
+                heights[column] = row + 1
+                break
+    return heights
+
+
+@njit(cache=True)
+def make_move(board: np.ndarray,
+              heights: np.ndarray,
+              action: PlayerAction,
+              player: BoardPiece) -> int:
+    """
+    Drops a piece of player into column action in place, i.e. without
+    copying the board, and updates the column heights. The action has to be
+    valid, which is not checked for speed. Together with unmake_move this
+    lets a search work on a single board.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        game board in array representation, modified in place
+    heights: np.ndarray
+        number of pieces in every column (see column_heights), modified in
+        place
+    action: PlayerAction
+        column to be played by player
+    player: BoardPiece
+        player who makes the move
+
+    Returns
+    -------
+    int
+        row in which the piece landed
+    """
+    row = heights[action]
+    board[row, action] = player
+    heights[action] = row + 1
+    return row
+
+
+@njit(cache=True)
+def unmake_move(board: np.ndarray,
+                heights: np.ndarray,
+                action: PlayerAction):
+    """
+    Takes back the top piece of column action in place, i.e. reverts
+    make_move.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        game board in array representation, modified in place
+    heights: np.ndarray
+        number of pieces in every column, modified in place
+    action: PlayerAction
+        column of the piece
+    """
+    row = heights[action] - 1
+    board[row, action] = NO_PLAYER
+    heights[action] = row
+
+
+# Zobrist hashing
+# ---------------
+# Every (player, row, column) has a fixed random 64 bit key (for boards of up
+# to ZOBRIST_SIZE x ZOBRIST_SIZE, larger boards cannot be hashed), the key
+# of a board is the XOR of the keys of all its pieces. Dropping or removing
+# a piece therefore changes the key by a single XOR. The keys are generated
+# from a fixed seed so that all processes agree on them.
+
+ZOBRIST_SEED = 20210701
+ZOBRIST_SIZE = 16
+ZOBRIST_KEYS = np.random.default_rng(ZOBRIST_SEED).integers(
+    1, 2**64 - 1, size=(3, ZOBRIST_SIZE, ZOBRIST_SIZE), dtype=np.uint64,
+    endpoint=True)
+ZOBRIST_KEYS[NO_PLAYER] = 0
+# XOR-ed into the key of a board to tell which player is to move
+ZOBRIST_TO_MOVE = np.random.default_rng(ZOBRIST_SEED + 1).integers(
+    1, 2**64 - 1, size=3, dtype=np.uint64, endpoint=True)
+ZOBRIST_TO_MOVE[NO_PLAYER] = 0
+
+
+@njit(cache=True)
+def zobrist_hash(board: np.ndarray) -> np.uint64:
+    """
+    Hashes the board from scratch by XOR-ing the Zobrist keys of all pieces.
+    Raises ValueError for boards with more than ZOBRIST_SIZE rows or
+    columns, the keys of moves are only valid for boards that were hashed.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        game board in array representation
+
+    Returns
+    -------
+    np.uint64
+        Zobrist key of the board
+    """
+    key = np.uint64(0)
+    max_row, max_column = board.shape
+    if max_row > ZOBRIST_SIZE or max_column > ZOBRIST_SIZE:
+        raise ValueError('board too large for the Zobrist keys')
+    for row in range(max_row):
+        for column in range(max_column):
+            key ^= ZOBRIST_KEYS[board[row, column], row, column]
+    return key
+
+
+@njit(cache=True)
+def zobrist_update(key: np.uint64,
+                   row: int,
+                   column: int,
+                   player: BoardPiece) -> np.uint64:
+    """
+    Returns the key of the board after a piece of player was dropped to or
+    removed from board[row, column]. Both are the same XOR.
+
+    Parameters
+    ----------
+    key: np.uint64
+        Zobrist key before the change
+    row: int
+        row of the piece
+    column: int
+        column of the piece
+    player: BoardPiece
+        owner of the piece
+
+    Returns
+    -------
+    np.uint64
+        Zobrist key after the change
+    """
+    return np.uint64(key) ^ ZOBRIST_KEYS[player, row, column]
+
+
+def canonical_hash(board: np.ndarray) -> Tuple[np.uint64, bool]:
+    """
+    Returns the key of the board that is the same for the board and its
+    mirror image (the smaller one of their Zobrist keys), such that the two
+    are stored once, e.g. in the opening book.
+
+    Parameters
+    ----------
+    board: np.ndarray
+        game board in array representation
+
+    Returns
+    -------
+    key: np.uint64
+        canonical key of the board
+    mirrored: bool
+        whether the key is the one of the mirror image, columns of moves
+        stored with the key are then mirrored (column -> columns - 1 - column)
+    """
+    key = np.uint64(zobrist_hash(board))
+    mirrored_key = np.uint64(zobrist_hash(np.ascontiguousarray(
+        board[:, ::-1])))
+    if mirrored_key < key:
+        return mirrored_key, True
+    return key, False
+
+
+class Board:
+
+    def __init__(self, board: Optional[np.ndarray] = None,
+                 k: int = CONNECT_N):
+        """
+        Game board that keeps track of the column heights, the number of
+        pieces (ply), the moves played on it and its Zobrist key, so that
+        dropping and removing a piece, finding the legal moves and the
+        landing row, detecting a draw and hashing do not need to scan the
+        board. The board in array representation is available
+        as attribute `array` (and through np.asarray) for all functions
+        working on np.ndarray boards.
+
+        Parameters
+        ----------
+        board: np.ndarray
+            game board in array representation the Board is based on, it is
+            used (not copied). By default a new empty board is created.
+        k: int
+            number of pieces in a row needed to win
+        """
+
+        if board is None:
+            board = initialize_game_state()
+        self.array = board
+        self.k = k
+        self.heights = column_heights(board)
+        self.ply = int(np.sum(board != NO_PLAYER))
+        self.key = np.uint64(zobrist_hash(board))
+        self.moves = []
+        self.last_action = None
+        self.last_player = None
+
+    def __array__(self, dtype=None):
+        if dtype is None:
+            return self.array
+        return self.array.astype(dtype)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.array.shape
+
+    def copy(self) -> 'Board':
+        board = Board.__new__(Board)
+        board.array = self.array.copy()
+        board.k = self.k
+        board.heights = self.heights.copy()
+        board.ply = self.ply
+        board.key = self.key
+        board.moves = self.moves.copy()
+        board.last_action = self.last_action
+        board.last_player = self.last_player
+        return board
+
+    def __str__(self) -> str:
+        return pretty_print_board(self.array)
+
+    def landing_row(self, action: PlayerAction) -> int:
+        """
+        Returns the row in which a piece dropped into column action lands.
+        """
+        return int(self.heights[action])
+
+    def is_valid_action(self, action: PlayerAction) -> bool:
+        """
+        Returns True if action is a column of the board that is not full.
+        """
+        return 0 <= action < self.shape[1] \
+            and self.heights[action] < self.shape[0]
+
+    def valid_action(self) -> np.ndarray:
+        """
+        Returns all columns that are not full.
+        """
+        return np.flatnonzero(self.heights < self.shape[0])
+
+    def is_full(self) -> bool:
+        """
+        Returns True if there is no empty position left.
+        """
+        return self.ply == self.array.size
+
+    def apply_player_action(self, action: PlayerAction,
+                            player: BoardPiece) -> 'Board':
+        """
+        Drops a piece of player into column action and remembers it as last
+        move. The Board itself is returned.
+        If action is not valid, NameError is raised.
+        """
+        if not self.is_valid_action(action):
+            print(self)
+            raise NameError(f'action {action} not possible')
+        row = self.heights[action]
+        self.array[row, action] = player
+        self.key = np.uint64(zobrist_update(self.key, row, action, player))
+        self.heights[action] += 1
+        self.ply += 1
+        self.moves.append(action)
+        self.last_action = action
+        self.last_player = player
+        return self
+
+    def undo_player_action(self) -> 'Board':
+        """
+        Removes the piece of the last move played on this Board. The Board
+        itself is returned.
+        If no move was played on this Board, NameError is raised.
+        """
+        if not self.moves:
+            raise NameError('no action to undo')
+        action = self.moves.pop()
+        self.heights[action] -= 1
+        row = self.heights[action]
+        self.key = np.uint64(zobrist_update(self.key, row, action,
+                                            self.array[row, action]))
+        self.array[row, action] = NO_PLAYER
+        self.ply -= 1
+        if self.moves:
+            self.last_action = self.moves[-1]
+            self.last_player = self.array[self.heights[self.last_action] - 1,
+                                          self.last_action]
+        else:
+            self.last_action = None
+            self.last_player = None
+        return self
+
+    def connected_four(self) -> bool:
+        """
+        Returns True if the last move connected four (k) pieces.
+        """
+        if self.last_action is None:
+            return False
+        return connected_k_cell(self.array, self.last_player,
+                                self.heights[self.last_action] - 1,
+                                self.last_action, self.k)
+
+    def check_end_state(self) -> GameState:
+        """
+        Returns the current game state for the player of the last move,
+        see check_end_state.
+        """
+        if self.connected_four():
+            return GameState.IS_WIN
+        elif self.is_full():
+            return GameState.IS_DRAW
+        else:
+            return GameState.STILL_PLAYING
+
+
+# Bitboard representation
+# -----------------------
+# Every column occupies height = rows + 1 consecutive bits of an unsigned 64
+# bit integer: the lowest rows bits hold the rows from bottom to top and the
+# top bit is an always empty sentinel that stops the shifts of the win
+# detection from wrapping into the next column. Cell (row, column) therefore
+# is bit column * height + row, boards with (rows + 1) * columns <= 64 fit
+# (see fits_bitboard). A position is stored as
+#   pieces: np.ndarray of two BitBoards, pieces[PLAYER1-1] and pieces[PLAYER2-1]
+#   heights: np.ndarray with the number of pieces in every column
+# The defaults of the functions are those of the standard board, BITBOARD_*.
+
+BitBoard = np.uint64  # The data type of a bitboard
+BITBOARD_ROWS = 6
+BITBOARD_COLUMNS = 7
+BITBOARD_HEIGHT = BITBOARD_ROWS + 1
+
+
+def fits_bitboard(rows: int, columns: int) -> bool:
+    """
+    Returns whether boards of the shape fit into a bitboard.
+    """
+    return (rows + 1) * columns <= 64
+
+
+def bitboard_masks(rows: int, columns: int) -> Tuple[BitBoard, BitBoard]:
+    """
+    Returns the bitboards of the bottom row and of all cells of boards of
+    the shape, BOTTOM_MASK and BOARD_MASK for the standard board.
+    """
+    bottom = sum(1 << (column * (rows + 1)) for column in range(columns))
+    return BitBoard(bottom), BitBoard(bottom * ((1 << rows) - 1))
+
+
+BOTTOM_MASK, BOARD_MASK = bitboard_masks(BITBOARD_ROWS, BITBOARD_COLUMNS)
+
+
+@njit(cache=True)
+def bitboard_connected_four(pieces: BitBoard,
+                            cells: BitBoard = BOARD_MASK,
+                            height: int = BITBOARD_HEIGHT) -> bool:
+    """
+    Returns True if the bitboard of a single player contains four adjacent
+    pieces in either a horizontal, vertical, or diagonal line that covers
+    at least one of the given cells. For every direction the board is
+    AND-ed with itself shifted by one step, which leaves the pairs, and the
+    pairs are AND-ed with themselves shifted by two steps, which leaves the
+    lowest cell of every four. Passing the cell of the last move as `cells`
+    restricts the check to fours made by that move.
+
+    Parameters
+    ----------
+    pieces: BitBoard
+        bitboard of the pieces of one player
+    cells: BitBoard
+        cells of which at least one has to be part of the four,
+        by default the whole standard board
+    height: int
+        bits per column, rows + 1
+
+    Returns
+    -------
+    bool
+        four connected pieces True or False
+    """
+    for step in (1, height, height - 1, height + 1):
+        shift = BitBoard(step)
+        pairs = pieces & (pieces >> shift)
+        fours = pairs & (pairs >> (shift + shift))
+        fours |= fours << shift
+        fours |= fours << (shift + shift)
+        if fours & cells:
+            return True
+    return False
+
+
+@njit(cache=True)
+def bitboard_popcount(cells: BitBoard) -> int:
+    """
+    Returns the number of cells set in the bitboard.
+    """
+    count = 0
+    while cells:
+        cells &= cells - BitBoard(1)
+        count += 1
+    return count
+
+
+@njit(cache=True)
+def bitboard_shift(cells: BitBoard, steps: int) -> BitBoard:
+    """
+    Shifts the bitboard up by steps bits (down for negative steps), bits
+    shifted beyond the 64 bits are lost.
+    """
+    if steps >= 64 or steps <= -64:
+        return BitBoard(0)
+    if steps >= 0:
+        return cells << BitBoard(steps)
+    return cells >> BitBoard(-steps)
+
+
+@njit(cache=True)
+def bitboard_winning_cells(pieces: BitBoard,
+                           mask: BitBoard,
+                           board_mask: BitBoard,
+                           height: int,
+                           k: int) -> BitBoard:
+    """
+    Returns the empty cells (playable or not) that complete k in a row for
+    the pieces of one player, the threats of the player. For every
+    direction and every place of the cell in a line of k, the cell is set
+    if the other k - 1 cells of the line are in pieces. Lines wrapping
+    around the board pass a sentinel cell, which is never set.
+
+    Parameters
+    ----------
+    pieces: BitBoard
+        bitboard of the pieces of one player
+    mask: BitBoard
+        cells of the pieces of both players
+    board_mask: BitBoard
+        all cells of the board, see bitboard_masks
+    height: int
+        bits per column, rows + 1
+    k: int
+        number of pieces in a row needed to win
+
+    Returns
+    -------
+    BitBoard
+        empty cells completing k in a row
+    """
+    cells = BitBoard(0)
+    for direction in (1, height, height - 1, height + 1):
+        for place in range(k):
+            line = board_mask
+            for i in range(k):
+                if i != place:
+                    line &= bitboard_shift(pieces, (place - i) * direction)
+            cells |= line
+    return cells & (board_mask ^ mask)
+
+
+@njit(cache=True)
+def bitboard_make_move(pieces: np.ndarray,
+                       heights: np.ndarray,
+                       action: PlayerAction,
+                       player: BoardPiece,
+                       height: int = BITBOARD_HEIGHT) -> BitBoard:
+    """
+    Drops a piece of player into column action, i.e. sets the lowest open
+    cell of the column in the bitboard of player and increases the height of
+    the column. The position is modified in place. The action has to be
+    valid, which is not checked for speed.
+
+    Parameters
+    ----------
+    pieces: np.ndarray
+        bitboards of both players
+    heights: np.ndarray
+        number of pieces in every column
+    action: PlayerAction
+        column to be played by player
+    player: BoardPiece
+        player who makes the move
+    height: int
+        bits per column, rows + 1
+
+    Returns
+    -------
+    BitBoard
+        bitboard with only the cell of the new piece set
+    """
+    move = BitBoard(1) << BitBoard(action * height + heights[action])
+    pieces[player - 1] |= move
+    heights[action] += 1
+    return move
+
+
+@njit(cache=True)
+def bitboard_top_cell(heights: np.ndarray,
+                      action: PlayerAction,
+                      height: int = BITBOARD_HEIGHT) -> BitBoard:
+    """
+    Returns a bitboard with only the cell of the top piece of column action
+    set, i.e. the cell of the last piece dropped into that column.
+
+    Parameters
+    ----------
+    heights: np.ndarray
+        number of pieces in every column
+    action: PlayerAction
+        column
+    height: int
+        bits per column, rows + 1
+
+    Returns
+    -------
+    BitBoard
+    """
+    return BitBoard(1) << BitBoard(action * height + heights[action] - 1)
+
+
+@njit(cache=True)
+def bitboard_legal_mask(pieces: np.ndarray,
+                        bottom: BitBoard = BOTTOM_MASK,
+                        board_mask: BitBoard = BOARD_MASK) -> BitBoard:
+    """
+    Returns a bitboard with the lowest open cell of every column that is not
+    full. Adding the bottom row to the occupied cells carries every column
+    up to its first open cell, cells of full columns end up in the sentinel
+    row and are removed by the board mask.
+
+    Parameters
+    ----------
+    pieces: np.ndarray
+        bitboards of both players
+    bottom, board_mask: BitBoard
+        bottom row and all cells of the board, see bitboard_masks
+
+    Returns
+    -------
+    BitBoard
+        cells where a piece can be dropped
+    """
+    return ((pieces[0] | pieces[1]) + bottom) & board_mask
+
+
+@njit(cache=True)
+def bitboard_valid_action(heights: np.ndarray,
+                          rows: int = BITBOARD_ROWS) -> np.ndarray:
+    """
+    Returns valid actions of the given position, e.g. all columns that are
+    not full.
+
+    Parameters
+    ----------
+    heights: np.ndarray
+        number of pieces in every column
+    rows: int
+        number of rows of the board
+
+    Returns
+    -------
+    np.array of valid columns
+    """
+    return np.flatnonzero(heights < rows)
+
+
+@njit(cache=True)
+def board_to_bitboard(board: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Converts a game board in array representation into a bitboard position.
+    Raises ValueError if the board does not fit (see fits_bitboard).
+
+    Parameters
+    ----------
+    board: np.ndarray
+        game board in array representation
+
+    Returns
+    -------
+    pieces: np.ndarray
+        bitboards of both players
+    heights: np.ndarray
+        number of pieces in every column
+    """
+    rows, columns = board.shape
+    if (rows + 1) * columns > 64:
+        raise ValueError('board too large for a bitboard')
+    pieces = np.zeros(2, dtype=BitBoard)
+    heights = np.zeros(columns, dtype=BoardPiece)
+    for column in range(columns):
+        for row in range(rows):
+            piece = board[row, column]
+            if piece != NO_PLAYER:
+                pieces[piece - 1] |= BitBoard(1) << BitBoard(
+                    column * (rows + 1) + row)
+                heights[column] = row + 1
+    return pieces, heights
+
+
+@njit(cache=True)
+def bitboard_to_board(pieces: np.ndarray,
+                      rows: int = BITBOARD_ROWS,
+                      columns: int = BITBOARD_COLUMNS) -> np.ndarray:
+    """
+    Converts a bitboard position into a game board in array representation.
+
+    Parameters
+    ----------
+    pieces: np.ndarray
+        bitboards of both players
+    rows, columns: int
+        shape of the board
+
+    Returns
+    -------
+    board: np.ndarray
+        game board in array representation
+    """
+    board = np.zeros((rows, columns), dtype=BoardPiece)
+    for column in range(columns):
+        for row in range(rows):
+            cell = BitBoard(1) << BitBoard(column * (rows + 1) + row)
+            if pieces[0] & cell:
+                board[row, column] = PLAYER1
+            elif pieces[1] & cell:
+                board[row, column] = PLAYER2
+    return board
+
+
+class BitBoardPosition:
+
+    def __init__(self, pieces: Optional[np.ndarray] = None,
+                 heights: Optional[np.ndarray] = None,
+                 rows: int = BITBOARD_ROWS):
+        """
+        Game position stored as one bitboard per player plus the heights of
+        the columns. Without arguments an empty standard board is created.
+
+        Parameters
+        ----------
+        pieces: np.ndarray
+            bitboards of both players, pieces[player-1]
+        heights: np.ndarray
+            number of pieces in every column
+        rows: int
+            number of rows of the board
+        """
+
+        if pieces is None:
+            pieces = np.zeros(2, dtype=BitBoard)
+            heights = np.zeros(BITBOARD_COLUMNS, dtype=BoardPiece)
+        self.pieces = pieces
+        self.heights = heights
+        self.rows = rows
+        self.bottom, self.board_mask = bitboard_masks(rows, len(heights))
+
+    @classmethod
+    def from_board(cls, board: np.ndarray) -> 'BitBoardPosition':
+        """
+        Creates the position of a game board in array representation.
+        """
+        return cls(*board_to_bitboard(board), board.shape[0])
+
+    @classmethod
+    def from_string(cls, pp_board: str) -> 'BitBoardPosition':
+        """
+        Creates the position from the output of pretty_print_board.
+        """
+        return cls.from_board(string_to_board(pp_board))
+
+    def to_board(self) -> np.ndarray:
+        """
+        Returns the position as game board in array representation.
+        """
+        return bitboard_to_board(self.pieces, self.rows, len(self.heights))
+
+    def __str__(self) -> str:
+        return pretty_print_board(self.to_board())
+
+    def copy(self) -> 'BitBoardPosition':
+        return BitBoardPosition(self.pieces.copy(), self.heights.copy(),
+                                self.rows)
+
+    def make_move(self, action: PlayerAction, player: BoardPiece):
+        """
+        Drops a piece of player into column action.
+        If action is not valid, NameError is raised.
+        """
+        if not 0 <= action < len(self.heights) \
+                or self.heights[action] >= self.rows:
+            raise NameError(f'action {action} not possible')
+        bitboard_make_move(self.pieces, self.heights, action, player,
+                           self.rows + 1)
+
+    def legal_mask(self) -> BitBoard:
+        """
+        Returns a bitboard with the cells where a piece can be dropped.
+        """
+        return bitboard_legal_mask(self.pieces, self.bottom, self.board_mask)
+
+    def valid_action(self) -> np.ndarray:
+        """
+        Returns all columns that are not full.
+        """
+        return bitboard_valid_action(self.heights, self.rows)
+
+    def connected_four(self, player: BoardPiece,
+                       last_action: Optional[PlayerAction] = None) -> bool:
+        """
+        Returns True if player has four connected pieces. If last_action is
+        given, only fours through the top piece of that column are counted.
+        """
+        height = self.rows + 1
+        if last_action is None:
+            cells = self.board_mask
+        else:
+            cells = bitboard_top_cell(self.heights, last_action, height)
+        return bitboard_connected_four(self.pieces[player - 1], cells, height)
+
+    def winning_cells(self, player: BoardPiece,
+                      k: int = CONNECT_N) -> BitBoard:
+        """
+        Returns the empty cells where a piece of player would connect k,
+        see bitboard_winning_cells.
+        """
+        return bitboard_winning_cells(
+            self.pieces[player - 1], self.pieces[0] | self.pieces[1],
+            self.board_mask, self.rows + 1, k)
+
+    def is_full(self) -> bool:
+        """
+        Returns True if no piece can be dropped any more.
+        """
+        return bool(np.all(self.heights >= self.rows))
+
+
+# Position codec
+# --------------
+# Compact binary form of boards for logs and analysis: every board is
+# encoded as the two BitBoards of its bitboard position (board_to_bitboard),
+# which needs (rows + 1) * columns <= 64.
+# Games can also be written as move sequences like "4453", the columns
+# played alternately by PLAYER1 and PLAYER2, counted from 1.
+
+@njit(parallel=True, cache=True)
+def encode_boards(boards: np.ndarray) -> np.ndarray:
+    """
+    Encodes a stack of boards as two BitBoards per board. Raises
+    ValueError for boards with (rows + 1) * columns > 64 cells.
+
+    Parameters
+    ----------
+    boards: np.ndarray
+        game boards, shape: (N, rows, columns)
+
+    Returns
+    -------
+    np.ndarray
+        codes[i, player-1] is the bitboard of player on board i,
+        shape: (N, 2)
+    """
+    n, max_row, max_column = boards.shape
+    if (max_row + 1) * max_column > 64:
+        raise ValueError('boards too large for the BitBoards')
+    codes = np.zeros((n, 2), dtype=BitBoard)
+    for i in prange(n):
+        codes[i] = board_to_bitboard(boards[i])[0]
+    return codes
+
+
+@njit(parallel=True, cache=True)
+def decode_boards(codes: np.ndarray,
+                  rows: int = ROWS,
+                  columns: int = COLUMNS) -> np.ndarray:
+    """
+    Decodes a stack of boards encoded by encode_boards. Raises ValueError
+    for boards with (rows + 1) * columns > 64 cells.
+
+    Parameters
+    ----------
+    codes: np.ndarray
+        two BitBoards per board, shape: (N, 2)
+    rows: int
+        number of rows of the boards
+    columns: int
+        number of columns of the boards
+
+    Returns
+    -------
+    np.ndarray
+        game boards, shape: (N, rows, columns)
+    """
+    if (rows + 1) * columns > 64:
+        raise ValueError('boards too large for the BitBoards')
+    n = codes.shape[0]
+    boards = np.zeros((n, rows, columns), dtype=BoardPiece)
+    for i in prange(n):
+        boards[i] = bitboard_to_board(codes[i], rows, columns)
+    return boards
+
+
+@njit(parallel=True, cache=True)
+def _play_moves(moves: np.ndarray,
+                lengths: np.ndarray,
+                rows: int,
+                columns: int) -> np.ndarray:
+    """
+    Kernel of moves_to_boards, plays the columns moves[i, :lengths[i]] on
+    board i. The columns of invalid moves are returned as negative lengths.
+    """
+    n = moves.shape[0]
+    boards = np.zeros((n, rows, columns), dtype=BoardPiece)
+    for i in prange(n):
+        heights = np.zeros(columns, dtype=np.int64)
+        player = PLAYER1
+        for j in range(lengths[i]):
+            column = moves[i, j]
+            if column < 0 or column >= columns or heights[column] >= rows:
+                lengths[i] = -1 - j
+                break
+            boards[i, heights[column], column] = player
+            heights[column] += 1
+            player = PLAYER2 if player == PLAYER1 else PLAYER1
+    return boards
+
+
+def moves_to_boards(move_strings: Sequence[str],
+                    rows: int = ROWS,
+                    columns: int = COLUMNS) -> np.ndarray:
+    """
+    Plays many move sequences like "4453" (columns counted from 1, PLAYER1
+    moves first) at once and returns the resulting boards.
+    If a sequence contains an invalid move, NameError is raised.
+
+    Parameters
+    ----------
+    move_strings: Sequence[str]
+        move sequences
+    rows: int
+        number of rows of the boards
+    columns: int
+        number of columns of the boards
+
+    Returns
+    -------
+    np.ndarray
+        game boards, shape: (N, rows, columns)
+    """
+    lengths = np.array([len(moves) for moves in move_strings], dtype=np.int64)
+    buffer = np.full((len(move_strings), max(lengths.max(initial=0), 1)),
+                     ord('0'), dtype=np.uint8)
+    for i, moves in enumerate(move_strings):
+        buffer[i, :lengths[i]] = np.frombuffer(moves.encode('ascii'),
+                                               dtype=np.uint8)
+    boards = _play_moves(buffer.astype(np.int64) - ord('1'), lengths,
+                         rows, columns)
+    if np.any(lengths < 0):
+        i = int(np.argmax(lengths < 0))
+        raise NameError(f'move {-lengths[i]} of {move_strings[i]} '
+                        f'not possible')
+    return boards
+
+
+def moves_to_board(moves: str,
+                   rows: int = ROWS,
+                   columns: int = COLUMNS) -> np.ndarray:
+    """
+    Plays the move sequence moves like "4453" (columns counted from 1,
+    PLAYER1 moves first) on an empty board and returns the board.
+    """
+    return moves_to_boards([moves], rows, columns)[0]
+
+
+def board_to_moves(board: 'Board') -> str:
+    """
+    Returns the moves played on a Board as move sequence like "4453"
+    (columns counted from 1).
+    """
+    return ''.join(str(action + 1) for action in board.moves)
+
+
+def warmup():
+    """
+    Compiles the numba kernels of this module for the argument types used by
+    the agents, so that the compilation does not happen during the first
+    move. The kernels are cached on disk (cache=True), so this is only slow
+    in the first process after a change of the code; agents/aot.py runs it
+    ahead of time.
+    """
+    board = initialize_game_state()
+    heights = column_heights(board)
+    player = PLAYER1
+    for action in (PlayerAction(3), 3):
+        row = make_move(board, heights, action, player)
+        connected_four(board, player, action)
+        connected_four_cell(board, player, row, action)
+        connected_four_cell(board, player, int(row), action)
+        connected_n(board, player, action, 2)
+        end_state_code(board, player, action)
+        unmake_move(board, heights, action)
+    zobrist_hash(board)
+    zobrist_update(zobrist_hash(board), 0, 3, player)
+    check_end_state(board, player, None)
+
+    for k in (CONNECT_N, CONNECT_N + 1):
+        lines, cell_lines = line_table(ROWS, COLUMNS, k)
+        connected_lines(board, player, 0, 3, lines, cell_lines)
+        count_lines(board, player, 0, 3, 2, lines, cell_lines)
+        window_counts(board, lines)
+        windows, score = window_state(board, lines)
+        window_update(windows, score, cell_lines, 3, player, 1, k)
+        window_delta(windows, cell_lines, 3, player, k)
+    canonical_hash(board)
+
+    boards = board[np.newaxis]
+    players = np.array([player], dtype=BoardPiece)
+    last_actions = np.array([3], dtype=PlayerAction)
+    check_end_state_batch(boards, players, last_actions)
+    decode_boards(encode_boards(boards))
+    moves_to_boards(['4'])
+
+    pieces, heights = board_to_bitboard(board)
+    bottom, board_mask = bitboard_masks(ROWS, COLUMNS)
+    move = bitboard_make_move(pieces, heights, 3, player)
+    bitboard_make_move(pieces, heights, PlayerAction(3), player, 7)
+    bitboard_connected_four(pieces[0])
+    bitboard_connected_four(pieces[0], move)
+    bitboard_connected_four(pieces[0], BitBoard(move))
+    bitboard_connected_four(pieces[0], board_mask, 7)
+    bitboard_top_cell(heights, PlayerAction(3))
+    bitboard_top_cell(heights, 3)
+    bitboard_top_cell(heights, PlayerAction(3), 7)
+    bitboard_legal_mask(pieces)
+    bitboard_legal_mask(pieces, bottom, board_mask)
+    bitboard_valid_action(heights)
+    bitboard_valid_action(heights, 6)
+    bitboard_to_board(pieces)
+    bitboard_to_board(pieces, 6, 7)
+    bitboard_winning_cells(pieces[0], pieces[0] | pieces[1], board_mask, 7,
+                           CONNECT_N)
+    bitboard_popcount(board_mask)
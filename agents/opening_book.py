@@ -0,0 +1,191 @@
+"""
+Opening book of the agents: the best move and score of every position up
+to a given ply, searched offline by the minimax agent (negamax_search) in a
+process pool and stored in a binary file sorted by the canonical key of the
+positions (see agents.common.canonical_hash, a position and its mirror
+image are stored once). At runtime the file is memory-mapped and a
+position is looked up by binary search (see agents.agent_minimax.book,
+which the agents import), so that the agents answer the first moves of a
+game instantly. Build the book with
+
+    python -m agents.opening_book --plies 8 --depth 12 --workers 8
+
+The file holds 64 bit words: the header (BOOK_MAGIC, rows, columns, k),
+the sorted keys and the entries packed like the entries of the
+transposition table (see agents.agent_minimax.transposition_table).
+"""
+import os
+import argparse
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict
+from agents.common import BoardPiece, PlayerAction, PLAYER1, PLAYER2, \
+    NO_PLAYER, ROWS, COLUMNS, CONNECT_N, STILL_PLAYING_CODE, \
+    initialize_game_state, column_heights, make_move, \
+    check_end_state_batch, canonical_hash, OPENING_BOOK
+from agents.agent_minimax.minimax import MinimaxState, negamax_search, \
+    WINDOWS_HEURISTIC, PVS
+from agents.agent_minimax.transposition_table import pack_entry, EXACT
+from agents.agent_minimax.book import BOOK_MAGIC, _books
+
+# state of a worker process building a book
+_worker_state: Optional[MinimaxState] = None
+
+
+def book_positions(plies: int,
+                   rows: int = ROWS,
+                   columns: int = COLUMNS,
+                   k: int = CONNECT_N) -> Dict[np.uint64, np.ndarray]:
+    """
+    Returns all positions with at most plies pieces that can occur in a
+    game (PLAYER1 moves first and the game is not over yet), one board per
+    canonical key (the one in canonical orientation).
+    """
+    positions = {}
+    level = {np.uint64(0): initialize_game_state(rows, columns)}
+    for ply in range(plies + 1):
+        positions.update(level)
+        if ply == plies:
+            break
+        player = PLAYER1 if ply % 2 == 0 else PLAYER2
+        boards, actions = [], []
+        for board in level.values():
+            heights = column_heights(board)
+            for column in range(columns):
+                if heights[column] == rows:
+                    continue
+                child = board.copy()
+                make_move(child, heights.copy(), column, player)
+                boards.append(child)
+                actions.append(column)
+        if not boards:
+            break
+        # the games that ended with the move of a level are checked at once
+        boards = np.stack(boards)
+        states = check_end_state_batch(
+            boards, np.full(len(boards), player, dtype=BoardPiece),
+            np.array(actions, dtype=PlayerAction), k)
+        children = {}
+        for child in boards[states == STILL_PLAYING_CODE]:
+            key, mirrored = canonical_hash(child)
+            if key not in children:
+                children[key] = np.ascontiguousarray(child[:, ::-1]) \
+                    if mirrored else child
+        level = children
+    return positions
+
+
+def search_positions(boards: np.ndarray,
+                     depth: int,
+                     k: int,
+                     heuristic_code: int,
+                     mode: str) -> np.ndarray:
+    """
+    Task of a worker: searches the boards (of the same ply) with
+    negamax_search to the given depth and returns their packed entries.
+    """
+    global _worker_state
+    if _worker_state is None:
+        _worker_state = MinimaxState()
+    entries = np.zeros(boards.shape[0], dtype=np.uint64)
+    for i, board in enumerate(boards):
+        ply = int(np.count_nonzero(board != NO_PLAYER))
+        player = PLAYER1 if ply % 2 == 0 else PLAYER2
+        score, column, searched = negamax_search(
+            board, player, _worker_state, None, None, depth, k,
+            heuristic_code, mode)
+        entries[i] = pack_entry(score, searched, EXACT, column)
+    return entries
+
+
+def build_book(path: str,
+               plies: int,
+               depth: int,
+               workers: int = 1,
+               rows: int = ROWS,
+               columns: int = COLUMNS,
+               k: int = CONNECT_N,
+               heuristic_code: int = WINDOWS_HEURISTIC,
+               mode: str = PVS,
+               chunk_size: int = 64) -> int:
+    """
+    Builds the book of all positions with at most plies pieces (see
+    book_positions) and writes it to path.
+
+    Parameters
+    ----------
+    path: str
+        path of the book file
+    plies: int
+        maximal number of pieces of the positions
+    depth: int
+        search depth of negamax_search
+    workers: int
+        number of worker processes, 1 to search in this process
+    rows: int
+        number of rows of the board
+    columns: int
+        number of columns of the board
+    k: int
+        number of pieces in a row needed to win
+    heuristic_code: int
+        heuristic at the leaves, see agents.agent_minimax.minimax.negamax
+    mode: str
+        search mode of negamax_search
+    chunk_size: int
+        number of positions searched per task
+
+    Returns
+    -------
+    int
+        number of positions in the book
+    """
+
+    positions = book_positions(plies, rows, columns, k)
+    keys = np.fromiter(positions.keys(), dtype=np.uint64,
+                       count=len(positions))
+    boards = np.stack(list(positions.values()))
+    chunks = [boards[i:i + chunk_size]
+              for i in range(0, boards.shape[0], chunk_size)]
+    arguments = (depth, k, heuristic_code, mode)
+    if workers > 1:
+        with ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = list(pool.map(search_positions, chunks,
+                                    *[[argument] * len(chunks)
+                                      for argument in arguments]))
+    else:
+        results = [search_positions(chunk, *arguments) for chunk in chunks]
+    data = np.concatenate(results)
+
+    order = np.argsort(keys, kind='stable')
+    header = np.array([BOOK_MAGIC, rows, columns, k], dtype=np.uint64)
+    with open(path, 'wb') as file:
+        np.concatenate((header, keys[order], data[order])).tofile(file)
+    _books.pop(path, None)
+    return len(positions)
+
+
+def main():
+    """
+    Builds a book from the command line arguments.
+    """
+    parser = argparse.ArgumentParser(description='Builds the opening book.')
+    parser.add_argument('--plies', type=int, default=8,
+                        help='maximal number of pieces of the positions')
+    parser.add_argument('--depth', type=int, default=12,
+                        help='search depth')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of worker processes')
+    parser.add_argument('--output', default=OPENING_BOOK,
+                        help='path of the book file')
+    arguments = parser.parse_args()
+    size = build_book(arguments.output, arguments.plies, arguments.depth,
+                      arguments.workers)
+    print(f'{size} positions written to {arguments.output}')
+
+
+if __name__ == '__main__':
+    main()
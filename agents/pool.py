@@ -0,0 +1,50 @@
+"""
+Persistent process pools of the agents. Every agent (or search) gets its
+own concurrent.futures process pool under a name, started with the spawn
+context on the first call, initialized by the initializer of the agent
+and kept alive for the following moves, so that the workers keep their
+compiled kernels and their state (tables, trees) between moves. The
+pools of different agents do not affect each other.
+"""
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Callable, Tuple, Dict
+
+# pools and their numbers of workers per name
+_pools: Dict[str, Tuple[ProcessPoolExecutor, int]] = {}
+
+
+def get_pool(name: str,
+             workers: int,
+             initializer: Optional[Callable] = None,
+             initargs: tuple = ()) -> ProcessPoolExecutor:
+    """
+    Returns the pool of name with the given number of workers, which is
+    started on the first call (and restarted if the number of workers
+    changes) with initializer(*initargs) run in every worker.
+    """
+    pool, pool_workers = _pools.get(name, (None, 0))
+    if pool is not None and pool_workers != workers:
+        shutdown_pool(name)
+        pool = None
+    if pool is None:
+        pool = ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=initializer, initargs=initargs)
+        _pools[name] = (pool, workers)
+    return pool
+
+
+def shutdown_pool(name: Optional[str] = None):
+    """
+    Stops the workers of the pool of name, of all pools if name is None.
+    """
+    names = list(_pools) if name is None else [name]
+    for name in names:
+        pool, _ = _pools.pop(name, (None, 0))
+        if pool is not None:
+            pool.shutdown()
+
+
+atexit.register(shutdown_pool)
@@ -1,9 +1,7 @@
 import numpy as np
 from typing import Optional, Callable
-from agents.common import PlayerAction, BoardPiece, SavedState, GenMove
-# from agents.agent_random import generate_move_random
-# from agents.agent_minimax import generate_move
-from agents.agent_montecarlo import generate_move
+from agents.common import PlayerAction, BoardPiece, SavedState, GenMove, \
+    get_legal_moves
 
 
 def user_move(board: np.ndarray,
@@ -11,12 +9,13 @@ def user_move(board: np.ndarray,
               saved_state: Optional[SavedState]) -> (PlayerAction,
                                                      Optional[SavedState]):
     """
-    Asks user which column should be played and returns the action
+    Asks user which column should be played until a legal move (a column
+    that is not full) is entered and returns the action
 
     return: PlayerAction, Optional[SavedState]
     """
     action = PlayerAction(-1)
-    while not 0 <= action < board.shape[1]:
+    while action not in get_legal_moves(board):
         try:
             action = PlayerAction(input("Column? "))
 
@@ -33,21 +32,23 @@ def human_vs_agent(generate_move_1: GenMove,
                    args_1: tuple = (),
                    args_2: tuple = (),
                    init_1: Callable = lambda board, player: None,
-                   init_2: Callable = lambda board, player: None,) -> None:
+                   init_2: Callable = lambda board, player: None,
+                   rows: int = 6,
+                   columns: int = 7,
+                   k: int = 4) -> None:
 
     import time
     from agents.common import PLAYER1, PLAYER2, PLAYER1_PRINT, PLAYER2_PRINT, \
         GameState
-    from agents.common import initialize_game_state, pretty_print_board, \
-        apply_player_action, check_end_state
+    from agents.common import initialize_game_state, Board
 
     players = (PLAYER1, PLAYER2)
     for play_first in (1, -1):
         for init, player in zip((init_1, init_2)[::play_first], players):
-            init(initialize_game_state(), player)
+            init(initialize_game_state(rows, columns), player)
 
         saved_state = {PLAYER1: None, PLAYER2: None}
-        board = initialize_game_state()
+        board = Board(initialize_game_state(rows, columns), k)
         gen_moves = (generate_move_1, generate_move_2)[::play_first]
         player_names = (player_1, player_2)[::play_first]
         gen_args = (args_1, args_2)[::play_first]
@@ -58,19 +59,19 @@ def human_vs_agent(generate_move_1: GenMove,
                 players, player_names, gen_moves, gen_args,
             ):
                 t0 = time.time()
-                print(pretty_print_board(board))
+                print(board)
                 print(
                     f'{player_name} you are playing with '
                     f'{PLAYER1_PRINT if player == PLAYER1 else PLAYER2_PRINT}'
                 )
                 action, saved_state[player] = gen_move(
-                    board.copy(), player, saved_state, *args
+                    board.array.copy(), player, saved_state, *args
                 )
                 print(f"Move time: {time.time() - t0:.3f}s")
-                apply_player_action(board, action, player)
-                end_state = check_end_state(board, player, action)
+                board.apply_player_action(action, player)
+                end_state = board.check_end_state()
                 if end_state != GameState.STILL_PLAYING:
-                    print(pretty_print_board(board))
+                    print(board)
                     if end_state == GameState.IS_DRAW:
                         print("Game ended in draw")
                     else:
@@ -81,13 +82,20 @@ def human_vs_agent(generate_move_1: GenMove,
                     break
 
         saved_state = {PLAYER1: None, PLAYER2: None}
-        board = initialize_game_state()
+        board = Board(initialize_game_state(rows, columns), k)
         gen_moves = (generate_move_1, generate_move_2)[::play_first]
         player_names = (player_1, player_2)[::play_first]
         gen_args = (args_1, args_2)[::play_first]
 
 
 if __name__ == "__main__":
+    # only the agents that play are imported, their numba kernels are
+    # compiled (or loaded from the cache) before the first move
+    # from agents.agent_random import generate_move_random
+    # from agents.agent_minimax import generate_move, warmup
+    from agents.agent_montecarlo import generate_move, warmup
+    warmup()
+
     # human vs human
     # human_vs_agent(user_move)
 
@@ -0,0 +1,16 @@
+def test_benchmark():
+    """
+    Test that the benchmark runs every mode on every position and that all
+    modes find the same outcomes.
+    """
+    import numpy as np
+    from agents.agent_minimax.benchmark import benchmark, outcome, POSITIONS
+
+    results = benchmark(depth=3, positions=POSITIONS[:4])
+    assert list(results) == ['minimax', 'alphabeta', 'pvs', 'mtdf']
+    reference = outcome(results['minimax']['scores'])
+    for result in results.values():
+        assert len(result['scores']) == 4
+        assert result['nodes'] > 0
+        assert np.array_equal(outcome(result['scores']), reference)
+    assert outcome([30000, -20000, 9999]).tolist() == [10000, -10000, 9999]
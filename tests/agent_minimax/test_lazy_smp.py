@@ -0,0 +1,42 @@
+from agents.common import PLAYER1, initialize_game_state
+
+
+def test_lazy_smp_search():
+    """
+    Test that the workers of the lazy SMP search share one table, find the
+    score of the sequential search and report their statistics, and that
+    generate_move runs it.
+    """
+    from agents.agent_minimax.minimax import generate_move, \
+        negamax_search, MinimaxState
+    from agents.agent_minimax.lazy_smp import lazy_smp_search
+    from agents.agent_minimax.parallel import shutdown_pool
+    from agents.agent_minimax.transposition_table import \
+        SharedTranspositionTable
+
+    board = initialize_game_state()
+    board[0, 3] = PLAYER1
+    try:
+        state = MinimaxState(2**16)
+        score, column, depth = lazy_smp_search(board, PLAYER1, state,
+                                               max_depth=7, workers=2)
+        assert isinstance(state.tt, SharedTranspositionTable)
+        assert depth == 7
+        assert score == negamax_search(board, PLAYER1, MinimaxState(2**16),
+                                       max_depth=7)[0]
+
+        assert [result['seed'] for result in state.worker_statistics] \
+            == [None, 1]
+        for result in state.worker_statistics:
+            assert result['depth'] == 7
+            assert result['nodes_per_second'] > 0
+        assert state.nodes == sum(result['nodes']
+                                  for result in state.worker_statistics)
+        assert 0 < state.tt.hit_rate < 1
+
+        action, state = generate_move(board, PLAYER1, state, timeout=0.3,
+                                      workers=2, parallel='lazy_smp')
+        assert 0 <= action < board.shape[1]
+        assert len(state.worker_statistics) == 2
+    finally:
+        shutdown_pool()
@@ -57,9 +57,12 @@ def test_max_player_move():
     alpha = -99999
     beta = 99999
     player = PLAYER1
+    board_copy = board.copy()
     score, ret = max_player_move(board, player, 5, alpha, beta)
     print(score, ret)
     assert ret == 1 or ret == 4
+    # moves are made in place and taken back
+    assert np.all(board == board_copy)
 
     # assert if max agent plays 1 to prevent win of min agent in next move
     board = TestBoards.board_minimax_2
@@ -153,3 +156,381 @@ def test_heuristic():
     ret = heuristic(board, PLAYER2, MIN, 0)
     print('last_action: ', 0, 'min', ret)
     assert ret == 0
+
+
+def test_generate_move_connect_k():
+    """
+    Test generate_move on a 7x6 board with five in a row: the agent has to
+    complete its own five and has to block the five of the opponent.
+    """
+    from agents.agent_minimax.minimax import generate_move
+
+    board = initialize_game_state(7, 6)
+    board[0, 0:4] = PLAYER1
+    board[1, 0:3] = PLAYER2
+    ret, _ = generate_move(board, PLAYER1, None, 5)
+    assert ret == 4
+    ret, _ = generate_move(board, PLAYER2, None, 5)
+    assert ret == 4
+
+
+def test_heuristic_windows():
+    """
+    Test heuristic_windows for an example board, a won board and as
+    heuristic of generate_move.
+    """
+    from agents.agent_minimax.minimax import MAX, MIN, heuristic_windows, \
+        generate_move
+    from tests.test_boards import TestBoards
+
+    board = TestBoards.board_heuristic_1
+    print(TestBoards.heuristic_1)
+    # PLAYER1 has two windows with three pieces and no opponent piece,
+    # PLAYER2 none, both have three windows with two pieces
+    assert heuristic_windows(board, PLAYER1, MAX) == 200
+    assert heuristic_windows(board, PLAYER1, MIN) == -200
+    assert heuristic_windows(board, PLAYER2, MAX) == -200
+
+    board = initialize_game_state()
+    board[0, 0:4] = PLAYER2
+    assert heuristic_windows(board, PLAYER2, MAX) == 9999
+
+    board = TestBoards.board_minimax_2
+    ret, _ = generate_move(board, PLAYER1, None,
+                           heuristic_function=heuristic_windows)
+    assert ret == 1
+
+
+def test_transposition_table():
+    """
+    Test that the search with transposition table finds the scores of the
+    search without it, that generate_move returns the state with the
+    table and that the table is reused by the next call.
+    """
+    from agents.agent_minimax.minimax import generate_move, \
+        max_player_move, MinimaxState, WINDOWS_HEURISTIC
+    from agents.common import column_heights, make_move, change_player
+
+    rng = np.random.default_rng(0)
+    for _ in range(10):
+        board = initialize_game_state()
+        heights = column_heights(board)
+        player = PLAYER1
+        for _ in range(rng.integers(4, 16)):
+            columns = np.flatnonzero(heights < board.shape[0])
+            make_move(board, heights, rng.choice(columns), player)
+            player = change_player(player)
+
+        score, _ = max_player_move(board.copy(), player, 5, -99999, 99999)
+        state = MinimaxState(2**12)
+        state.prepare(board, player, 4, None)
+        tt_score, _ = max_player_move(board.copy(), player, 5, -99999,
+                                      99999, state=state)
+        assert tt_score == score
+
+    board = initialize_game_state()
+    _, state = generate_move(board, PLAYER1, {PLAYER1: None}, timeout=None,
+                             depth=5)
+    assert isinstance(state, MinimaxState)
+    assert state.tt.hit_rate > 0
+    probes = state.tt.statistics()['probes']
+    _, state_2 = generate_move(board, PLAYER1, {PLAYER1: state},
+                               timeout=None, depth=5)
+    assert state_2 is state
+    assert state.tt.statistics()['probes'] > probes
+    # scores of max_player_move belong to the player, negamax scores to
+    # the player to move
+    probes = state.tt.statistics()['probes']
+    state.prepare(board, PLAYER2, 4, WINDOWS_HEURISTIC, 'negamax')
+    assert state.tt.statistics()['probes'] == probes
+    state.prepare(board, PLAYER1, 4, None)
+    assert state.tt.statistics()['probes'] == 0
+    state.tt.probe(np.uint64(1))
+    state.prepare(board, PLAYER2, 4, None)
+    assert state.tt.statistics()['probes'] == 0
+
+
+def test_iterative_deepening():
+    """
+    Test that iterative deepening returns the result of the deepest
+    completed search within the node and time limits, stops at the
+    maximal depth and at a win, and that generate_move keeps its time
+    limit.
+    """
+    import time
+    from agents.agent_minimax.minimax import generate_move, \
+        iterative_deepening, max_player_move, MinimaxState
+
+    board = initialize_game_state()
+    state = MinimaxState(2**16)
+    score, column, depth = iterative_deepening(board, PLAYER1, state,
+                                               max_depth=4)
+    assert depth == 4
+    assert score == max_player_move(board.copy(), PLAYER1, 4, -99999,
+                                    99999)[0]
+    assert (board == initialize_game_state()).all()
+
+    state = MinimaxState(2**16)
+    _, _, depth = iterative_deepening(board, PLAYER1, state, node_limit=2000)
+    assert 1 <= depth < 42
+    assert state.nodes == 2001
+    assert state.node_limit is None
+
+    # win in the next move is found at depth 1
+    board[0, :3] = PLAYER2
+    score, column, depth = iterative_deepening(board, PLAYER2,
+                                               MinimaxState(2**16))
+    assert (score, column, depth) == (10000, 3, 1)
+
+    board = initialize_game_state()
+    t0 = time.perf_counter()
+    action, state = generate_move(board, PLAYER1, None, timeout=0.3)
+    assert time.perf_counter() - t0 < 0.6
+    assert state.depth >= 1
+    assert 0 <= action < board.shape[1]
+
+
+def test_move_ordering():
+    """
+    Test that the search with move ordering finds the scores of the search
+    without it, with fewer nodes.
+    """
+    from agents.agent_minimax.minimax import iterative_deepening, \
+        MinimaxState
+    from agents.agent_minimax.move_ordering import MoveOrdering
+    from agents.common import column_heights, make_move, change_player
+
+    rng = np.random.default_rng(3)
+    nodes = np.zeros(2, dtype=int)
+    for _ in range(5):
+        board = initialize_game_state()
+        heights = column_heights(board)
+        player = PLAYER1
+        for _ in range(rng.integers(2, 12)):
+            columns = np.flatnonzero(heights < board.shape[0])
+            make_move(board, heights, rng.choice(columns), player)
+            player = change_player(player)
+
+        scores = []
+        for i, ordering in enumerate([
+            MoveOrdering(hash_move=False, center=False, killers=False,
+                         history=False),
+            MoveOrdering(),
+        ]):
+            state = MinimaxState(2**16, ordering)
+            score, _, _ = iterative_deepening(board, player, state,
+                                              max_depth=5)
+            scores.append(score)
+            nodes[i] += state.nodes
+        assert scores[0] == scores[1]
+    assert nodes[1] < nodes[0]
+    assert state.ordering.first_move_cutoff_rate > 0.5
+
+
+def test_negamax_search():
+    """
+    Test that the compiled negamax search finds the scores and moves of
+    max_player_move with the same number of nodes, for both compiled
+    heuristics and another k, and that it keeps node and time limits.
+    """
+    import time
+    from agents.agent_minimax.minimax import negamax_search, \
+        iterative_deepening, MinimaxState, heuristic, heuristic_windows, \
+        COMPILED_HEURISTICS, WINDOWS_HEURISTIC
+    from agents.common import column_heights, make_move, change_player
+
+    assert COMPILED_HEURISTICS[None] == WINDOWS_HEURISTIC
+    rng = np.random.default_rng(5)
+    for shape, k, heuristic_function in [((6, 7), 4, heuristic),
+                                         ((6, 7), 4, heuristic_windows),
+                                         ((7, 8), 5, heuristic),
+                                         ((7, 8), 5, heuristic_windows)]:
+        for _ in range(3):
+            board = initialize_game_state(*shape)
+            heights = column_heights(board)
+            player = PLAYER1
+            for _ in range(rng.integers(2, 20)):
+                columns = np.flatnonzero(heights < shape[0])
+                make_move(board, heights, rng.choice(columns), player)
+                player = change_player(player)
+            copy = board.copy()
+
+            state = MinimaxState(2**16)
+            result = negamax_search(
+                board, player, state, max_depth=5, k=k,
+                heuristic_code=COMPILED_HEURISTICS[heuristic_function])
+            state_python = MinimaxState(2**16)
+            assert result == iterative_deepening(
+                board, player, state_python, max_depth=5, k=k,
+                heuristic_function=heuristic_function)
+            assert state.nodes == state_python.nodes
+            assert (board == copy).all()
+
+    board = initialize_game_state()
+    state = MinimaxState(2**16)
+    _, column, depth = negamax_search(board, PLAYER1, state, node_limit=5000)
+    assert 0 <= column < board.shape[1]
+    assert state.nodes <= 5001
+    assert depth >= 1
+
+    t0 = time.perf_counter()
+    _, _, depth = negamax_search(board, PLAYER1, state, timeout=0.2)
+    assert time.perf_counter() - t0 < 0.4
+    assert depth > 5
+
+
+def test_pruned_moves():
+    """
+    Test that the threats of the opponent leave only the blocking move, lose
+    with two of them and prune the moves below them, in max_player_move
+    and the compiled search, which score the lost position like a search
+    of all moves, and that a state can turn the pruning off.
+    """
+    from agents.agent_minimax.minimax import pruned_moves, pruned_columns, \
+        max_player_move, negamax_search, MinimaxState, LAST_MOVE_HEURISTIC, \
+        WINDOWS_HEURISTIC
+    from agents.common import moves_to_board, column_heights, line_table, \
+        window_state
+
+    forced = moves_to_board('17273')
+    double = moves_to_board('27374')
+    below = initialize_game_state()
+    below[0, :3] = PLAYER2, PLAYER2, PLAYER1
+    below[1, :3] = PLAYER1
+    every = 2**7 - 1
+    lines, cell_lines = line_table()
+    for board, skip, lost in [(forced, every & ~(1 << 3), -1),
+                              (double, every, 0),
+                              (below, 1 << 3, -1)]:
+        heights = column_heights(board)
+        copy = board.copy()
+        assert pruned_moves(board, heights, PLAYER2) == (skip, lost)
+        for track in (False, True):
+            windows, _ = window_state(board, lines)
+            assert pruned_columns(board, heights, PLAYER2, 4, lines,
+                                  cell_lines, windows, track) == (skip, lost)
+        assert (board == copy).all()
+
+    score, column = max_player_move(forced.copy(), PLAYER2, 3, -99999, 99999)
+    assert column == 3 and abs(score) < 10000
+    assert max_player_move(double.copy(), PLAYER2, 3, -99999, 99999) \
+        == (-20000, 0)
+    for heuristic_code in (LAST_MOVE_HEURISTIC, WINDOWS_HEURISTIC):
+        state = MinimaxState(2**16)
+        assert negamax_search(double, PLAYER2, state, max_depth=3,
+                              heuristic_code=heuristic_code) == (-10000, 0, 1)
+        assert state.nodes == 1
+
+    for board in (forced, double):
+        scores, nodes = [], []
+        for use_pruning in (True, False):
+            state = MinimaxState(2**10, use_table=False,
+                                 use_pruning=use_pruning)
+            state.prepare(board, PLAYER2, 4, None)
+            scores.append(max_player_move(board.copy(), PLAYER2, 3, -99999,
+                                          99999, state=state)[0])
+            nodes.append(state.nodes)
+        assert scores[0] == scores[1]
+        assert nodes[0] < nodes[1]
+
+
+def test_search_modes():
+    """
+    Test that principal variation search and MTD(f) find the scores of the
+    alpha-beta search, and that generate_move accepts the modes.
+    """
+    import pytest
+    from agents.agent_minimax.minimax import generate_move, \
+        negamax_search, MinimaxState, SEARCH_MODES
+    from agents.common import column_heights, make_move, change_player
+
+    rng = np.random.default_rng(7)
+    for _ in range(10):
+        board = initialize_game_state()
+        heights = column_heights(board)
+        player = PLAYER1
+        for _ in range(rng.integers(2, 20)):
+            columns = np.flatnonzero(heights < board.shape[0])
+            make_move(board, heights, rng.choice(columns), player)
+            player = change_player(player)
+
+        scores = set()
+        for mode in SEARCH_MODES:
+            score, column, _ = negamax_search(board, player,
+                                              MinimaxState(2**16),
+                                              max_depth=6, mode=mode)
+            assert heights[column] < board.shape[0]
+            scores.add(score)
+        assert len(scores) == 1
+
+    board = initialize_game_state()
+    for mode in SEARCH_MODES:
+        action, _ = generate_move(board, PLAYER1, None, timeout=0.1,
+                                  mode=mode)
+        assert 0 <= action < board.shape[1]
+    with pytest.raises(ValueError):
+        generate_move(board, PLAYER1, None, mode='minimax')
+
+
+def test_generate_move_cached(tmp_path):
+    """
+    Test that generate_move and the endgame solver run in a new process
+    both when they compile the kernels into an empty numba cache and when
+    they load them from it.
+    """
+    import os
+    import subprocess
+    import sys
+
+    script = (
+        'from agents.common import initialize_game_state, PLAYER1, PLAYER2\n'
+        'from agents.agent_minimax.minimax import generate_move\n'
+        'from agents.agent_minimax.solver import EndgameSolver\n'
+        'EndgameSolver(2**10).solve(initialize_game_state(4, 4), PLAYER1)\n'
+        'board = initialize_game_state()\n'
+        'board[0, 3] = PLAYER1\n'
+        'print(generate_move(board, PLAYER2, None, depth=4, book=None,\n'
+        '                    timeout=0.2)[0])\n')
+    root = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    env = dict(os.environ, NUMBA_CACHE_DIR=str(tmp_path),
+               PYTHONPATH=root)
+    for _ in range(2):
+        result = subprocess.run([sys.executable, '-c', script], env=env,
+                                cwd=root, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+        assert 0 <= int(result.stdout) < 7
+
+
+def test_generate_move_first_move():
+    """
+    Test that the first move of a new process stays within its time limit
+    after warmup (as main.py calls it), and that without warmup the
+    compilation of the kernels does not take the time of the search.
+    """
+    import os
+    import subprocess
+    import sys
+
+    script = (
+        'import sys, time\n'
+        'from agents.common import initialize_game_state, PLAYER1\n'
+        'from agents.agent_minimax import generate_move, warmup\n'
+        'if sys.argv[1] == "warmup":\n'
+        '    warmup()\n'
+        't0 = time.perf_counter()\n'
+        '_, state = generate_move(initialize_game_state(), PLAYER1, None,\n'
+        '                         book=None, timeout=0.5)\n'
+        'print(time.perf_counter() - t0, state.depth)\n')
+    root = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    env = dict(os.environ, PYTHONPATH=root)
+    for argument in ('warmup', 'none'):
+        result = subprocess.run([sys.executable, '-c', script, argument],
+                                env=env, cwd=root, capture_output=True,
+                                text=True)
+        assert result.returncode == 0, result.stderr
+        seconds, depth = result.stdout.split()
+        if argument == 'warmup':
+            assert float(seconds) < 0.8
+        assert int(depth) > 4
@@ -0,0 +1,84 @@
+import numpy as np
+
+from agents.common import PLAYER1, PLAYER2
+
+
+def test_center_out():
+    """
+    Test static order of the columns from the center out.
+    """
+    from agents.agent_minimax.move_ordering import center_out
+
+    assert center_out(7) == [3, 2, 4, 1, 5, 0, 6]
+    assert center_out(4) == [1, 2, 0, 3]
+    assert center_out(1) == [0]
+
+
+def test_order():
+    """
+    Test that hash move, killer moves and history come first in this order,
+    that full columns are left out and that every part can be switched off.
+    """
+    from agents.agent_minimax.move_ordering import MoveOrdering
+
+    heights = np.array([0, 0, 0, 0, 0, 6, 0], dtype=np.int8)
+    ordering = MoveOrdering()
+    assert ordering.order(heights, 6, PLAYER1, 0, -1) == [3, 2, 4, 1, 0, 6]
+    assert ordering.order(heights, 6, PLAYER1, 0, 5) == [3, 2, 4, 1, 0, 6]
+
+    ordering.cutoff(PLAYER1, 0, 6, 2, 3)
+    ordering.cutoff(PLAYER1, 0, 0, 2, 1)
+    assert ordering.order(heights, 6, PLAYER1, 2, 1) == [1, 0, 6, 3, 2, 4]
+    # history of the other ply and player
+    assert ordering.order(heights, 6, PLAYER1, 1, -1) == [6, 0, 3, 2, 4, 1]
+    assert ordering.order(heights, 6, PLAYER2, 1, -1) == [3, 2, 4, 1, 0, 6]
+    # history is kept per cell
+    heights[6] = 1
+    assert ordering.order(heights, 6, PLAYER1, 1, -1) == [0, 3, 2, 4, 1, 6]
+
+    ordering = MoveOrdering(hash_move=False, center=False, killers=False,
+                            history=False)
+    ordering.cutoff(PLAYER1, 0, 6, 0, 3)
+    assert ordering.order(heights, 6, PLAYER1, 0, 4) == [0, 1, 2, 3, 4, 6]
+
+
+def test_killers_history():
+    """
+    Test that the last two cutoff moves of a ply are kept, that history is
+    halved and killers removed for a new move and statistics.
+    """
+    from agents.agent_minimax.move_ordering import MoveOrdering
+
+    ordering = MoveOrdering()
+    for column in (1, 2, 2, 3):
+        ordering.cutoff(PLAYER2, 0, column, 5, 2)
+    assert list(ordering.killers[5]) == [3, 2]
+    assert ordering.history[PLAYER2, 0, 2] == 8
+
+    ordering.new_move()
+    assert (ordering.killers == -1).all()
+    assert ordering.history[PLAYER2, 0, 2] == 4
+
+    ordering.searched(0, False)
+    ordering.searched(3, False)
+    ordering.searched(1, True)
+    ordering.searched(4, True)
+    assert ordering.statistics() == {'nodes': 3, 'cutoffs': 2,
+                                     'first_move_cutoffs': 1,
+                                     'first_move_cutoff_rate': 0.5}
+    ordering.clear()
+    assert ordering.statistics()['nodes'] == 0
+    assert ordering.history.sum() == 0
+
+
+def test_seed():
+    """
+    Test that a seed perturbs the static order reproducibly.
+    """
+    from agents.agent_minimax.move_ordering import MoveOrdering
+
+    orders = [MoveOrdering(seed=seed).static_order for seed in range(8)]
+    for order in orders:
+        assert sorted(order) == list(range(7))
+    assert len({tuple(order) for order in orders}) > 1
+    assert MoveOrdering(seed=3).static_order == orders[3]
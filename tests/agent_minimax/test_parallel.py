@@ -0,0 +1,47 @@
+import numpy as np
+
+from agents.common import PLAYER1, initialize_game_state
+
+
+def test_parallel_search():
+    """
+    Test that the parallel root search finds the scores of the sequential
+    search, that its move reaches that score and that the pool is kept
+    between the moves.
+    """
+    from agents.agent_minimax.minimax import generate_move, \
+        negamax_search, MinimaxState
+    from agents.agent_minimax.parallel import parallel_search, get_pool, \
+        shutdown_pool
+    from agents.common import column_heights, make_move, change_player
+
+    rng = np.random.default_rng(11)
+    try:
+        pool, _ = get_pool(2)
+        for _ in range(4):
+            board = initialize_game_state()
+            heights = column_heights(board)
+            player = PLAYER1
+            for _ in range(rng.integers(2, 12)):
+                columns = np.flatnonzero(heights < board.shape[0])
+                make_move(board, heights, rng.choice(columns), player)
+                player = change_player(player)
+
+            score, column, depth = parallel_search(
+                board, player, MinimaxState(2**16), max_depth=7, workers=2)
+            assert depth == 7 or abs(score) >= 10000
+            assert score == negamax_search(board, player, MinimaxState(2**16),
+                                           max_depth=depth)[0]
+            if abs(score) < 10000:
+                make_move(board, heights, column, player)
+                child_score, _, _ = negamax_search(
+                    board, change_player(player), MinimaxState(2**16),
+                    max_depth=depth - 1)
+                assert -child_score == score
+
+        action, _ = generate_move(initialize_game_state(), PLAYER1, None,
+                                  timeout=0.5, workers=2)
+        assert 0 <= action < 7
+        assert get_pool(2)[0] is pool
+    finally:
+        shutdown_pool()
@@ -0,0 +1,122 @@
+import numpy as np
+from agents.common import PLAYER1, PLAYER2, initialize_game_state, \
+    moves_to_board, column_heights, make_move, unmake_move, \
+    connected_k_cell
+
+
+def exact_score(board, player, k, moves):
+    """
+    Score of the position (see agents.agent_minimax.solver) by plain
+    negamax over the whole game tree.
+    """
+    rows, columns = board.shape
+    if moves == rows * columns:
+        return 0
+    heights = column_heights(board)
+    best = -rows * columns
+    for column in range(columns):
+        if heights[column] < rows:
+            row = make_move(board, heights, column, player)
+            if connected_k_cell(board, player, row, column, k):
+                score = (rows * columns + 1 - moves) // 2
+            else:
+                score = -exact_score(board, 3 - player, k, moves + 1)
+            unmake_move(board, heights, column)
+            best = max(best, score)
+    return best
+
+
+def test_solve():
+    """
+    Test that the solver finds the exact score of small boards and of
+    random positions near the end of the game, and a move that keeps it.
+    """
+    from agents.agent_minimax.solver import EndgameSolver
+
+    assert EndgameSolver().solve(initialize_game_state(3, 4), PLAYER1,
+                                 3)[0] == exact_score(
+        initialize_game_state(3, 4), PLAYER1, 3, 0)
+
+    rng = np.random.default_rng(0)
+    solved = 0
+    for shape, k, moves in [((4, 5), 4, 11), ((6, 7), 4, 32)]:
+        while solved < 10:
+            board = initialize_game_state(*shape)
+            heights = column_heights(board)
+            player = PLAYER1
+            for _ in range(moves):
+                column = rng.choice(np.flatnonzero(heights < shape[0]))
+                row = make_move(board, heights, column, player)
+                if connected_k_cell(board, player, row, column, k):
+                    break
+                player = 3 - player
+            else:
+                score, column, _ = EndgameSolver(2**10).solve(board, player,
+                                                              k)
+                assert score == exact_score(board, player, k, moves)
+                row = make_move(board, heights, column, player)
+                if not connected_k_cell(board, player, row, column, k):
+                    assert -exact_score(board, 3 - player, k,
+                                        moves + 1) == score
+                solved += 1
+        solved = 0
+
+
+def test_distance_to_end():
+    """
+    Test the score and distance of positions won immediately, lost after
+    the next move of the opponent, won after three plies and drawn.
+    """
+    from agents.agent_minimax.solver import EndgameSolver, distance_to_end
+
+    solver = EndgameSolver()
+    # PLAYER1 wins in column 0
+    assert solver.solve(moves_to_board('121212'), PLAYER1) \
+        == ((42 + 1 - 6) // 2, 0, 1)
+    # PLAYER2 cannot stop both ends of 3 in a row
+    score, _, distance = solver.solve(moves_to_board('3343'), PLAYER1)
+    assert score > 0 and distance == 3
+    score, _, distance = solver.solve(moves_to_board('33435'), PLAYER2)
+    assert score < 0 and distance == 2
+    assert distance_to_end(0, 30, 42) == 12
+
+
+def test_solver_cache():
+    """
+    Test that the results of solved positions are kept and cleared when the
+    board shape changes.
+    """
+    from agents.agent_minimax.solver import EndgameSolver
+
+    solver = EndgameSolver()
+    board = initialize_game_state(4, 4)
+    result = solver.solve(board, PLAYER1)
+    assert solver.nodes > 0
+    assert solver.solve(board, PLAYER1) == result
+    assert solver.nodes == 0
+    solver.solve(initialize_game_state(3, 4), PLAYER1, 3)
+    assert len(solver.results) == 1
+
+    try:
+        solver.solve(initialize_game_state(8, 8), PLAYER1)
+    except ValueError:
+        assert True
+    else:
+        assert False
+
+
+def test_generate_move_solver():
+    """
+    Test that generate_move solves positions with few empty cells with the
+    solver of the state, which it keeps, and searches the others.
+    """
+    from agents.agent_minimax.minimax import generate_move
+
+    board = moves_to_board('612226751134542256114374')
+    action, state = generate_move(board, PLAYER1, None, depth=2,
+                                  solve_below=20)
+    assert state.solver is not None
+    assert action == state.solver.solve(board, PLAYER1)[1]
+    action, state = generate_move(board, PLAYER1, None, depth=2,
+                                  solve_below=18)
+    assert state.solver is None
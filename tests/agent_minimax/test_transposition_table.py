@@ -0,0 +1,128 @@
+import numpy as np
+
+
+def test_pack_entry():
+    """
+    Test that pack_entry and unpack_entry are inverse for negative and
+    positive scores and unknown moves.
+    """
+    from agents.agent_minimax.transposition_table import pack_entry, \
+        unpack_entry, EXACT, LOWER, UPPER
+
+    for score, depth, flag, move in [(0, 1, EXACT, 3), (-70000, 7, LOWER, 0),
+                                     (9999, 255, UPPER, -1),
+                                     (-99999, 2, EXACT, 6)]:
+        data = pack_entry(score, depth, flag, move)
+        assert data != 0
+        assert unpack_entry(data) == (score, depth, flag, move)
+
+
+def test_probe_store():
+    """
+    Test that a stored entry is found by its key only and that the
+    statistics count probes and hits.
+    """
+    from agents.agent_minimax.transposition_table import \
+        TranspositionTable, LOWER
+
+    tt = TranspositionTable(1000)
+    assert len(tt) == 1024
+    key = np.uint64(0xDEADBEEF12345678)
+    assert not tt.probe(key)[0]
+
+    tt.store(key, -20, 5, LOWER, 2)
+    assert tt.probe(key) == (True, -20, 5, LOWER, 2)
+    # same slot, other key
+    assert not tt.probe(key ^ np.uint64(1 << 40))[0]
+
+    statistics = tt.statistics()
+    assert statistics['probes'] == 3
+    assert statistics['hits'] == 1
+    assert statistics['stores'] == 1
+    assert tt.hit_rate == 1 / 3
+
+    tt.clear()
+    assert not tt.probe(key)[0]
+    assert tt.statistics()['probes'] == 1
+
+
+def test_depth_preferred_replacement():
+    """
+    Test that the entry of another position in the same slot is only
+    replaced by a search that is at least as deep, while the entry of the
+    same position is always updated.
+    """
+    from agents.agent_minimax.transposition_table import \
+        TranspositionTable, EXACT, UPPER
+
+    tt = TranspositionTable(16)
+    key = np.uint64(5)
+    other = np.uint64(5 + 16)
+
+    tt.store(key, 10, 6, EXACT, 1)
+    tt.store(other, 20, 5, EXACT, 2)
+    assert tt.probe(key)[:3] == (True, 10, 6)
+    assert not tt.probe(other)[0]
+
+    tt.store(other, 30, 6, EXACT, 3)
+    assert tt.probe(other)[:3] == (True, 30, 6)
+    assert not tt.probe(key)[0]
+    assert tt.statistics()['replacements'] == 1
+
+    tt.store(other, 40, 2, UPPER, 4)
+    assert tt.probe(other) == (True, 40, 2, UPPER, 4)
+
+
+def test_xor_verification():
+    """
+    Test that a slot whose key word and data word do not belong together,
+    as after two processes wrote it at the same time, is not found.
+    """
+    from agents.agent_minimax.transposition_table import \
+        TranspositionTable, EXACT
+
+    tt = TranspositionTable(16)
+    key = np.uint64(7)
+    tt.store(key, 10, 3, EXACT, 1)
+    assert tt.keys[7] == key ^ tt.data[7]
+    tt.data[7] ^= np.uint64(1 << 33)
+    assert not tt.probe(key)[0]
+
+
+def test_shared_transposition_table():
+    """
+    Test that tables attached by name or unpickled see the entries of the
+    owner, that only the owner clears the entries and frees the memory.
+    """
+    import gc
+    import pickle
+    import pytest
+    from multiprocessing import shared_memory
+    from agents.agent_minimax.transposition_table import \
+        SharedTranspositionTable, LOWER
+
+    tt = SharedTranspositionTable(1000)
+    assert tt.owner and len(tt) == 1024
+    key = np.uint64(0xDEADBEEF12345678)
+    tt.store(key, -20, 5, LOWER, 2)
+
+    attached = SharedTranspositionTable(1000, tt.name)
+    copy = pickle.loads(pickle.dumps(tt))
+    assert not attached.owner and not copy.owner
+    assert attached.probe(key) == (True, -20, 5, LOWER, 2)
+    assert copy.probe(key) == (True, -20, 5, LOWER, 2)
+    assert tt.statistics()['probes'] == 0
+
+    attached.clear()
+    assert tt.probe(key)[0]
+    attached.store(key, 30, 6, LOWER, 3)
+    assert tt.probe(key)[1] == 30
+    tt.clear()
+    assert not copy.probe(key)[0]
+
+    name = tt.name
+    del attached, copy
+    tt.close()
+    gc.collect()
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
@@ -200,9 +200,13 @@ def test_generate_move():
     mcst, _, _ = tt.simulate_tree()
     saved_state = {PLAYER1: action_opponent, PLAYER2: mcst}
 
-    old_root = mcst.root
+    old_board = mcst.root.children[action_opponent].board
     action, new_mcts = generate_move(board, player, saved_state)
-    new_root = old_root.children[action_opponent].children[action]
+    # the pool was compacted to the node of the opponent's action
+    old_root = new_mcts.root.parent
+    assert old_root.index == 0 and old_root.parent is None
+    assert np.all(old_root.board == old_board)
+    new_root = old_root.children[action]
 
     assert new_mcts.root == new_root
     assert new_mcts.root.n_simulations == new_root.n_simulations
@@ -268,3 +272,49 @@ def test_generate_move_sampleboards():
     action, mcst = generate_move(board, player, saved_state)
     print(action)
     assert action == 1
+
+
+def test_simulate_connect_k():
+    """
+    Test simulate() and generate_move on an 8x7 board with five in a row.
+    """
+    from agents.agent_montecarlo import generate_move
+
+    board = initialize_game_state(8, 7)
+    mcst = MonteCarlo(board, PLAYER1, k=5)
+    ret = mcst.simulate(mcst.root)
+    assert ret in (PLAYER1, PLAYER2, None)
+
+    board[0, 1:5] = PLAYER2
+    board[1, 1:4] = PLAYER1
+    saved_state = {PLAYER1: None, PLAYER2: None}
+    action, mcst = generate_move(board, PLAYER2, saved_state, 5)
+    assert action in (0, 5)
+    assert mcst.root.k == 5
+
+
+def test_run_search_rollouts():
+    """
+    Test that with several rollouts per expanded node every iteration
+    counts that many simulations, and that generate_move still takes the
+    win.
+    """
+    from agents.agent_montecarlo import generate_move
+
+    mcst = MonteCarlo(initialize_game_state(), PLAYER1, rollouts=8)
+    assert mcst.rng_state.shape == (8,)
+    mcst.run_search(timeout=0.2)
+    root = mcst.root
+    assert root.n_simulations > 0 and root.n_simulations % 8 == 0
+    children = [child for child in root.children.values()
+                if child is not None]
+    assert sum(child.n_simulations for child in children) \
+        == root.n_simulations
+    for child in children:
+        assert child.n_wins <= child.n_simulations
+
+    saved_state = {PLAYER1: None, PLAYER2: None}
+    action, mcst = generate_move(TestBoards.board_mc1, PLAYER1, saved_state,
+                                 rollouts=16)
+    assert action == 3
+    assert mcst.rollouts == 16
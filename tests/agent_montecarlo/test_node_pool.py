@@ -0,0 +1,121 @@
+import numpy as np
+from agents.common import PLAYER1, PLAYER2, initialize_game_state, \
+    column_heights
+
+
+def test_expand():
+    """
+    Test that NodePool.expand creates the child of an action once in the
+    block of children of the node, with the won flag, that the board of a
+    node is replayed from its actions and that the arrays grow when the
+    slots run out.
+    """
+    from agents.agent_montecarlo.node_pool import NodePool, EXPANDED, WON
+
+    board = initialize_game_state()
+    board[0, :3] = PLAYER1
+    pool = NodePool(board, PLAYER1, capacity=4)
+    assert len(pool) == 1
+
+    child = pool.expand(0, 2)
+    assert pool.expand(0, 2) == child == pool.first_child[0] + 2
+    assert len(pool) == 8 and pool.capacity >= 8
+    assert pool.parent[child] == 0 and pool.action[child] == 2
+    assert pool.player[child] == PLAYER2
+    assert pool.flags[child] == EXPANDED
+    assert pool.board_of(child)[1, 2] == PLAYER1
+    assert (pool.board_of(0) == board).all()
+    assert pool.child(0, 2) == child and pool.child(0, 1) == -1
+
+    won = pool.expand(0, 3)
+    assert pool.flags[won] == EXPANDED | WON
+    assert pool.expand(won, 0) == -1
+    assert list(pool.unexpanded_actions(0)) == [0, 1, 4, 5, 6]
+    assert not pool.is_fully_expanded(0)
+
+    grandchild = pool.expand(child, 2)
+    expected = board.copy()
+    expected[1:3, 2] = PLAYER1, PLAYER2
+    assert (pool.board_of(grandchild) == expected).all()
+    heights = column_heights(expected)
+    assert list(pool.unexpanded_actions(grandchild, heights)) == list(range(7))
+    heights[2] = 6
+    assert 2 not in pool.valid_actions(grandchild, heights)
+    assert len(pool) == 15 and pool.capacity == 16
+    assert pool.nbytes == 16 * (4 + 4 + 4 + 4 + 1 + 1 + 1)
+
+
+def test_select_backpropagate():
+    """
+    Test that NodePool.select descends to the child with maximal UCB1 value
+    until a node is not fully expanded, and that backpropagate counts the
+    simulation in all ancestors and the win in those of the loser.
+    """
+    from agents.agent_montecarlo.node_pool import NodePool
+
+    pool = NodePool(initialize_game_state(), PLAYER1)
+    assert pool.select(0, np.sqrt(2)) == 0
+    children = [pool.expand(0, action) for action in range(7)]
+    assert pool.is_fully_expanded(0)
+
+    pool.visits[0] = 10
+    pool.visits[children] = 1
+    pool.wins[children[4]] = 1
+    board = initialize_game_state()
+    heights = column_heights(board)
+    assert pool.select(0, np.sqrt(2), board, heights) == children[4]
+    assert board[0, 4] == PLAYER1 and heights[4] == 1
+
+    grandchild = pool.expand(children[4], 4)
+    pool.backpropagate(grandchild, PLAYER2)
+    assert pool.visits[grandchild] == 1 and pool.wins[grandchild] == 1
+    assert pool.visits[children[4]] == 2 and pool.wins[children[4]] == 1
+    assert pool.visits[0] == 11 and pool.wins[0] == 0
+    pool.backpropagate(grandchild, None)
+    assert pool.visits[grandchild] == 2 and pool.wins[grandchild] == 1
+
+
+def test_compact():
+    """
+    Test that NodePool.compact moves the subtree of a node to the first
+    slots with its statistics, flags and boards and drops the rest of the
+    tree, and that MonteCarlo.run_search compacts the pool of a moved root.
+    """
+    from agents.agent_montecarlo.node_pool import NodePool, WON
+    from agents.agent_montecarlo.monte_carlo import MonteCarlo
+
+    board = initialize_game_state()
+    board[0, :3] = PLAYER1
+    pool = NodePool(board, PLAYER1)
+    pool.expand(0, 2)
+    child = pool.expand(0, 4)
+    grandchild = pool.expand(child, 5)
+    won = pool.expand(grandchild, 3)
+    leaf = pool.expand(grandchild, 6)
+    pool.backpropagate(leaf, PLAYER2)
+    boards = [pool.board_of(index) for index in (child, grandchild, leaf)]
+    assert len(pool) == 22
+
+    pool.compact(child)
+    assert len(pool) == 15
+    assert pool.parent[0] == -1 and pool.player[0] == PLAYER2
+    grandchild = pool.child(0, 5)
+    won = pool.child(grandchild, 3)
+    leaf = pool.child(grandchild, 6)
+    assert pool.child(0, 2) == -1 and pool.child(0, 4) == -1
+    assert pool.flags[won] & WON and pool.parent[won] == grandchild
+    assert pool.parent[leaf] == grandchild and pool.parent[grandchild] == 0
+    for index, expected in zip((0, grandchild, leaf), boards):
+        assert (pool.board_of(index) == expected).all()
+    assert pool.visits[0] == pool.visits[grandchild] == pool.visits[leaf] == 1
+    assert pool.wins[leaf] == 0 and pool.wins[grandchild] == 1
+
+    mcst = MonteCarlo(initialize_game_state(), PLAYER1)
+    mcst.run_search(timeout=0.1)
+    mcst.root = mcst.root.children[3].expand(3)
+    visits = mcst.root.n_simulations
+    mcst.run_search(timeout=0.1)
+    assert mcst.root.index == 0 and mcst.root.parent is None
+    assert mcst.root.n_simulations > visits
+    assert (mcst.root.board[:2, 3] == [PLAYER1, PLAYER2]).all()
+    assert len(mcst.root.pool) <= 1 + 7 * mcst.root.n_simulations
@@ -0,0 +1,87 @@
+import numpy as np
+from agents.common import NO_PLAYER, PLAYER1, PLAYER2, CONNECT_N, \
+    initialize_game_state, column_heights, line_table, connected_k_cell
+from tests.test_boards import TestBoards
+
+
+def test_random_below():
+    """
+    Test that random_below draws every integer in [0, n) about equally often
+    and that equal states give equal streams.
+    """
+    from agents.agent_montecarlo.rollout import random_below, rng_state
+
+    state = rng_state(1)
+    counts = np.bincount([random_below(state, 7) for _ in range(7000)],
+                         minlength=7)
+    assert counts.shape == (7,)
+    assert np.all(np.abs(counts - 1000) < 150)
+    assert [random_below(rng_state(2), 1000) for _ in range(3)] \
+        == [random_below(rng_state(2), 1000) for _ in range(3)]
+    assert not np.array_equal(rng_state(1), rng_state(2))
+
+
+def test_playout():
+    """
+    Test that playout plays a legal game to its end on the board and
+    returns its winner, the opponent if the last move won, and NO_PLAYER
+    for a drawn game, also for another board shape and k.
+    """
+    from agents.agent_montecarlo.rollout import playout, rng_state
+
+    state = rng_state(3)
+    for shape, k in [((6, 7), CONNECT_N), ((8, 7), 5)]:
+        lines, cell_lines = line_table(*shape, k)
+        for _ in range(20):
+            board = initialize_game_state(*shape)
+            heights = column_heights(board)
+            winner = playout(board, heights, PLAYER1, -1, k, lines,
+                             cell_lines, state)
+            assert (heights == column_heights(board)).all()
+            n_player1 = np.count_nonzero(board == PLAYER1)
+            n_player2 = np.count_nonzero(board == PLAYER2)
+            assert n_player1 - n_player2 in (0, 1)
+            if winner == NO_PLAYER:
+                assert (heights == shape[0]).all()
+            else:
+                assert winner == (PLAYER1 if n_player1 > n_player2
+                                  else PLAYER2)
+                won = [connected_k_cell(board, winner, heights[c] - 1, c, k)
+                       for c in range(shape[1]) if heights[c] > 0]
+                assert any(won)
+
+    lines, cell_lines = line_table()
+    board = TestBoards.board_win_player1.copy()
+    assert playout(board, column_heights(board), PLAYER2, -1, CONNECT_N,
+                   lines, cell_lines, state) == PLAYER1
+    board = TestBoards.board_drawn.copy()
+    assert playout(board, column_heights(board), PLAYER1, -1, CONNECT_N,
+                   lines, cell_lines, state) == NO_PLAYER
+    board = initialize_game_state()
+    board[0, :4] = PLAYER2
+    assert playout(board, column_heights(board), PLAYER1, 3, CONNECT_N,
+                   lines, cell_lines, state) == PLAYER2
+
+
+def test_playouts():
+    """
+    Test that playouts runs one playout per generator state, reproducibly,
+    without changing the board, and counts the outcomes.
+    """
+    from agents.agent_montecarlo.rollout import playouts, rng_state
+
+    lines, cell_lines = line_table()
+    board = initialize_game_state()
+    heights = column_heights(board)
+    outcomes = playouts(board, heights, PLAYER1, -1, CONNECT_N, lines,
+                        cell_lines, rng_state(4, 64))
+    assert outcomes.sum() == 64
+    assert outcomes[PLAYER1] > 0 and outcomes[PLAYER2] > 0
+    assert (outcomes == playouts(board, heights, PLAYER1, -1, CONNECT_N,
+                                 lines, cell_lines, rng_state(4, 64))).all()
+    assert (board == NO_PLAYER).all() and (heights == 0).all()
+
+    board = TestBoards.board_win_player1
+    outcomes = playouts(board, column_heights(board), PLAYER2, -1,
+                        CONNECT_N, lines, cell_lines, rng_state(5, 8))
+    assert list(outcomes) == [0, 8, 0]
@@ -0,0 +1,80 @@
+from agents.common import PLAYER1, PLAYER2, initialize_game_state
+from tests.test_boards import TestBoards
+
+
+def test_search_tree():
+    """
+    Test that a worker keeps its tree between searches and moves its root
+    along the moves played since, keeping the simulations below it, and
+    that it starts a new tree for a board that does not follow.
+    """
+    from agents.agent_montecarlo import parallel
+
+    board = initialize_game_state()
+    board[0, 3] = PLAYER1
+    result = parallel.search_tree('test', 0, 1, board, PLAYER2,
+                                  0.2, 4, 1, 1.4)
+    assert not result['reused']
+    assert result['seed'] == 0
+    assert result['simulations'].sum() == result['root_simulations'] > 0
+    assert (result['wins'] <= result['simulations']).all()
+    tree = parallel._worker_trees[('test', 0)]
+    child = tree.root.children[3].children[2]
+    simulations = 0 if child is None else child.n_simulations
+
+    board[1, 3] = PLAYER2
+    board[0, 2] = PLAYER1
+    result = parallel.search_tree('test', 0, 2, board, PLAYER2,
+                                  0.2, 4, 1, 1.4)
+    assert result['reused']
+    assert parallel._worker_trees[('test', 0)] is tree
+    # the pool was compacted to the subtree of the new root
+    assert tree.root.index == 0 and tree.root.parent is None
+    assert (tree.root.board == board).all()
+    assert result['root_simulations'] > simulations
+
+    # PLAYER1 is not to move, and a piece was taken back
+    assert not parallel.reroot(tree, board, PLAYER1)
+    board[0, 2] = PLAYER2
+    assert not parallel.reroot(tree, board, PLAYER2)
+    result = parallel.search_tree('test', 0, 3, board, PLAYER1,
+                                  0.1, 4, 1, 1.4)
+    assert not result['reused']
+    assert (parallel._worker_trees[('test', 0)].root.board == board).all()
+
+
+def test_parallel_monte_carlo():
+    """
+    Test that the root parallel search sums the statistics of the trees of
+    all workers, takes the win and that generate_move runs it and keeps it
+    for the next move.
+    """
+    from agents.agent_montecarlo import generate_move
+    from agents.agent_montecarlo.parallel import ParallelMonteCarlo
+    from agents.agent_montecarlo.parallel import pool_name
+    from agents.pool import shutdown_pool
+
+    try:
+        mcst = ParallelMonteCarlo(2, seed=1)
+        mcst.run_search(TestBoards.board_mc1, PLAYER1, timeout=0.5)
+        assert [result['seed'] for result in mcst.worker_statistics] \
+            == [1, 2]
+        assert (mcst.n_simulations == sum(
+            result['simulations'] for result in mcst.worker_statistics)).all()
+        assert mcst.best_action() == 3
+
+        saved_state = {PLAYER1: None, PLAYER2: None}
+        action, mcst = generate_move(TestBoards.board_mc1, PLAYER2,
+                                     saved_state, workers=2)
+        assert action == 3
+        assert isinstance(mcst, ParallelMonteCarlo)
+        saved_state[PLAYER2] = mcst
+        board = TestBoards.board_mc1.copy()
+        board[1, 0] = PLAYER1
+        board[0, 3] = PLAYER2
+        action, same = generate_move(board, PLAYER2, saved_state, workers=2)
+        assert same is mcst
+        assert 0 <= action < board.shape[1]
+        assert all(result['reused'] for result in mcst.worker_statistics)
+    finally:
+        shutdown_pool(pool_name(2))
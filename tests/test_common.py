@@ -1,5 +1,5 @@
 import numpy as np
-from agents.common import BoardPiece, NO_PLAYER, PLAYER1, \
+from agents.common import BoardPiece, NO_PLAYER, PLAYER1, GameState, \
     PLAYER2, PlayerAction
 from tests.test_boards import TestBoards
 
@@ -213,3 +213,590 @@ def test_legal_moves():
 
     # board = TestBoards.board_legal_moves
     # assert get_legal_moves(board) == np.delete(moves, 2)
+
+
+def test_bitboard_conversion():
+    """
+    Tests board_to_bitboard and bitboard_to_board by converting a random
+    board to a bitboard position and back, and by checking the column
+    heights of the position, also for a larger board, and that boards
+    larger than a bitboard are rejected.
+    """
+    import pytest
+    from agents.common import BitBoardPosition, initialize_game_state, \
+        apply_player_action, pretty_print_board, board_to_bitboard
+
+    board = initialize_game_state()
+    player = PLAYER1
+    for action in np.random.randint(0, 7, size=20):
+        if board[-1, action] == NO_PLAYER:
+            apply_player_action(board, PlayerAction(action), player)
+            player = PLAYER2 if player == PLAYER1 else PLAYER1
+
+    position = BitBoardPosition.from_board(board)
+    assert np.all(position.to_board() == board)
+    assert np.all(position.heights == np.sum(board != NO_PLAYER, axis=0))
+    assert str(position) == pretty_print_board(board)
+    position = BitBoardPosition.from_string(pretty_print_board(board))
+    assert np.all(position.to_board() == board)
+
+    heights = np.random.randint(0, 8, size=8)
+    board = np.random.choice([PLAYER1, PLAYER2], (7, 8)).astype(BoardPiece)
+    board[np.arange(7)[:, np.newaxis] >= heights] = NO_PLAYER
+    position = BitBoardPosition.from_board(board)
+    assert np.all(position.to_board() == board)
+    assert np.all(position.heights == np.sum(board != NO_PLAYER, axis=0))
+    with pytest.raises(ValueError):
+        board_to_bitboard(initialize_game_state(8, 8))
+
+
+def test_bitboard_make_move():
+    """
+    Tests make_move, valid_action and legal_mask of BitBoardPosition by
+    comparing them to apply_player_action and valid_action for a column
+    that is filled up.
+    """
+    from agents.common import BitBoardPosition, initialize_game_state, \
+        apply_player_action, valid_action
+
+    board = initialize_game_state()
+    position = BitBoardPosition()
+    action = PlayerAction(3)
+    for i in range(6):
+        player = PLAYER1 if i % 2 == 0 else PLAYER2
+        apply_player_action(board, action, player)
+        position.make_move(action, player)
+        assert np.all(position.to_board() == board)
+        assert np.all(position.valid_action() == valid_action(board))
+
+    assert bin(position.legal_mask()).count('1') == 6
+    try:
+        position.make_move(action, PLAYER1)
+    except NameError:
+        assert True
+    else:
+        assert False
+
+
+def test_bitboard_connected_four():
+    """
+    Tests bitboard_connected_four by checking that it agrees with
+    connected_four for random vertical, horizontal and diagonal wins and for
+    the example board without a win from the TestBoards class, on a larger
+    board and the winning cells of bitboard_winning_cells.
+    """
+    from agents.common import BitBoardPosition, initialize_game_state
+
+    board = initialize_game_state()
+    i = np.random.randint(0, 6)
+    j = np.random.randint(0, 4)
+    board[i, np.arange(j, j+4)] = PLAYER1
+    assert BitBoardPosition.from_board(board).connected_four(PLAYER1)
+    assert not BitBoardPosition.from_board(board).connected_four(PLAYER2)
+
+    board = initialize_game_state()
+    i = np.random.randint(0, 3)
+    board[np.arange(i, i+4), j] = PLAYER2
+    assert BitBoardPosition.from_board(board).connected_four(PLAYER2)
+
+    board = initialize_game_state()
+    board[np.arange(i, i+4), np.arange(j, j+4)] = PLAYER1
+    assert BitBoardPosition.from_board(board).connected_four(PLAYER1)
+
+    board = initialize_game_state()
+    board[np.arange(i+3, i-1, -1), np.arange(j, j+4)] = PLAYER2
+    assert BitBoardPosition.from_board(board).connected_four(PLAYER2)
+
+    # pieces at the end of one column and the start of the next column
+    board = initialize_game_state()
+    board[4:6, 0] = PLAYER1
+    board[0:2, 1] = PLAYER1
+    assert not BitBoardPosition.from_board(board).connected_four(PLAYER1)
+
+    position = BitBoardPosition.from_board(TestBoards.board_test_4)
+    assert not position.connected_four(PLAYER1)
+
+    # only fours through the given cell are counted
+    board = initialize_game_state()
+    board[0, 0:4] = PLAYER1
+    board[1, 6] = PLAYER1
+    board[0, 6] = PLAYER2
+    position = BitBoardPosition.from_board(board)
+    assert position.connected_four(PLAYER1, PlayerAction(2))
+    assert not position.connected_four(PLAYER1, PlayerAction(6))
+
+    board = initialize_game_state(7, 8)
+    board[np.arange(3, 7), np.arange(4, 8)] = PLAYER2
+    board[0, 4:7] = PLAYER1
+    position = BitBoardPosition.from_board(board)
+    assert position.connected_four(PLAYER2)
+    assert not position.connected_four(PLAYER1)
+    # the cells on both sides of the three in the bottom row, and the
+    # cell on top of the three in column 0 on the standard board
+    assert position.winning_cells(PLAYER1) == (1 << 3 * 8) | (1 << 7 * 8)
+    board = initialize_game_state()
+    board[0:3, 0] = PLAYER1
+    assert BitBoardPosition.from_board(board).winning_cells(PLAYER1) == 1 << 3
+
+
+def test_check_end_state():
+    """
+    Tests check_end_state for a won, a drawn and an on-going game.
+    """
+    from agents.common import check_end_state, initialize_game_state, \
+        GameState
+
+    board = initialize_game_state()
+    assert check_end_state(board, PLAYER1, None) == GameState.STILL_PLAYING
+
+    board[0, 0:4] = PLAYER1
+    assert check_end_state(board, PLAYER1, PlayerAction(3)) == \
+        GameState.IS_WIN
+    assert check_end_state(board, PLAYER1, None) == GameState.STILL_PLAYING
+
+    board = TestBoards.board_drawn.copy()
+    board[5, 4:7] = [PLAYER2, PLAYER1, PLAYER2]
+    assert check_end_state(board, PLAYER1, PlayerAction(5)) == \
+        GameState.IS_DRAW
+
+
+def test_check_end_state_batch():
+    """
+    Tests check_end_state_batch by comparing it to check_end_state for a
+    stack of random games, for k = 4 and k = 3.
+    """
+    from agents.common import check_end_state_batch, check_end_state, \
+        connected_four, initialize_game_state, apply_player_action, \
+        valid_action
+
+    n = 50
+    boards = np.empty((n, 6, 7), dtype=BoardPiece)
+    players = np.empty(n, dtype=BoardPiece)
+    last_actions = np.empty(n, dtype=PlayerAction)
+    for i in range(n):
+        board = initialize_game_state()
+        player = PLAYER2
+        action = PlayerAction(-1)
+        for _ in range(np.random.randint(0, 42)):
+            if connected_four(board, player, action):
+                break
+            player = PLAYER1 if player == PLAYER2 else PLAYER2
+            action = PlayerAction(np.random.choice(valid_action(board)))
+            apply_player_action(board, action, player)
+        boards[i], players[i], last_actions[i] = board, player, action
+    boards[0] = TestBoards.board_drawn
+    boards[0, 5, 4:7] = [PLAYER2, PLAYER1, PLAYER2]
+    players[0], last_actions[0] = PLAYER1, 5
+
+    for k in (4, 3):
+        states = check_end_state_batch(boards, players, last_actions, k)
+        assert states.shape == (n,)
+        for i in range(n):
+            last_action = None if last_actions[i] < 0 else last_actions[i]
+            state = check_end_state(boards[i], players[i], last_action, k)
+            assert states[i] == state.value
+
+
+def test_legal_moves_board():
+    """
+    Tests get_legal_moves for a Board with a full column.
+    """
+    from agents.common import get_legal_moves, Board
+
+    board = Board()
+    for _ in range(6):
+        board.apply_player_action(PlayerAction(2), PLAYER1)
+    assert np.all(get_legal_moves(board) == np.delete(np.arange(7), 2))
+    assert np.all(get_legal_moves(board.array) == get_legal_moves(board))
+
+
+def test_board():
+    """
+    Tests the class Board by checking if
+        - it is initialized from a given board with the right heights and ply
+        - apply_player_action changes the array like the function
+          apply_player_action and updates heights, ply and last move
+        - it raises an error if the column is full
+        - check_end_state agrees with the function check_end_state
+    """
+    from agents.common import Board, apply_player_action, check_end_state, \
+        initialize_game_state
+
+    board = Board(TestBoards.board_3_1.copy())
+    assert np.all(board.heights == [3, 1, 3, 3, 2, 1, 0])
+    assert board.ply == 13
+    assert board.landing_row(PlayerAction(4)) == 2
+    assert np.all(np.asarray(board) == TestBoards.board_3_1)
+
+    board = Board()
+    array = initialize_game_state()
+    player = PLAYER1
+    while board.check_end_state() == GameState.STILL_PLAYING:
+        action = PlayerAction(np.random.choice(board.valid_action()))
+        board.apply_player_action(action, player)
+        apply_player_action(array, action, player)
+        assert np.all(board.array == array)
+        assert board.last_action == action
+        assert board.ply == np.sum(array != NO_PLAYER)
+        assert board.check_end_state() == \
+            check_end_state(array, player, action)
+        player = PLAYER2 if player == PLAYER1 else PLAYER1
+
+    board = Board()
+    for _ in range(6):
+        board.apply_player_action(PlayerAction(0), PLAYER1)
+    try:
+        board.apply_player_action(PlayerAction(0), PLAYER1)
+    except NameError:
+        assert True
+    else:
+        assert False
+
+
+def test_zobrist_hash():
+    """
+    Tests the Zobrist hashing by checking if
+        - the incrementally updated key of a Board always equals the key
+          hashed from scratch, while playing and while undoing moves
+        - the same position reached by a different move order has the
+          same key and different positions have different keys
+        - boards larger than the Zobrist keys cannot be hashed
+    """
+    import pytest
+    from agents.common import Board, zobrist_hash, ZOBRIST_SIZE, \
+        initialize_game_state
+
+    board = Board()
+    assert board.key == zobrist_hash(board.array) == 0
+    keys = [board.key]
+    player = PLAYER1
+    for action in [3, 3, 2, 4, 2, 2, 5, 0]:
+        board.apply_player_action(PlayerAction(action), player)
+        assert board.key == zobrist_hash(board.array)
+        assert board.key not in keys
+        keys.append(board.key)
+        player = PLAYER2 if player == PLAYER1 else PLAYER1
+
+    for key in keys[-2::-1]:
+        board.undo_player_action()
+        assert board.key == key == zobrist_hash(board.array)
+    assert board.ply == 0
+    assert board.last_action is None
+
+    board_1 = Board()
+    board_2 = Board()
+    for action, player in [(3, PLAYER1), (4, PLAYER2), (2, PLAYER1)]:
+        board_1.apply_player_action(PlayerAction(action), player)
+    for action, player in [(2, PLAYER1), (4, PLAYER2), (3, PLAYER1)]:
+        board_2.apply_player_action(PlayerAction(action), player)
+    assert board_1.key == board_2.key
+
+    try:
+        Board().undo_player_action()
+    except NameError:
+        assert True
+    else:
+        assert False
+
+    from agents.common import zobrist_update
+    key = zobrist_update(board_1.key, 0, 5, PLAYER2)
+    board_1.apply_player_action(PlayerAction(5), PLAYER2)
+    assert key == board_1.key
+
+    assert Board(initialize_game_state(ZOBRIST_SIZE, ZOBRIST_SIZE)).key == 0
+    for shape in ((6, ZOBRIST_SIZE + 1), (ZOBRIST_SIZE + 1, 7)):
+        with pytest.raises(ValueError):
+            Board(initialize_game_state(*shape))
+
+
+def test_canonical_hash():
+    """
+    Tests if a board and its mirror image have the same canonical key, one
+    of them mirrored, and if a symmetric board is not mirrored.
+    """
+    from agents.common import canonical_hash, zobrist_hash, moves_to_board
+
+    board = moves_to_board('3345')
+    mirror = np.ascontiguousarray(board[:, ::-1])
+    key, mirrored = canonical_hash(board)
+    mirror_key, mirror_mirrored = canonical_hash(mirror)
+    assert key == mirror_key
+    assert mirrored != mirror_mirrored
+    assert key == min(zobrist_hash(board), zobrist_hash(mirror))
+
+    symmetric = moves_to_board('44')
+    assert canonical_hash(symmetric) == (zobrist_hash(symmetric), False)
+
+
+def test_window_update():
+    """
+    Test that the window counts, updated by window_update while moves are
+    made and taken back, equal the counts from scratch (window_state and
+    window_counts), for the default board and another k, and that
+    window_delta predicts the change of a move without making it.
+    """
+    from agents.common import window_state, window_update, window_delta, \
+        window_counts, line_table, make_move, unmake_move, column_heights, \
+        WINDOW_WEIGHTS, initialize_game_state, moves_to_board
+
+    rng = np.random.default_rng(3)
+    for shape, k in [((6, 7), 4), ((7, 8), 5)]:
+        board = initialize_game_state(*shape)
+        heights = column_heights(board)
+        lines, cell_lines = line_table(*shape, k)
+        windows, score = window_state(board, lines)
+        player = PLAYER1
+        columns = []
+        for _ in range(30):
+            if columns and rng.random() < 0.3:
+                column = columns.pop()
+                row = heights[column] - 1
+                window_update(windows, score, cell_lines,
+                              row * shape[1] + column, board[row, column],
+                              -1, k)
+                unmake_move(board, heights, column)
+                player = PLAYER2 if player == PLAYER1 else PLAYER1
+            else:
+                column = rng.choice(np.flatnonzero(heights < shape[0]))
+                cell = heights[column] * shape[1] + column
+                delta, won = window_delta(windows, cell_lines, cell, player,
+                                          k)
+                before = score.copy()
+                make_move(board, heights, column, player)
+                window_update(windows, score, cell_lines, cell, player, 1, k)
+                assert score[0] == before[0] + delta
+                assert won == (score[player] > before[player])
+                columns.append(column)
+                player = PLAYER2 if player == PLAYER1 else PLAYER1
+            counts = window_counts(board, lines)
+            expected = (counts[PLAYER1, k-1] - counts[PLAYER2, k-1]) \
+                * WINDOW_WEIGHTS[0] \
+                + (counts[PLAYER1, k-2] - counts[PLAYER2, k-2]) \
+                * WINDOW_WEIGHTS[1]
+            assert score[0] == expected
+            pieces = window_state(board, lines)[0]
+            assert np.all(windows[:, 1:] == pieces[:, 1:])
+            for piece in (PLAYER1, PLAYER2):
+                assert (score[piece] > 0) == (counts[piece, k] > 0)
+
+    _, score = window_state(moves_to_board('1213141'), line_table()[0])
+    assert score[PLAYER1] > 0
+    assert score[PLAYER2] == 0
+
+
+def test_make_unmake_move():
+    """
+    Tests make_move and unmake_move by checking if make_move changes the
+    board like apply_player_action and returns the landing row, and if
+    unmake_move restores the original board and heights.
+    """
+    from agents.common import make_move, unmake_move, column_heights, \
+        apply_player_action
+
+    board = TestBoards.board_3_1.copy()
+    heights = column_heights(board)
+    for action in range(7):
+        original = board.copy()
+        row = make_move(board, heights, PlayerAction(action), PLAYER2)
+        assert row == np.sum(original[:, action] != NO_PLAYER)
+        assert np.all(board == apply_player_action(original, action, PLAYER2,
+                                                   copy=True))
+        assert np.all(heights == column_heights(board))
+        unmake_move(board, heights, PlayerAction(action))
+        assert np.all(board == original)
+        assert np.all(heights == column_heights(original))
+
+
+def test_line_table():
+    """
+    Tests line_table by checking the number of lines of the default board
+    and of other shapes, and that every line is a straight line of k cells.
+    """
+    from agents.common import line_table
+
+    lines, cell_lines = line_table()
+    assert lines.shape == (69, 4)
+    assert cell_lines.shape == (42, 13)
+    # corner cell is part of one horizontal, vertical and diagonal line
+    assert np.sum(cell_lines[0] >= 0) == 3
+    assert line_table(6, 7, 4) is line_table(6, 7, 4)
+
+    lines, _ = line_table(7, 6, 5)
+    assert lines.shape == (7*2 + 6*3 + 2*3*2, 5)
+    rows, columns = np.divmod(lines, 6)
+    d_rows, d_columns = np.diff(rows, axis=1), np.diff(columns, axis=1)
+    assert np.all(d_rows == d_rows[:, :1])
+    assert np.all(d_columns == d_columns[:, :1])
+
+
+def test_connected_k():
+    """
+    Tests connected_k and check_end_state for a 7x6 board with five in a
+    row and for an 8x7 board with four in a row.
+    """
+    from agents.common import connected_k, check_end_state, \
+        initialize_game_state, connected_four
+
+    board = initialize_game_state(7, 6)
+    assert board.shape == (7, 6)
+    board[np.arange(0, 4), np.arange(1, 5)] = PLAYER1
+    assert connected_k(board, PLAYER1, PlayerAction(4), k=4)
+    assert not connected_k(board, PLAYER1, PlayerAction(4), k=5)
+    board[4, 5] = PLAYER1
+    assert connected_k(board, PLAYER1, PlayerAction(5), k=5)
+    assert check_end_state(board, PLAYER1, PlayerAction(5), k=5) == \
+        GameState.IS_WIN
+    assert check_end_state(board, PLAYER2, PlayerAction(5), k=5) == \
+        GameState.STILL_PLAYING
+
+    board = initialize_game_state(8, 7)
+    board[4:8, 6] = PLAYER2
+    assert connected_k(board, PLAYER2, PlayerAction(6), k=4) == \
+        connected_four(board, PLAYER2, PlayerAction(6)) == True
+
+
+def test_pretty_print_other_shapes():
+    """
+    Tests pretty_print_board and string_to_board for a board that is not
+    6x7.
+    """
+    from agents.common import pretty_print_board, string_to_board, \
+        initialize_game_state
+
+    board = initialize_game_state(8, 9)
+    board[0, 8] = PLAYER1
+    board[7, 0] = PLAYER2
+    board_str = pretty_print_board(board)
+    assert board_str.split('\n')[-1] == '|0 1 2 3 4 5 6 7 8|'
+    assert np.all(string_to_board(board_str) == board)
+
+
+def test_window_counts():
+    """
+    Tests window_counts by comparing it to counting the pieces of every
+    window of four cells of a random board directly.
+    """
+    from agents.common import window_counts, line_table, \
+        initialize_game_state
+
+    board = initialize_game_state()
+    board[np.random.randint(0, 6, 20), np.random.randint(0, 7, 20)] = \
+        np.random.choice([PLAYER1, PLAYER2], 20)
+
+    expected = np.zeros((3, 5), dtype=int)
+    windows = []
+    for i in range(6):
+        for j in range(7):
+            for d_i, d_j in ((0, 1), (1, 0), (1, 1), (-1, 1)):
+                if 0 <= i + 3*d_i < 6 and 0 <= j + 3*d_j < 7:
+                    windows.append(board[i + np.arange(4)*d_i,
+                                         j + np.arange(4)*d_j])
+    assert len(windows) == 69
+    for window in windows:
+        for player, opponent in ((PLAYER1, PLAYER2), (PLAYER2, PLAYER1)):
+            if not np.any(window == opponent):
+                expected[player, np.sum(window == player)] += 1
+
+    lines, _ = line_table()
+    assert np.all(window_counts(board, lines) == expected)
+    assert np.all(window_counts(TestBoards.board_3_1, lines) ==
+                  window_counts(TestBoards.board_3_1.copy(), lines))
+
+
+def test_strings_to_boards():
+    """
+    Tests strings_to_boards by parsing the string representations of a
+    stack of random boards and of the example boards, an empty sequence and
+    boards of different shapes.
+    """
+    import pytest
+    from agents.common import strings_to_boards, pretty_print_board
+
+    boards = np.random.choice([NO_PLAYER, PLAYER1, PLAYER2], (20, 6, 7))
+    ret = strings_to_boards([pretty_print_board(board) for board in boards])
+    assert ret.shape == (20, 6, 7)
+    assert ret.dtype == BoardPiece
+    assert np.all(ret == boards)
+
+    ret = strings_to_boards([TestBoards.str_3_1, TestBoards.str_4_1])
+    assert np.all(ret[0] == TestBoards.board_3_1)
+    assert np.all(ret[1] == TestBoards.board_test_4)
+
+    ret = strings_to_boards([])
+    assert ret.shape == (0, 6, 7)
+    assert ret.dtype == BoardPiece
+
+    with pytest.raises(ValueError):
+        strings_to_boards([pretty_print_board(boards[0]),
+                           pretty_print_board(np.zeros((7, 8)))])
+
+
+def test_encode_decode_boards():
+    """
+    Tests encode_boards and decode_boards by checking if decoding the codes
+    returns the original boards, if the codes are the bitboards of
+    board_to_bitboard and that boards too large for the codes are rejected.
+    """
+    import pytest
+    from agents.common import encode_boards, decode_boards, \
+        board_to_bitboard
+
+    boards = np.random.choice([NO_PLAYER, PLAYER1, PLAYER2], (20, 6, 7))
+    boards = boards.astype(BoardPiece)
+    codes = encode_boards(boards)
+    assert codes.shape == (20, 2)
+    assert codes.dtype == np.uint64
+    assert np.all(decode_boards(codes) == boards)
+    for board, code in zip(boards, codes):
+        assert np.all(board_to_bitboard(board)[0] == code)
+
+    boards = np.random.choice([NO_PLAYER, PLAYER1, PLAYER2], (5, 7, 8))
+    boards = boards.astype(BoardPiece)
+    assert np.all(decode_boards(encode_boards(boards), 7, 8) == boards)
+
+    with pytest.raises(ValueError):
+        encode_boards(np.zeros((1, 8, 8), dtype=BoardPiece))
+    with pytest.raises(ValueError):
+        decode_boards(codes, 8, 8)
+
+
+def test_moves_to_boards():
+    """
+    Tests moves_to_board, moves_to_boards and board_to_moves by comparing
+    them to playing the moves with a Board.
+    """
+    from agents.common import moves_to_board, moves_to_boards, \
+        board_to_moves, Board
+
+    board = Board()
+    for action, player in [(3, PLAYER1), (3, PLAYER2), (4, PLAYER1),
+                           (2, PLAYER2)]:
+        board.apply_player_action(PlayerAction(action), player)
+    assert board_to_moves(board) == '4453'
+    assert np.all(moves_to_board('4453') == board.array)
+
+    boards = moves_to_boards(['4453', '', '7'])
+    assert np.all(boards[0] == board.array)
+    assert np.all(boards[1] == NO_PLAYER)
+    assert boards[2, 0, 6] == PLAYER1
+
+    try:
+        moves_to_board('1111111')
+    except NameError:
+        assert True
+    else:
+        assert False
+
+
+def test_warmup():
+    """
+    Tests if warmup compiles the kernels for the argument types used by the
+    agents.
+    """
+    from agents.common import warmup, connected_four, make_move, \
+        board_to_bitboard
+
+    warmup()
+    assert len(connected_four.signatures) >= 2
+    assert len(make_move.signatures) >= 1
+    assert len(board_to_bitboard.signatures) >= 1
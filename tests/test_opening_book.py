@@ -0,0 +1,101 @@
+import numpy as np
+from agents.common import PLAYER1, PLAYER2, initialize_game_state, \
+    moves_to_board
+
+
+def test_book_positions():
+    """
+    Test that the positions of the book are the positions of the first
+    plies up to mirror images: 1 empty board, 4 boards after one move and
+    7 * 7 = 49 boards after two moves, of which all but the one with both
+    pieces in the center column have a different mirror image
+    """
+    from agents.opening_book import book_positions
+    from agents.common import canonical_hash
+
+    positions = book_positions(2)
+    assert len(positions) == 1 + 4 + 25
+    for key, board in positions.items():
+        assert canonical_hash(board) == (key, False)
+
+
+def test_build_book(tmp_path):
+    """
+    Test that a built book is sorted, answers the positions like the search
+    it was built with (mirrored positions with the mirrored move) and does
+    not answer positions beyond its plies, of the wrong player or of
+    another board shape.
+    """
+    from agents.opening_book import build_book
+    from agents.agent_minimax.book import OpeningBook, load_book
+    from agents.agent_minimax.minimax import negamax_search, MinimaxState
+
+    path = str(tmp_path / 'book.bin')
+    assert build_book(path, 2, 4) == 30
+    book = OpeningBook(path)
+    assert len(book) == 30
+    assert (book.rows, book.columns, book.k) == (6, 7, 4)
+    assert np.all(np.diff(book.keys.astype(np.float64)) > 0)
+    assert load_book(path) is load_book(path)
+    assert load_book(str(tmp_path / 'missing.bin')) is None
+
+    board = moves_to_board('23')
+    column, score, depth = book.lookup(board, PLAYER1)
+    assert (score, column, depth) == negamax_search(
+        board, PLAYER1, MinimaxState(), max_depth=4)
+    mirror = np.ascontiguousarray(board[:, ::-1])
+    assert book.lookup(mirror, PLAYER1) == (6 - column, score, depth)
+
+    assert book.lookup(moves_to_board('233'), PLAYER2) is None
+    assert book.lookup(board, PLAYER2) is None
+    assert book.lookup(initialize_game_state(7, 8), PLAYER1) is None
+    assert book.lookup(initialize_game_state(), PLAYER1, 5) is None
+
+
+def test_build_book_parallel(tmp_path):
+    """
+    Test that the book built by worker processes holds the positions of
+    the one built in this process (the scores may differ as the workers
+    keep their transposition tables between positions).
+    """
+    from agents.opening_book import build_book
+    from agents.agent_minimax.book import OpeningBook
+
+    sequential = str(tmp_path / 'sequential.bin')
+    parallel = str(tmp_path / 'parallel.bin')
+    build_book(sequential, 1, 3)
+    build_book(parallel, 1, 3, workers=2, chunk_size=2)
+    assert np.array_equal(OpeningBook(sequential).keys,
+                          OpeningBook(parallel).keys)
+    assert OpeningBook(parallel).lookup(moves_to_board('4'), PLAYER2) \
+        is not None
+
+
+def test_generate_move_book(tmp_path):
+    """
+    Test that the minimax and the Monte Carlo agent play the move of the
+    book, the Monte Carlo agent without a tree, and search positions that
+    are not in the book.
+    """
+    from agents.opening_book import build_book
+    from agents.agent_minimax.book import OpeningBook
+    from agents.agent_minimax.minimax import generate_move as minimax_move
+    from agents.agent_montecarlo.monte_carlo import \
+        generate_move as monte_carlo_move
+
+    path = str(tmp_path / 'book.bin')
+    build_book(path, 1, 3)
+    board = moves_to_board('5')
+    column = OpeningBook(path).lookup(board, PLAYER2)[0]
+
+    action, state = minimax_move(board, PLAYER2, None, depth=1, book=path)
+    assert action == column
+    assert state.nodes == 0
+    action, state = monte_carlo_move(board, PLAYER2,
+                                     {PLAYER1: 4, PLAYER2: None}, book=path)
+    assert action == column
+    assert state is None
+
+    action, state = minimax_move(moves_to_board('54'), PLAYER1, None,
+                                 depth=1, book=path)
+    assert state.nodes > 0
@@ -0,0 +1,27 @@
+import os
+
+
+def test_get_pool():
+    """
+    Tests that get_pool keeps the pool of a name between calls, restarts it
+    only if its number of workers changes and that the pools of different
+    names do not affect each other.
+    """
+    from agents.pool import get_pool, shutdown_pool
+
+    try:
+        first = get_pool('test-first', 1)
+        second = get_pool('test-second', 1)
+        assert first is not second
+        assert get_pool('test-first', 1) is first
+        pid = first.submit(os.getpid).result()
+        assert pid != os.getpid()
+        assert first.submit(os.getpid).result() == pid
+
+        restarted = get_pool('test-first', 2)
+        assert restarted is not first
+        assert get_pool('test-second', 1) is second
+        assert second.submit(os.getpid).result() != os.getpid()
+    finally:
+        shutdown_pool('test-first')
+        shutdown_pool('test-second')
@@ -40,7 +40,11 @@ def simulate_tree():
 
     while time.time() < end:
         node = mcst.select(mcst.root)
-        action = np.random.choice(node.unexpanded_actions())
+        actions = node.unexpanded_actions()
+        if node.is_won or len(actions) == 0:
+            # the game has ended at node
+            continue
+        action = np.random.choice(actions)
         child = node.expand(action)
         winner = mcst.simulate(child)
         mcst.backpropagation(node, winner)